@@ -43,6 +43,10 @@ def process_builtin_command(user_input: str) -> Tuple[bool, Optional[str], Comma
         "help": _handle_help,
         "version": _handle_version,
         "clear": _handle_clear,
+        "cache": _handle_cache,
+        "undo": _handle_undo,
+        "redo": _handle_redo,
+        "history": _handle_history,
     }
 
     # 转换型命令（转换为用户输入传给 agent）
@@ -97,6 +101,10 @@ def _handle_help() -> Tuple[bool, str]:
   help         - 显示此帮助信息
   version      - 显示版本信息
   clear        - 清屏
+  cache        - 显示文件缓存统计
+  undo         - 撤销最近一次代码修改
+  redo         - 重做最近一次撤销的修改
+  history      - 显示最近的代码修改记录
 
 转换型命令（转换为用户输入传给 AI）:
   time         - 查询当前时间并获取相关信息
@@ -119,6 +127,56 @@ def _handle_clear() -> Tuple[bool, str]:
     return True, "屏幕已清空"
 
 
+def _handle_cache() -> Tuple[bool, str]:
+    """处理缓存统计命令"""
+    from tools.coder_cache import coder_cache
+    from tools.file_cache import file_cache
+
+    stats = file_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+    coder_stats = coder_cache.stats()
+    coder_lookups = coder_stats["hits"] + coder_stats["misses"]
+    coder_hit_rate = coder_stats["hits"] / coder_lookups * 100 if coder_lookups else 0.0
+    return True, (
+        f"文件缓存: 命中 {stats['hits']} / 未命中 {stats['misses']} "
+        f"(命中率 {hit_rate:.1f}%), 淘汰 {stats['evictions']}, "
+        f"失效 {stats['invalidations']}, "
+        f"{stats['entries']} 个文件 / {stats['bytes']} 字节\n"
+        f"coder 缓存: 命中 {coder_stats['hits']} / 未命中 {coder_stats['misses']} "
+        f"(命中率 {coder_hit_rate:.1f}%), 过期 {coder_stats['expired']}, "
+        f"淘汰 {coder_stats['evictions']}"
+    )
+
+
+def _handle_undo() -> Tuple[bool, str]:
+    """处理撤销修改命令"""
+    from tools.backup_store import get_backup_store
+
+    try:
+        return True, get_backup_store().undo()
+    except (ValueError, OSError) as e:
+        return True, f"撤销失败: {e}"
+
+
+def _handle_redo() -> Tuple[bool, str]:
+    """处理重做修改命令"""
+    from tools.backup_store import get_backup_store
+
+    try:
+        return True, get_backup_store().redo()
+    except (ValueError, OSError) as e:
+        return True, f"重做失败: {e}"
+
+
+def _handle_history() -> Tuple[bool, str]:
+    """处理修改记录命令"""
+    from tools.backup_store import get_backup_store
+
+    lines = get_backup_store().history()
+    return True, "\n".join(lines) if lines else "暂无修改记录"
+
+
 def is_builtin_command(user_input: str) -> bool:
     """
     检查输入是否为内置命令
@@ -138,6 +196,10 @@ def is_builtin_command(user_input: str) -> bool:
         "help",
         "version",
         "clear",
+        "cache",
+        "undo",
+        "redo",
+        "history",
         # 转换型命令
         "time",
         "date",
@@ -158,7 +220,18 @@ def get_command_type(user_input: str) -> CommandType:
     """
     command = user_input.strip().lower()
 
-    direct_commands = {"exit", "quit", "q", "help", "version", "clear"}
+    direct_commands = {
+        "exit",
+        "quit",
+        "q",
+        "help",
+        "version",
+        "clear",
+        "cache",
+        "undo",
+        "redo",
+        "history",
+    }
     convert_commands = {"time", "date", "weather"}
 
     if command in direct_commands:
@@ -1,7 +1,7 @@
 """
 交互式客户端程序
 等待用户输入，在输入内容后加上"！"并返回给用户
-按 Ctrl-C 可以退出程序
+按 Ctrl-C 中断当前回复，连续按两次 Ctrl-C 退出程序
 """
 
 import asyncio
@@ -11,7 +11,7 @@ from server import server_run_stream
 def main():
     """主函数：处理用户输入并返回带感叹号的内容"""
     print("欢迎使用交互式客户端！")
-    print("请输入内容（按 Ctrl-C 退出）：")
+    print("请输入内容（按 Ctrl-C 中断回复，连按两次退出）：")
 
     try:
         asyncio.run(server_run_stream())
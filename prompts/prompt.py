@@ -16,9 +16,20 @@ def get_common_prompt():
 - get_current_time: 返回当前时间信息
 - get_weather: 返回用户当前天气信息
 - check_and_modify_code: 根据给定的代码片段，这段代码文件路径，以及代码开始的行号，判断是否有误或需要改进，并给出修改后的代码
+- modify_and_apply_code: 与 check_and_modify_code 参数相同，但会自动校验并把修改直接写入文件，只返回简短摘要；需要修改文件时优先使用，无需再调用 apply_code_patch
+- review_code_file: 检查整个代码文件（大文件会按函数/类分段并行检查），返回整个文件的 diff，可再用 apply_code_patch 写入
 - generate_code: 生成代码，并给出详细的代码注释
+- 以上 coder 工具对相同的代码或需求会直接返回上次的结果；用户要求重新生成时传入 use_cache=False
 - read_code_file: 读取代码文件，并返回代码内容
-- apply_code_patch: 将generate_code或modify_code的结果，将代码写入指定文件中
+- read_code_files: 一次读取多个文件的多个区间（file_path, start_line, end_line），需要查看多处代码时优先使用
+- search_code: 用正则表达式在整个工作区搜索代码，返回 路径:行号: 内容，可用 glob 限定文件范围（如 "tools/*.py"）
+- read_code_symbol: 按函数/类名（如 TestClass.get_value）直接读取Python代码，无需知道行号
+- read_code_file_page: 分页读取大文件或日志，每页有字节上限；返回结果末尾会给出 cursor，传入 cursor 即可读取下一页
+- read_tool_result: 工具返回过长时只会给出开头和结尾，并附带 result_id 和 offset；需要其余内容时用它分段读取
+- apply_code_patch: 将generate_code或modify_code的结果，将代码写入指定文件中；dry_run=True 时只检查每个补丁块能否应用、不修改文件，可先检查再修正有问题的块
+- apply_multi_file_patch: 应用包含多个文件（带 ---/+++ 文件头，路径相对工作区）的补丁，可新建、删除文件，重命名需带 git 的 rename from/rename to 头；全部成功或全部不改
+- undo_code_patch: 撤销最近一次代码修改（多文件补丁整体撤销），文件在修改后又被改动过时会拒绝
+- redo_code_patch: 重做最近一次被撤销的代码修改
 """
 
 
@@ -41,3 +52,12 @@ def get_coder_prompt():
 
 注意：返回的时候请只返回代码注释相关的内容，不要返回任何其他内容。
 """
+
+
+def get_summary_prompt():
+    return """
+你负责压缩一段用户与助手（可调用工具）的对话记录，供助手在之后的对话中回顾。
+请用简洁的中文总结：用户的目标与偏好、已经完成的操作（修改了哪些文件、调用了哪些工具及关键结果）、
+尚未完成的事项，以及之后可能用到的文件路径、函数名、行号等细节。
+不要编造对话中没有的内容，只输出摘要本身。
+"""
@@ -1,7 +1,9 @@
+import asyncio
+import functools
+import os
 from typing import AsyncIterable
-from pydantic_ai import Agent, RunContext
+from pydantic_ai import Agent, RunContext, capture_run_messages
 from pydantic_ai.messages import (
-    ModelMessage,
     SystemPromptPart,
     ThinkingPart,
     ToolCallPart,
@@ -20,13 +22,34 @@ from datetime import datetime
 import logfire
 from httpx import AsyncClient
 from dataclasses import dataclass
-from tools.coder import generate, modify
+from tools.coder import generate, modify, modify_and_apply, modify_file
 from models.qwen import model_qwen
 from models.deepseek import model_deepseek
-from prompts.prompt import get_common_prompt
-from tools.code_patcher import apply_patch
-from tools.code_reader import read_file_lines
+from prompts.prompt import get_common_prompt, get_summary_prompt
+from tools.backup_store import get_backup_store
+from tools.code_patcher import (
+    DEV_NULL,
+    STREAMING_THRESHOLD,
+    apply_patch_set,
+    iter_hunks,
+    patch_file,
+)
+from tools.executor import tool_executor
+from tools.result_store import cap_result, preview, read_result
+from tools.symbol_index import read_symbol
+from tools.code_search import search_code as search_code_in_workspace
+from tools.code_reader import (
+    MAX_PAGE_BYTES,
+    ReadRange,
+    read_file_lines,
+    read_file_page,
+    read_file_ranges,
+)
 from commands.builtin_commands import process_builtin_command, CommandType
+from session.console import AsyncLineReader, InterruptHandler, Interrupted
+from session.history import ConversationHistory, HistoryPolicy, interrupted_turn
+from session.log import SessionLog
+from session.renderer import FrameRenderer, NestedSection
 
 # 配置 logfire 将日志输出到文件而不是控制台
 logfire.configure()
@@ -46,6 +69,32 @@ agent = Agent(
     system_prompt=get_common_prompt(),
 )
 
+# 对话历史超出预算时，用于总结较早轮次的 agent
+summary_agent = Agent(
+    model=model_qwen,
+    system_prompt=get_summary_prompt(),
+)
+
+# 主 agent 的流式输出，逐 token 的增量合并后按帧写出；coder 的嵌套输出也经由它写出，
+# 保证与工具调用等提示按发生的顺序显示
+console = FrameRenderer()
+
+
+async def summarize_history(transcript: str) -> str:
+    result = await summary_agent.run(transcript)
+    return result.output
+
+
+def capped_result(func):
+    """工具返回超过 token 上限时，只把开头和结尾交给模型，完整内容保存到磁盘"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        return await tool_executor.run_io(cap_result, result)
+
+    return wrapper
+
 
 @agent.tool_plain
 def get_current_time() -> str:
@@ -60,29 +109,196 @@ async def get_weather(ctx: RunContext[Deps], city: str) -> str:
 
 
 @agent.tool
+@capped_result
 async def read_code_file(
     ctx: RunContext[Deps], file_path: str, start_line: int, end_line: int
 ) -> str:
-    return read_file_lines(file_path, start_line, end_line)
+    return await tool_executor.run_io(read_file_lines, file_path, start_line, end_line)
+
+
+@agent.tool
+@capped_result
+async def read_code_files(ctx: RunContext[Deps], ranges: list[ReadRange]) -> str:
+    return await read_file_ranges(ranges)
+
+
+@agent.tool
+@capped_result
+async def read_code_file_page(
+    ctx: RunContext[Deps],
+    file_path: str,
+    start_line: int = 1,
+    cursor: str | None = None,
+    max_bytes: int = MAX_PAGE_BYTES,
+) -> str:
+    # max_bytes 由模型传入，限制在一页的上限以内
+    max_bytes = min(max_bytes, MAX_PAGE_BYTES)
+    try:
+        page = await tool_executor.run_io(
+            read_file_page, file_path, start_line, cursor, max_bytes
+        )
+    except (ValueError, FileNotFoundError) as e:
+        # 无效或过期的游标等，交给模型重新读取，而不是中断整个运行
+        return f"读取失败: {e}"
+    return page.render()
+
+
+@agent.tool
+@capped_result
+async def read_code_symbol(
+    ctx: RunContext[Deps], file_path: str, symbol_name: str
+) -> str:
+    try:
+        return await tool_executor.run_io(read_symbol, file_path, symbol_name)
+    except (ValueError, FileNotFoundError) as e:
+        # 符号不存在或有歧义时的说明（含可用符号）交给模型，而不是中断整个运行
+        return f"读取失败: {e}"
+
+
+@agent.tool
+@capped_result
+async def search_code(
+    ctx: RunContext[Deps],
+    pattern: str,
+    glob: str | None = None,
+    ignore_case: bool = False,
+    max_results: int = 50,
+) -> str:
+    try:
+        return await tool_executor.run_io(
+            search_code_in_workspace,
+            pattern,
+            glob=glob,
+            ignore_case=ignore_case,
+            max_results=max_results,
+            executor=tool_executor.process_pool,
+        )
+    except ValueError as e:
+        # 无效的正则表达式等，交给模型修正后重试，而不是中断整个运行
+        return f"搜索失败: {e}"
+
+
+def _is_large_file(file_path: str) -> bool:
+    try:
+        return os.path.getsize(file_path) >= STREAMING_THRESHOLD
+    except OSError:
+        return False
+
+
+def _patch_paths(patch_string: str) -> list[str]:
+    """补丁涉及的所有文件路径（相对工作区）"""
+    paths = set()
+    for hunk in iter_hunks(patch_string):
+        paths.update((hunk.old_path, hunk.new_path))
+    paths.discard(DEV_NULL)
+    paths.discard(None)
+    return sorted(paths)
+
+
+@agent.tool
+async def read_tool_result(
+    ctx: RunContext[Deps], result_id: str, offset: int = 0, max_chars: int = 16000
+) -> str:
+    try:
+        return await tool_executor.run_io(read_result, result_id, offset, max_chars)
+    except ValueError as e:
+        return f"读取失败: {e}"
 
 
 @agent.tool
 async def apply_code_patch(
-    ctx: RunContext[Deps], file_path: str, patch_string: str
+    ctx: RunContext[Deps], file_path: str, patch_string: str, dry_run: bool = False
 ) -> str:
-    return apply_patch(patch_string, file_path)
+    # 同一文件上的补丁按调用顺序依次应用
+    async with tool_executor.lock_paths(file_path):
+        if dry_run and _is_large_file(file_path):
+            # dry run 不修改文件和缓存，大文件上的模糊定位放到进程池中计算
+            report = await tool_executor.run_cpu(
+                patch_file, patch_string, file_path, dry_run=True
+            )
+        else:
+            report = await tool_executor.run_io(
+                patch_file, patch_string, file_path, dry_run=dry_run
+            )
+    return report.render()
+
+
+@agent.tool
+async def apply_multi_file_patch(ctx: RunContext[Deps], patch_string: str) -> str:
+    try:
+        async with tool_executor.lock_paths(*_patch_paths(patch_string)):
+            summary = await tool_executor.run_io(apply_patch_set, patch_string)
+    except (ValueError, OSError) as e:
+        return f"补丁未应用，所有文件保持不变:\n{e}"
+    return "补丁已应用:\n" + "\n".join(summary)
+
+
+@agent.tool
+async def undo_code_patch(ctx: RunContext[Deps]) -> str:
+    try:
+        return await tool_executor.run_io(get_backup_store().undo)
+    except (ValueError, OSError) as e:
+        return f"撤销失败: {e}"
+
+
+@agent.tool
+async def redo_code_patch(ctx: RunContext[Deps]) -> str:
+    try:
+        return await tool_executor.run_io(get_backup_store().redo)
+    except (ValueError, OSError) as e:
+        return f"重做失败: {e}"
 
 
 @agent.tool
+@capped_result
 async def check_and_modify_code(
-    ctx: RunContext[Deps], code_string: str, file_path: str, begin_line: int = 1
+    ctx: RunContext[Deps],
+    code_string: str,
+    file_path: str,
+    begin_line: int = 1,
+    use_cache: bool = True,
+) -> str:
+    with NestedSection("coder", renderer=console) as section:
+        return await modify(
+            code_string, file_path, begin_line, section.write, use_cache
+        )
+
+
+@agent.tool
+async def modify_and_apply_code(
+    ctx: RunContext[Deps],
+    code_string: str,
+    file_path: str,
+    begin_line: int = 1,
+    use_cache: bool = True,
+) -> str:
+    # coder 按文件当前内容校验 diff，同一文件上的修改不能交叉进行
+    async with tool_executor.lock_paths(file_path):
+        with NestedSection("coder", renderer=console) as section:
+            return await modify_and_apply(
+                code_string,
+                file_path,
+                begin_line,
+                on_delta=section.write,
+                use_cache=use_cache,
+            )
+
+
+@agent.tool
+@capped_result
+async def review_code_file(
+    ctx: RunContext[Deps], file_path: str, use_cache: bool = True
 ) -> str:
-    return await modify(code_string, file_path, begin_line)
+    return await modify_file(file_path, use_cache=use_cache)
 
 
 @agent.tool
-async def generate_code(ctx: RunContext[Deps], text: str) -> str:
-    return await generate(text)
+@capped_result
+async def generate_code(
+    ctx: RunContext[Deps], text: str, use_cache: bool = True
+) -> str:
+    with NestedSection("coder", renderer=console) as section:
+        return await generate(text, section.write, use_cache)
 
 
 async def event_stream_handler(
@@ -90,17 +306,15 @@ async def event_stream_handler(
     event_stream: AsyncIterable[AgentStreamEvent],
 ):
     """处理流式事件的处理器函数"""
-    # 流式处理事件
-    thinking_content = ""
+    # 流式处理事件，增量文本由 console 合并后按帧写出
     thinking_started = False
 
     async for event in event_stream:
         if isinstance(event, PartStartEvent):
             if isinstance(event.part, ThinkingPart):
                 thinking_started = True
-                thinking_content = event.part.content
-                print()  # 换行
-                print(f"🤔 Thinking：{thinking_content}", end="", flush=True)
+                console.write("\n")  # 换行
+                console.write(f"🤔 Thinking：{event.part.content}")
             # elif isinstance(event.part, ToolCallPart):
             #     if thinking_started:
             #         print()  # 换行
@@ -109,66 +323,59 @@ async def event_stream_handler(
         elif isinstance(event, PartDeltaEvent):
             if isinstance(event.delta, ThinkingPartDelta) and thinking_started:
                 if event.delta.content_delta:
-                    thinking_content += event.delta.content_delta
-                    print(event.delta.content_delta, end="", flush=True)
+                    console.write(event.delta.content_delta)
         elif isinstance(event, FunctionToolCallEvent):
             if thinking_started:
-                print()  # 换行
+                console.write("\n")  # 换行
                 thinking_started = False
-            print(f"🔧 调用tool：{event.part.tool_name}")
+            console.write(f"🔧 调用tool：{event.part.tool_name}\n")
         elif isinstance(event, FunctionToolResultEvent):
             if thinking_started:
-                print()  # 换行
+                console.write("\n")  # 换行
                 thinking_started = False
-            print(f"📤 tool返回：{event.result.content}")
+            content = preview(str(event.result.content))
+            console.write(f"📤 tool返回：{content}\n")
         elif isinstance(event, BuiltinToolCallEvent):
             if thinking_started:
-                print()  # 换行
+                console.write("\n")  # 换行
                 thinking_started = False
-            print(f"🔧 调用内置tool：{event.part.tool_name}")
+            console.write(f"🔧 调用内置tool：{event.part.tool_name}\n")
         elif isinstance(event, BuiltinToolResultEvent):
             if thinking_started:
-                print()  # 换行
+                console.write("\n")  # 换行
                 thinking_started = False
-            print(f"📤 内置tool返回：{event.result.content}")
+            content = preview(str(event.result.content))
+            console.write(f"📤 内置tool返回：{content}\n")
 
     # 流式显示文本内容
     if thinking_started:
-        print()  # 换行
+        console.write("\n")  # 换行
         thinking_started = False
 
 
-async def server_run_stream():
-    all_messages: list[ModelMessage] = []
-    # message_history: list[ModelMessage] | None = None
-
-    async with AsyncClient() as client:
-        logfire.instrument_httpx(client, capture_all=True)
-        deps = Deps(client=client)
+async def run_turn(user_input: str, deps: Deps, history: ConversationHistory):
+    """
+    运行一轮对话并把消息追加到历史中
 
-        while True:
-            # 等待用户输入
-            user_input = input("> ")
-
-            # 处理内置命令
-            is_builtin, result, command_type = process_builtin_command(user_input)
-            if is_builtin:
-                if command_type == CommandType.DIRECT:
-                    # 直接处理型命令：显示结果并等待用户继续输入
-                    if result is not None:
-                        print(result)
-                    continue
-                elif command_type == CommandType.CONVERT:
-                    # 转换型命令：将转换后的内容作为用户输入传给 agent
-                    user_input = result
+    被取消（Ctrl-C）时，这一轮已经完成的请求、工具调用与返回，以及已经显示的部分回复
+    仍会保留在历史中，之后可以接着这次中断继续对话。
+    """
+    start = len(history.messages)
+    output: list[str] = []
 
+    # 本次运行的完整消息列表（包括传入的历史），在发出第一个请求前就开始记录，
+    # 还没有收到任何回复时被中断也能取到本轮的请求
+    with capture_run_messages() as run_messages:
+        try:
             # 在用户输入后加上"！"并返回
             async with agent.run_stream(
                 user_input,
                 deps=deps,
-                message_history=all_messages,
+                message_history=history.messages,
                 event_stream_handler=event_stream_handler,
             ) as result:
+                # 先写出 event_stream_handler 中尚未写出的内容，保持输出顺序
+                console.flush()
 
                 # 处理历史消息
                 for message in result.new_messages():
@@ -176,7 +383,7 @@ async def server_run_stream():
                         if isinstance(call, ToolCallPart):
                             print("调用tool：", call.tool_name)
                         elif isinstance(call, ToolReturnPart):
-                            print("tool返回：", call.content)
+                            print("tool返回：", preview(str(call.content)))
                         elif isinstance(call, SystemPromptPart):
                             print("系统提示：", call.content)
                         elif isinstance(call, UserPromptPart):
@@ -190,26 +397,90 @@ async def server_run_stream():
                 print("\n================\n")
                 """ 流式显示文本内容 """
                 async for message in result.stream_text(delta=True):
-                    print(message, end="", flush=True)
-                print()  # 换行
+                    output.append(message)
+                    console.write(message)
+                console.write("\n")  # 换行
+                console.flush()
+        except asyncio.CancelledError:
+            console.flush()
+            # 历史为空时只补记用户输入会让之后的请求缺少系统提示，此时不记入
+            prompt = user_input if start else None
+            turn = interrupted_turn(run_messages[start:], "".join(output), prompt)
+            if not turn:
+                console.write("（输入尚未发送给模型，未记入对话历史）\n")
+                console.flush()
+            history.add_turn(turn)
+            raise
+
+    # 对于stream_text(delta=True)，result.all_messages()和result.new_messages()都不会返回历史信息
+    # 所以需要手动将本轮的消息追加到历史中
+    history.add_turn(result.new_messages())
 
-            all_messages = all_messages + result.new_messages()
-            # 对于stream_text(delta=True)，result.all_messages()和result.new_messages()都不会返回历史信息
-            # 所以需要手动将历史信息添加到all_messages中
-            # all_messages = result.all_messages()
-            # message_history = result.new_messages()
-            # print(all_messages)
 
-            print()  # 空行分隔
+async def server_run_stream():
+    # 回放给模型的历史中删除思考过程、截断旧的工具调用参数（如补丁内容），
+    # 完整的消息保存在 .agent/sessions/ 下的会话日志中
+    history = ConversationHistory(
+        summarizer=summarize_history,
+        policy=HistoryPolicy(thinking="drop", tool_args_chars=1000),
+        log=SessionLog(),
+    )
+    reader = AsyncLineReader()
+    # 上一轮结束后在后台压缩对话历史，与用户输入同时进行
+    compaction: asyncio.Task | None = None
+
+    async with AsyncClient() as client:
+        logfire.instrument_httpx(client, capture_all=True)
+        deps = Deps(client=client)
+
+        # 第一次 Ctrl-C 只中断当前这一轮（或当前输入），再按一次才退出
+        with InterruptHandler() as interrupts:
+            while True:
+                # 等待用户输入，期间事件循环中的后台任务照常运行
+                try:
+                    user_input = await interrupts.run(reader.readline("> "))
+                except Interrupted:
+                    continue
+
+                # 处理内置命令
+                is_builtin, result, command_type = process_builtin_command(
+                    user_input
+                )
+                if is_builtin:
+                    if command_type == CommandType.DIRECT:
+                        # 直接处理型命令：显示结果并等待用户继续输入
+                        if result is not None:
+                            print(result)
+                        continue
+                    elif command_type == CommandType.CONVERT:
+                        # 转换型命令：将转换后的内容作为用户输入传给 agent
+                        user_input = result
+
+                if compaction is not None:
+                    await compaction
+                    compaction = None
+
+                try:
+                    await interrupts.run(
+                        run_turn(user_input, deps, history), "⏹ 已中断本轮回复"
+                    )
+                except Interrupted:
+                    pass
+
+                # 超出 token 预算时压缩较早的对话，之后每轮请求的大小不再随会话长度增长
+                compaction = asyncio.create_task(history.compact())
+
+                print()  # 空行分隔
 
 
 async def server_run():
     async with AsyncClient() as client:
         logfire.instrument_httpx(client, capture_all=True)
         deps = Deps(client=client)
+        reader = AsyncLineReader()
 
         while True:
-            user_input = input("> ")
+            user_input = await reader.readline("> ")
 
             result = agent.run_sync(user_input, deps=deps)
             print(f"返回结果: {result.output}")
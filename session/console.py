@@ -0,0 +1,225 @@
+"""
+终端输入
+
+- AsyncLineReader 基于事件循环读取 stdin：等待用户输入时事件循环照常运行，
+  后台任务（如对话历史压缩）可以在用户输入期间继续执行；
+- InterruptHandler 处理 Ctrl-C：第一次只取消当前任务，第二次才退出。
+"""
+
+import asyncio
+import codecs
+import os
+import signal
+import sys
+from collections import deque
+from typing import Awaitable, Deque, Optional, TextIO, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncLineReader:
+    """
+    异步逐行读取输入
+
+    stdin 支持事件循环的 add_reader 时（终端、管道），只在等待输入期间监听其文件描述符，
+    读到的多余行（如粘贴的多行文本）保留到下次读取；否则（如 Windows 或普通文件）
+    退化为在线程中调用 readline。
+
+    Args:
+        stream: 输入流，默认标准输入
+        output: 显示提示符的输出流，默认标准输出
+    """
+
+    def __init__(
+        self, stream: Optional[TextIO] = None, output: Optional[TextIO] = None
+    ):
+        self.stream = stream or sys.stdin
+        self.output = output or sys.stdout
+        encoding = getattr(self.stream, "encoding", None) or "utf-8"
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._lines: Deque[str] = deque()
+        self._pending = ""
+        self._eof = False
+        self._waiter: Optional[asyncio.Future] = None
+        # 退化模式下尚未完成的 readline，被取消后留给下一次读取
+        self._thread_read: Optional[asyncio.Future] = None
+
+    def _fileno(self) -> Optional[int]:
+        try:
+            return self.stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    async def readline(self, prompt: str = "") -> str:
+        """
+        读取一行输入（不含换行符）
+
+        等待期间可以被取消，已经读到的内容不会丢失。
+
+        Raises:
+            EOFError: 输入已结束
+        """
+        if prompt:
+            self.output.write(prompt)
+            self.output.flush()
+
+        loop = asyncio.get_running_loop()
+        while not self._lines:
+            if self._eof:
+                raise EOFError
+            fd = self._fileno()
+            if fd is None:
+                return await self._readline_in_thread()
+
+            self._waiter = loop.create_future()
+            try:
+                loop.add_reader(fd, self._on_readable, fd)
+            except (OSError, NotImplementedError):
+                # 普通文件或不支持 add_reader 的事件循环
+                self._waiter = None
+                return await self._readline_in_thread()
+            try:
+                await self._waiter
+            finally:
+                loop.remove_reader(fd)
+                self._waiter = None
+        return self._lines.popleft()
+
+    def _on_readable(self, fd: int):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if data:
+            self._pending += self._decoder.decode(data)
+        else:
+            self._pending += self._decoder.decode(b"", final=True)
+            self._eof = True
+
+        *lines, self._pending = self._pending.split("\n")
+        if self._eof and self._pending:
+            lines.append(self._pending)
+            self._pending = ""
+        self._lines.extend(line.rstrip("\r") for line in lines)
+
+        if self._waiter is not None and not self._waiter.done():
+            if self._lines or self._eof:
+                self._waiter.set_result(None)
+
+    async def _readline_in_thread(self) -> str:
+        if self._thread_read is None:
+            self._thread_read = asyncio.ensure_future(
+                asyncio.to_thread(self.stream.readline)
+            )
+        # 取消时线程中的 readline 无法中断，保留它的结果给下一次读取
+        line = await asyncio.shield(self._thread_read)
+        self._thread_read = None
+        if not line:
+            self._eof = True
+            raise EOFError
+        return line.rstrip("\n").rstrip("\r")
+
+
+class Interrupted(Exception):
+    """前台任务被 Ctrl-C 取消"""
+
+
+class InterruptHandler:
+    """
+    Ctrl-C 的处理
+
+    第一次按 Ctrl-C 时取消当前的前台任务（及其运行期间创建的任务），run 抛出 Interrupted；
+    再按一次 Ctrl-C（中间没有任务正常完成）时退出，抛出 KeyboardInterrupt。
+    事件循环不支持信号处理（如 Windows）时保持默认行为，Ctrl-C 直接退出。
+
+    Args:
+        output: 显示提示的输出流，默认标准输出
+    """
+
+    def __init__(self, output: Optional[TextIO] = None):
+        self.output = output or sys.stdout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._main: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Future] = None
+        self._armed = False
+        self._exiting = False
+
+    def __enter__(self) -> "InterruptHandler":
+        self._loop = asyncio.get_running_loop()
+        self._main = asyncio.current_task()
+        try:
+            self._loop.add_signal_handler(signal.SIGINT, self._on_interrupt)
+        except (NotImplementedError, RuntimeError, ValueError):
+            self._loop = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._loop is not None:
+            self._loop.remove_signal_handler(signal.SIGINT)
+            self._loop = None
+        if self._exiting and exc_type is asyncio.CancelledError:
+            raise KeyboardInterrupt from None
+
+    def _on_interrupt(self):
+        if self._armed:
+            self._exiting = True
+            target = self._task if self._task is not None else self._main
+            if target is not None:
+                target.cancel()
+            return
+
+        self._armed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        else:
+            self.output.write("\n（再按一次 Ctrl-C 退出）\n")
+            self.output.flush()
+
+    async def run(self, awaitable: Awaitable[T], message: str = "") -> T:
+        """
+        作为前台任务运行，可以被 Ctrl-C 取消
+
+        Args:
+            awaitable: 要运行的协程
+            message: 被取消后显示的提示
+
+        Raises:
+            Interrupted: 第一次按 Ctrl-C 取消了该任务
+            KeyboardInterrupt: 第二次按 Ctrl-C
+        """
+        before = asyncio.all_tasks()
+        task = asyncio.ensure_future(awaitable)
+        self._task = task
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # 外部取消了 run 本身，而不是 Ctrl-C
+                task.cancel()
+                raise
+            await self._cancel_spawned(before)
+            if self._exiting:
+                raise KeyboardInterrupt from None
+            self.output.write(f"\n{message}（再按一次 Ctrl-C 退出）\n")
+            self.output.flush()
+            raise Interrupted from None
+        finally:
+            self._task = None
+        self._armed = False
+        return result
+
+    async def _cancel_spawned(self, before):
+        """取消前台任务运行期间创建、尚未结束的任务（如并发执行的工具调用）"""
+        current = asyncio.current_task()
+        spawned = [
+            task
+            for task in asyncio.all_tasks() - before
+            if task is not current and not task.done()
+        ]
+        for task in spawned:
+            task.cancel()
+        if spawned:
+            await asyncio.gather(*spawned, return_exceptions=True)
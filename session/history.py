@@ -0,0 +1,389 @@
+"""
+对话历史管理
+
+按估算的 token 数管理主 agent 的对话历史，避免每一轮都把完整历史（包括巨大的工具返回）
+重新发给模型：
+- 模型的思考过程按 HistoryPolicy 删除或截断，完整内容只保存在会话日志中；
+- 超出最近 keep_turns 轮的工具返回替换为简短的占位说明，工具调用参数可按策略截断；
+- 总 token 数超出预算时，把较早的轮次交给 summarizer 总结为一段摘要。
+"""
+
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    ModelResponse,
+    ModelResponsePart,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ThinkingPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from session.log import SessionLog
+
+# 对话历史的默认 token 预算
+DEFAULT_MAX_TOKENS = 32_000
+
+# 保留完整内容的最近轮数
+DEFAULT_KEEP_TURNS = 2
+
+# 估算 token 数不超过该值的工具返回不替换
+DEFAULT_STUB_MIN_TOKENS = 200
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 渲染对话记录时，工具参数与工具返回最多保留的字符数
+TRANSCRIPT_TOOL_CHARS = 500
+
+# 把之前的对话记录总结为摘要
+Summarizer = Callable[[str], Awaitable[str]]
+
+# 思考过程的处理方式
+THINKING_MODES = ("keep", "truncate", "drop")
+
+
+@dataclass
+class HistoryPolicy:
+    """
+    回放给模型的历史中如何处理思考过程和旧的工具调用参数
+
+    Args:
+        thinking: "keep" 保留，"truncate" 截断为 thinking_chars 个字符，"drop" 删除
+        thinking_chars: 截断思考过程时保留的字符数
+        tool_args_chars: 旧轮次的工具调用参数中，超过该长度的字符串值会被截断；
+            None 表示不截断
+    """
+
+    thinking: str = "drop"
+    thinking_chars: int = 200
+    tool_args_chars: Optional[int] = None
+
+    def __post_init__(self):
+        if self.thinking not in THINKING_MODES:
+            raise ValueError(
+                f"thinking 必须是 {', '.join(THINKING_MODES)} 之一: {self.thinking}"
+            )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数：ASCII 字符约 4 个一个 token，其他字符（如中文）约一个一个 token
+    """
+    chars = len(text)
+    # UTF-8 下中文等字符占 3 个字节，多出的字节数约为这些字符数的两倍
+    wide = (len(text.encode("utf-8")) - chars) // 2
+    return (chars - wide) // 4 + wide
+
+
+def _part_text(part) -> str:
+    """消息片段中会发给模型的文本"""
+    if isinstance(part, ToolReturnPart):
+        return part.model_response_str()
+    if isinstance(part, ToolCallPart):
+        return part.args_as_json_str()
+    if isinstance(part, RetryPromptPart):
+        return part.model_response()
+    if isinstance(part, UserPromptPart) and not isinstance(part.content, str):
+        return "".join(item for item in part.content if isinstance(item, str))
+    content = getattr(part, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+def message_tokens(message: ModelMessage) -> int:
+    """估算一条消息的 token 数"""
+    return MESSAGE_OVERHEAD_TOKENS + sum(
+        estimate_tokens(_part_text(part)) for part in message.parts
+    )
+
+
+def _clip(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...（省略 {len(text) - limit} 字符）"
+
+
+def interrupted_turn(
+    messages: Sequence[ModelMessage],
+    partial_output: str = "",
+    prompt: Optional[str] = None,
+) -> List[ModelMessage]:
+    """
+    把被中断的一轮整理为可以继续对话的消息
+
+    去掉末尾还没有得到工具返回的回复（工具调用必须与返回成对出现），
+    再补上一条包含已显示的部分输出的回复。
+
+    Args:
+        messages: 这一轮中已经产生的消息
+        partial_output: 中断前已经显示给用户的回复文本
+        prompt: 用户的输入；这一轮还没有任何请求时用它补上一条请求
+
+    Returns:
+        List[ModelMessage]: 整理后的消息，这一轮还没有任何请求且没有 prompt 时为空
+    """
+    messages = list(messages)
+    while messages and isinstance(messages[-1], ModelResponse):
+        messages.pop()
+    if not messages:
+        if prompt is None:
+            return []
+        messages.append(ModelRequest(parts=[UserPromptPart(content=prompt)]))
+    note = "（用户按 Ctrl-C 中断了这次回复）"
+    content = f"{partial_output}\n{note}" if partial_output else note
+    messages.append(ModelResponse(parts=[TextPart(content=content)]))
+    return messages
+
+
+def render_transcript(messages: Sequence[ModelMessage]) -> str:
+    """把对话渲染为供总结用的纯文本，省略系统提示和思考过程"""
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, (SystemPromptPart, ThinkingPart)):
+                continue
+            if isinstance(part, UserPromptPart):
+                lines.append(f"用户: {_part_text(part)}")
+            elif isinstance(part, TextPart):
+                lines.append(f"助手: {part.content}")
+            elif isinstance(part, ToolCallPart):
+                args = _clip(_part_text(part), TRANSCRIPT_TOOL_CHARS)
+                lines.append(f"调用工具 {part.tool_name}: {args}")
+            elif isinstance(part, ToolReturnPart):
+                content = _clip(_part_text(part), TRANSCRIPT_TOOL_CHARS)
+                lines.append(f"工具 {part.tool_name} 返回: {content}")
+            elif isinstance(part, RetryPromptPart):
+                lines.append(f"工具调用出错: {_part_text(part)}")
+    return "\n".join(lines)
+
+
+class ConversationHistory:
+    """
+    带 token 预算的对话历史
+
+    每次 agent 运行产生的新消息作为一轮通过 add_turn 追加（原地追加，不复制整个历史），
+    之后调用 compact 在超出预算时压缩较早的轮次。
+
+    Args:
+        max_tokens: 对话历史的 token 预算
+        keep_turns: 保留完整内容的最近轮数，至少为 1
+        stub_min_tokens: 超过该 token 数的旧工具返回才替换为占位说明
+        summarizer: 把较早轮次的对话记录总结为摘要；为 None 或总结失败时直接省略这些轮次
+        policy: 思考过程与旧工具调用参数的处理策略，默认删除思考过程
+        log: 会话日志，每一轮的完整消息在截断前写入
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        keep_turns: int = DEFAULT_KEEP_TURNS,
+        stub_min_tokens: int = DEFAULT_STUB_MIN_TOKENS,
+        summarizer: Optional[Summarizer] = None,
+        policy: Optional[HistoryPolicy] = None,
+        log: Optional[SessionLog] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.stub_min_tokens = stub_min_tokens
+        self.summarizer = summarizer
+        self.policy = policy or HistoryPolicy()
+        self.log = log
+
+        self._messages: List[ModelMessage] = []
+        # 与 _messages 一一对应的 token 估算值
+        self._tokens: List[int] = []
+        # 每一轮第一条消息在 _messages 中的下标
+        self._turn_starts: List[int] = []
+        self._total = 0
+
+        self.stubbed = 0
+        self.summarized = 0
+        self.thinking_stripped = 0
+        self.args_clipped = 0
+
+    @property
+    def messages(self) -> List[ModelMessage]:
+        """作为 message_history 传给 agent 的消息列表"""
+        return self._messages
+
+    @property
+    def tokens(self) -> int:
+        """当前历史的估算 token 数"""
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add_turn(self, messages: Sequence[ModelMessage]):
+        """
+        追加一轮对话
+
+        完整消息先写入会话日志，再按策略处理思考过程；刚超出最近 keep_turns 轮的那一轮中，
+        大的工具返回替换为占位说明，工具调用参数按策略截断。
+        """
+        if not messages:
+            return
+        if self.log is not None:
+            self.log.write_turn(messages)
+        self._turn_starts.append(len(self._messages))
+        for message in messages:
+            message = self._strip_thinking(message)
+            tokens = message_tokens(message)
+            self._messages.append(message)
+            self._tokens.append(tokens)
+            self._total += tokens
+
+        # 每一轮只在刚变旧时处理一次，单次追加的开销与历史长度无关
+        aged = len(self._turn_starts) - 1 - self.keep_turns
+        if aged >= 0:
+            self._stub_turn(aged)
+
+    def _turn_range(self, turn: int) -> range:
+        start = self._turn_starts[turn]
+        if turn + 1 < len(self._turn_starts):
+            return range(start, self._turn_starts[turn + 1])
+        return range(start, len(self._messages))
+
+    def _strip_thinking(self, message: ModelMessage) -> ModelMessage:
+        if not isinstance(message, ModelResponse) or self.policy.thinking == "keep":
+            return message
+        thinking = [part for part in message.parts if isinstance(part, ThinkingPart)]
+        # 只有思考过程的回复保持原样，避免回放空回复
+        if not thinking or len(thinking) == len(message.parts):
+            return message
+
+        parts = []
+        for part in message.parts:
+            if not isinstance(part, ThinkingPart):
+                parts.append(part)
+            elif self.policy.thinking == "truncate" and not part.signature:
+                # 带签名的思考过程截断后签名失效，只截断不带签名的
+                content = _clip(part.content, self.policy.thinking_chars)
+                parts.append(replace(part, content=content))
+        self.thinking_stripped += len(thinking)
+        return replace(message, parts=parts)
+
+    def _stub_turn(self, turn: int):
+        for index in self._turn_range(turn):
+            message = self._messages[index]
+            if isinstance(message, ModelRequest):
+                parts = [self._stub_part(part) for part in message.parts]
+            elif self.policy.tool_args_chars is not None:
+                parts = [self._clip_tool_args(part) for part in message.parts]
+            else:
+                continue
+            if all(new is old for new, old in zip(parts, message.parts)):
+                continue
+            self._set_message(index, replace(message, parts=parts))
+
+    def _stub_part(self, part: ModelRequestPart) -> ModelRequestPart:
+        if not isinstance(part, ToolReturnPart):
+            return part
+        tokens = estimate_tokens(_part_text(part))
+        if tokens <= self.stub_min_tokens:
+            return part
+        self.stubbed += 1
+        stub = f"[{part.tool_name} 的返回已省略（约 {tokens} token），需要时请重新调用]"
+        return replace(part, content=stub)
+
+    def _clip_tool_args(self, part: ModelResponsePart) -> ModelResponsePart:
+        if not isinstance(part, ToolCallPart):
+            return part
+        limit = self.policy.tool_args_chars
+        try:
+            args = part.args_as_dict()
+        except (ValueError, AssertionError):
+            # 参数不是 JSON 对象时无法逐项截断，保持原样
+            return part
+        clipped = {
+            key: _clip(value, limit) if isinstance(value, str) else value
+            for key, value in args.items()
+        }
+        if all(clipped[key] is args[key] for key in args):
+            return part
+        self.args_clipped += 1
+        return replace(part, args=clipped)
+
+    def _set_message(self, index: int, message: ModelMessage):
+        tokens = message_tokens(message)
+        self._total += tokens - self._tokens[index]
+        self._messages[index] = message
+        self._tokens[index] = tokens
+
+    async def compact(self) -> bool:
+        """
+        超出 token 预算时，把最近 keep_turns 轮之前的对话压缩为一段摘要
+
+        摘要与原系统提示一起并入保留的第一轮的请求中，工具调用与其返回不会被拆开。
+
+        Returns:
+            bool: 是否进行了压缩
+        """
+        if self._total <= self.max_tokens or len(self._turn_starts) <= self.keep_turns:
+            return False
+
+        kept_starts = self._turn_starts[-self.keep_turns :]
+        boundary = kept_starts[0]
+        old = self._messages[:boundary]
+        turns = len(self._turn_starts) - self.keep_turns
+
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer(render_transcript(old))
+            except Exception:
+                summary = None
+        if summary:
+            note = f"以下是之前 {turns} 轮对话的摘要:\n{summary}"
+        else:
+            note = f"（之前的 {turns} 轮对话已省略）"
+
+        # 有历史时 agent 不会再添加系统提示，需要保留下来
+        system_parts = [
+            part
+            for message in old
+            if isinstance(message, ModelRequest)
+            for part in message.parts
+            if isinstance(part, SystemPromptPart)
+        ]
+        parts = [*system_parts, UserPromptPart(content=note)]
+        first = self._messages[boundary]
+        if isinstance(first, ModelRequest):
+            head = [replace(first, parts=parts + first.parts)]
+        else:
+            head = [ModelRequest(parts=parts), first]
+
+        head_tokens = [message_tokens(message) for message in head]
+        self._total += sum(head_tokens) - sum(self._tokens[: boundary + 1])
+        self._messages[: boundary + 1] = head
+        self._tokens[: boundary + 1] = head_tokens
+        shift = boundary + 1 - len(head)
+        self._turn_starts = [0] + [start - shift for start in kept_starts[1:]]
+        self.summarized += turns
+        return True
+
+    def clear(self):
+        """清空对话历史"""
+        self._messages.clear()
+        self._tokens.clear()
+        self._turn_starts.clear()
+        self._total = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回轮数、消息数、估算 token 数，以及各种压缩处理的次数"""
+        return {
+            "turns": len(self._turn_starts),
+            "messages": len(self._messages),
+            "tokens": self._total,
+            "stubbed": self.stubbed,
+            "summarized": self.summarized,
+            "thinking": self.thinking_stripped,
+            "tool_args": self.args_clipped,
+        }
@@ -0,0 +1,56 @@
+"""
+会话日志
+
+回放给模型的对话历史会被截断和压缩，完整的消息（包括思考过程和完整的工具返回）
+按轮追加保存在 <root>/.agent/sessions/<开始时间>-<进程号>.jsonl 中，便于事后查看。
+"""
+
+import json
+import os
+import time
+from typing import List, Optional, Sequence
+
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
+
+
+class SessionLog:
+    """
+    一次会话的完整消息日志
+
+    Args:
+        root: 工作区根目录
+        name: 日志文件名（不含扩展名），默认使用会话开始时间和进程号
+    """
+
+    def __init__(self, root: str = ".", name: Optional[str] = None):
+        name = name or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.path = os.path.join(
+            os.path.realpath(root), ".agent", "sessions", f"{name}.jsonl"
+        )
+        self.turns = 0
+
+    def write_turn(self, messages: Sequence[ModelMessage]):
+        """追加一轮对话的完整消息"""
+        self.turns += 1
+        entry = {
+            "turn": self.turns,
+            "time": time.time(),
+            "messages": ModelMessagesTypeAdapter.dump_python(
+                list(messages), mode="json"
+            ),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def read_turns(self) -> List[List[ModelMessage]]:
+        """读取日志中的所有轮次"""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                entries = [json.loads(line) for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+        return [
+            ModelMessagesTypeAdapter.validate_python(entry["messages"])
+            for entry in entries
+        ]
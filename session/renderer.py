@@ -0,0 +1,160 @@
+"""
+终端输出
+
+- FrameRenderer 合并模型逐 token 产生的增量文本，按帧率上限批量写出；
+- NestedSection 把子 agent（如 coder）的流式输出作为主输出中缩进的一段显示。
+"""
+
+import asyncio
+import sys
+import time
+from typing import Callable, List, Optional, TextIO
+
+# 终端中每秒最多刷新的次数
+DEFAULT_FPS = 30
+
+# 非终端（重定向到文件或管道）时，缓冲超过该字符数才写出
+BULK_CHARS = 64 * 1024
+
+
+class FrameRenderer:
+    """
+    合并流式输出的增量文本
+
+    增量先放入缓冲列表：输出到终端时，遇到换行或距上次刷新超过一帧时一次写出并 flush，
+    未写出的内容在一帧之后由事件循环定时写出；输出到文件或管道时只在缓冲超过 bulk_chars
+    或调用 flush 时写出。
+
+    Args:
+        stream: 输出流，默认标准输出
+        fps: 每秒最多刷新的次数
+        interactive: 是否按终端方式刷新，默认根据 stream.isatty() 判断
+        bulk_chars: 非终端时缓冲的字符数上限
+        clock: 时钟函数，用于测试
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        fps: float = DEFAULT_FPS,
+        interactive: Optional[bool] = None,
+        bulk_chars: int = BULK_CHARS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.stream = stream or sys.stdout
+        self.interval = 1 / fps
+        if interactive is None:
+            isatty = getattr(self.stream, "isatty", None)
+            interactive = bool(isatty and isatty())
+        self.interactive = interactive
+        self.bulk_chars = bulk_chars
+        self.clock = clock
+
+        self._buffer: List[str] = []
+        self._size = 0
+        self._last_flush = float("-inf")
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def write(self, delta: str):
+        """写入一段增量文本"""
+        if not delta:
+            return
+        self._buffer.append(delta)
+        self._size += len(delta)
+
+        if not self.interactive:
+            if self._size >= self.bulk_chars:
+                self._write_buffer()
+            return
+
+        elapsed = self.clock() - self._last_flush
+        if "\n" in delta or elapsed >= self.interval:
+            self.flush()
+        elif self._timer is None:
+            self._schedule(self.interval - elapsed)
+
+    def _schedule(self, delay: float):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环时只能等下一次写入或 flush
+            return
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self._buffer.clear()
+            self._size = 0
+
+    def flush(self):
+        """立即写出缓冲的内容"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._write_buffer()
+        self.stream.flush()
+        self._last_flush = self.clock()
+
+    def close(self):
+        """写出剩余内容"""
+        self.flush()
+
+    def __enter__(self) -> "FrameRenderer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NestedSection:
+    """
+    在终端中以缩进的方式显示一段嵌套输出，第一次写入时才打印标题
+
+    输出经过 FrameRenderer 合并后写出。嵌套在主输出中时应传入主输出的 renderer：
+    各自缓冲时，非终端下主输出中尚未写出的内容会出现在嵌套段之后。
+
+    Args:
+        title: 段落标题
+        stream: 输出流，默认标准输出；指定 renderer 时不使用
+        renderer: 与主输出共用的 FrameRenderer，不指定时单独创建一个
+    """
+
+    def __init__(
+        self,
+        title: str,
+        stream: Optional[TextIO] = None,
+        renderer: Optional[FrameRenderer] = None,
+    ):
+        self.title = title
+        self._owns_renderer = renderer is None
+        self._renderer = renderer or FrameRenderer(stream)
+        self.stream = self._renderer.stream
+        self._started = False
+
+    def write(self, delta: str):
+        """写入一段增量文本"""
+        if not delta:
+            return
+        if not self._started:
+            self._started = True
+            self._renderer.write(f"\n┌─ {self.title}\n│ ")
+        self._renderer.write(delta.replace("\n", "\n│ "))
+
+    def close(self):
+        """结束该段输出"""
+        if self._started:
+            self._renderer.write("\n└─\n")
+            if self._owns_renderer:
+                self._renderer.close()
+            self._started = False
+
+    def __enter__(self) -> "NestedSection":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试 backup_store 模块的功能
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.backup_store import BackupStore, file_digest
+from tools.code_patcher import apply_patch
+
+
+class TestBackupStore(unittest.TestCase):
+    """测试备份对象的去重、修改日志与撤销/重做"""
+
+    def setUp(self):
+        """创建临时工作区"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.store = BackupStore(self.root)
+        self.path = os.path.join(self.root, "a.py")
+        self._write("a = 1\n")
+
+    def tearDown(self):
+        """删除临时工作区"""
+        self.temp_dir.cleanup()
+
+    def _write(self, content):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def _read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def _objects(self):
+        return sorted(
+            name
+            for _, _, files in os.walk(self.store.objects_dir)
+            for name in files
+        )
+
+    def _patch(self, old, new):
+        patch = f"@@ -1 +1 @@\n-{old}\n+{new}\n"
+        self.assertTrue(apply_patch(patch, self.path, store=self.store))
+
+    def test_same_content_stored_once(self):
+        """测试相同内容只保存一个对象"""
+        digest = self.store.store_file(self.path)
+        self.assertEqual(self.store.store_file(self.path), digest)
+        self.assertEqual(digest, file_digest(self.path))
+        self.assertEqual(len(self._objects()), 1)
+
+        self._patch("a = 1", "a = 2")
+        self._patch("a = 2", "a = 1")
+        self._patch("a = 1", "a = 2")
+        self.assertEqual(len(self._objects()), 2)
+
+    def test_replace_failure_unlinks_object(self):
+        """测试替换失败时不留下与工作文件共用 inode 的对象"""
+        missing = os.path.join(self.root, "missing.tmp")
+        with self.assertRaises(FileNotFoundError):
+            self.store.replace_file(missing, self.path)
+        self.assertEqual(self._objects(), [])
+
+        temp_path = os.path.join(self.root, "new.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("a = 2\n")
+        before = self.store.replace_file(temp_path, self.path)
+        self.assertEqual(self._read(), "a = 2\n")
+        self._write("a = 3\n")
+        self.store.restore(self.path, before)
+        self.assertEqual(self._read(), "a = 1\n")
+
+    def test_journal(self):
+        """测试修改日志记录路径和前后哈希，且不再生成 .orig 文件"""
+        before = file_digest(self.path)
+        self._patch("a = 1", "a = 2")
+
+        with open(self.store.journal_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(
+            entries[0]["files"],
+            [{"path": "a.py", "before": before, "after": file_digest(self.path)}],
+        )
+        self.assertFalse(os.path.exists(self.path + ".orig"))
+
+    def test_undo_redo(self):
+        """测试按顺序撤销和重做多次修改"""
+        self._patch("a = 1", "a = 2")
+        self._patch("a = 2", "a = 3")
+
+        self.store.undo()
+        self.assertEqual(self._read(), "a = 2\n")
+        self.store.undo()
+        self.assertEqual(self._read(), "a = 1\n")
+        with self.assertRaises(ValueError):
+            self.store.undo()
+
+        self.store.redo()
+        self.assertEqual(self._read(), "a = 2\n")
+        self.assertEqual(len(self.store.history()), 2)
+        self.assertIn("已撤销", self.store.history()[0])
+
+        # 新的修改会清空重做栈
+        self._patch("a = 2", "a = 4")
+        with self.assertRaises(ValueError):
+            self.store.redo()
+
+    def test_undo_refuses_modified_file(self):
+        """测试文件在修改后又被改动时拒绝撤销"""
+        self._patch("a = 1", "a = 2")
+        self._write("a = 5\n")
+        with self.assertRaises(ValueError):
+            self.store.undo()
+        self.assertEqual(self._read(), "a = 5\n")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
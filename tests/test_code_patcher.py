@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+测试 code_patcher 模块的功能
+"""
+
+import difflib
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.backup_store import BackupStore, get_backup_store
+from tools.code_patcher import (
+    HunkParser,
+    _apply_hunks,
+    _parse_patch,
+    apply_patch,
+    apply_patch_set,
+    check_hunk,
+    iter_hunks,
+    merge_region_patches,
+    patch_file,
+)
+
+
+def _unified_diff(old_lines, new_lines, n=3):
+    """用 difflib 生成参考补丁"""
+    return "".join(difflib.unified_diff(old_lines, new_lines, "a.py", "b.py", n=n))
+
+
+class TestApplyHunks(unittest.TestCase):
+    """测试补丁的解析与应用"""
+
+    def test_random_patches(self):
+        """测试随机修改生成的补丁都能还原出新内容"""
+        rng = random.Random(7)
+        for _ in range(200):
+            size = rng.randint(0, 40)
+            old_lines = [f"line {rng.randint(0, 20)}\n" for _ in range(size)]
+            new_lines = list(old_lines)
+            for _ in range(rng.randint(1, 5)):
+                pos = rng.randint(0, len(new_lines))
+                if new_lines and rng.random() < 0.5:
+                    del new_lines[min(pos, len(new_lines) - 1)]
+                else:
+                    new_lines.insert(pos, f"new {rng.randint(0, 99)}\n")
+
+            patch = _unified_diff(old_lines, new_lines, n=rng.randint(0, 3))
+            self.assertEqual(_apply_hunks(old_lines, _parse_patch(patch)), new_lines)
+
+    def test_context_mismatch(self):
+        """测试上下文不匹配时拒绝应用"""
+        patch = "@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+        with self.assertRaises(ValueError):
+            _apply_hunks(["a\n", "x\n"], _parse_patch(patch))
+
+    def test_blank_context_line_without_space(self):
+        """测试丢失前导空格的空白上下文行"""
+        patch = "@@ -1,3 +1,3 @@\n a\n\n-b\n+c\n"
+        self.assertEqual(
+            _apply_hunks(["a\n", "\n", "b\n"], _parse_patch(patch)),
+            ["a\n", "\n", "c\n"],
+        )
+
+    def test_multiple_files_header_not_a_change(self):
+        """测试下一个文件头不会被当作删除行"""
+        patch = "--- a\n+++ b\n@@ -1 +1 @@\n-a\n+b\n--- c\n+++ d\n"
+        self.assertEqual(_parse_patch(patch)[0].changes, ["-a", "+b"])
+
+    def test_no_newline_at_end_of_file(self):
+        """测试 "\\ No newline at end of file" 标记"""
+        patch = _unified_diff(["a\n", "b\n"], ["a\n", "c"])
+        patch = patch.replace("+c", "+c\n\\ No newline at end of file")
+        self.assertEqual(
+            _apply_hunks(["a\n", "b\n"], _parse_patch(patch)), ["a\n", "c"]
+        )
+
+    def test_large_file_near_top(self):
+        """测试在大文件开头插入大量行"""
+        old_lines = [f"line {i}\n" for i in range(100000)]
+        added = [f"added {i}\n" for i in range(5000)]
+        new_lines = old_lines[:10] + added + old_lines[10:]
+        patch = _unified_diff(old_lines[:13], new_lines[:5013])
+        self.assertEqual(_apply_hunks(old_lines, _parse_patch(patch)), new_lines)
+
+    def test_apply_patch_file(self):
+        """测试 apply_patch 写入文件，失败时保持文件不变"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("a\nb\n")
+
+            self.assertFalse(apply_patch("@@ -1 +1 @@\n-x\n+y\n", path, backup=False))
+            self.assertTrue(apply_patch("@@ -2 +2 @@\n-b\n+c\n", path, backup=False))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "a\nc\n")
+
+    def test_streaming_matches_in_memory(self):
+        """测试流式应用与内存中应用的结果一致"""
+        rng = random.Random(11)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            store = BackupStore(temp_dir)
+            for _ in range(50):
+                old_lines = [f"line {i}\n" for i in range(rng.randint(1, 60))]
+                new_lines = list(old_lines)
+                for _ in range(3):
+                    new_lines.insert(rng.randint(0, len(new_lines)), "new\n")
+                    del new_lines[rng.randint(0, len(new_lines) - 1)]
+                patch = _unified_diff(old_lines, new_lines)
+                if not patch:
+                    continue
+
+                with open(path, "w", encoding="utf-8") as f:
+                    f.writelines(old_lines)
+                self.assertTrue(
+                    apply_patch(patch, path, streaming=True, store=store)
+                )
+                with open(path, encoding="utf-8") as f:
+                    self.assertEqual(f.read(), "".join(new_lines))
+                store.undo()
+                with open(path, encoding="utf-8") as f:
+                    self.assertEqual(f.read(), "".join(old_lines))
+                store.redo()
+
+    def test_crlf_preserved(self):
+        """测试 CRLF 文件在内存与流式两种方式下都保持 CRLF"""
+        patch = "@@ -4,3 +4,3 @@\n line 4\n-line 5\n+LINE 5\n line 6\n"
+        expected = b"".join(
+            (b"LINE 5" if i == 5 else b"line %d" % i) + b"\r\n" for i in range(1, 9)
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            for streaming in (False, True):
+                with open(path, "wb") as f:
+                    f.write(b"".join(b"line %d\r\n" % i for i in range(1, 9)))
+                self.assertTrue(
+                    apply_patch(patch, path, backup=False, streaming=streaming)
+                )
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), expected)
+
+    def test_mixed_line_endings_kept(self):
+        """测试混合换行符的文件只有新增行使用首行的换行符，两种方式结果一致"""
+        patch = "@@ -3,2 +3,2 @@\n c\n-d\n+D\n"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            for streaming in (False, True):
+                with open(path, "wb") as f:
+                    f.write(b"a\r\nb\nc\nd\n")
+                self.assertTrue(
+                    apply_patch(patch, path, backup=False, streaming=streaming)
+                )
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), b"a\r\nb\nc\nD\r\n")
+
+    def test_streaming_failure_leaves_file(self):
+        """测试流式应用失败时原文件和目录保持不变"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("a\nb\n")
+
+            patch = "@@ -1,2 +1,2 @@\n a\n-x\n+y\n"
+            self.assertFalse(apply_patch(patch, path, streaming=True))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "a\nb\n")
+            self.assertEqual(os.listdir(temp_dir), ["a.py"])
+
+
+class TestApplyPatchSet(unittest.TestCase):
+    """测试多文件补丁的事务性应用"""
+
+    def setUp(self):
+        """创建临时工作区"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self._write("a.py", "a = 1\nb = 2\n")
+        self._write("pkg/b.py", "x = 1\n")
+
+    def tearDown(self):
+        """删除临时工作区"""
+        self.temp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def _read(self, name):
+        with open(os.path.join(self.root, name), encoding="utf-8") as f:
+            return f.read()
+
+    def test_modify_create_delete(self):
+        """测试同时修改、新建和删除文件"""
+        patch = (
+            "--- a/a.py\n+++ b/a.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n"
+            "--- /dev/null\n+++ b/new/c.py\n@@ -0,0 +1,1 @@\n+c = 1\n"
+            "--- a/pkg/b.py\n+++ /dev/null\n@@ -1,1 +0,0 @@\n-x = 1\n"
+        )
+        summary = apply_patch_set(patch, self.root)
+        self.assertEqual(len(summary), 3)
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 3\n")
+        self.assertEqual(self._read("new/c.py"), "c = 1\n")
+        self.assertFalse(os.path.exists(os.path.join(self.root, "pkg/b.py")))
+
+        # 多文件补丁作为一次修改整体撤销
+        get_backup_store(self.root).undo()
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 2\n")
+        self.assertEqual(self._read("pkg/b.py"), "x = 1\n")
+        self.assertFalse(os.path.exists(os.path.join(self.root, "new/c.py")))
+
+    def test_rename(self):
+        """测试带 git 重命名头时重命名并修改文件"""
+        patch = (
+            "diff --git a/pkg/b.py b/pkg/d.py\nsimilarity index 50%\n"
+            "rename from pkg/b.py\nrename to pkg/d.py\n"
+            "--- a/pkg/b.py\n+++ b/pkg/d.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+        )
+        summary = apply_patch_set(patch, self.root, backup=False)
+        self.assertEqual(summary, ["renamed pkg/b.py -> pkg/d.py (1 hunk)"])
+        self.assertEqual(self._read("pkg/d.py"), "x = 2\n")
+        self.assertEqual(os.listdir(os.path.join(self.root, "pkg")), ["d.py"])
+
+    def test_mismatched_names_patch_in_place(self):
+        """测试文件名不一致但没有重命名头时，像 GNU patch 一样原地修改已有文件"""
+        patch = "--- pkg/b.py\n+++ pkg/b.py.new\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+        summary = apply_patch_set(patch, self.root, backup=False)
+        self.assertEqual(summary, ["modified pkg/b.py (1 hunk)"])
+        self.assertEqual(self._read("pkg/b.py"), "x = 2\n")
+        self.assertEqual(os.listdir(os.path.join(self.root, "pkg")), ["b.py"])
+
+        # 旧路径不存在时修改新路径上的文件
+        patch = "--- info.py\n+++ a.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n"
+        self.assertEqual(
+            apply_patch_set(patch, self.root, backup=False), ["modified a.py (1 hunk)"]
+        )
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 3\n")
+        self.assertFalse(os.path.exists(os.path.join(self.root, "info.py")))
+
+    def test_mixed_line_endings_kept(self):
+        """测试多文件补丁保留未修改行各自的换行符"""
+        with open(os.path.join(self.root, "a.py"), "wb") as f:
+            f.write(b"a = 1\r\nb = 2\nc = 3\n")
+        patch = "--- a/a.py\n+++ b/a.py\n@@ -2,2 +2,2 @@\n b = 2\n-c = 3\n+c = 4\n"
+        apply_patch_set(patch, self.root, backup=False)
+        with open(os.path.join(self.root, "a.py"), "rb") as f:
+            self.assertEqual(f.read(), b"a = 1\r\nb = 2\nc = 4\r\n")
+
+    def test_failure_changes_nothing(self):
+        """测试任一文件不匹配时所有文件保持不变"""
+        patch = (
+            "--- a/a.py\n+++ b/a.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n"
+            "--- /dev/null\n+++ b/new/c.py\n@@ -0,0 +1,1 @@\n+c = 1\n"
+            "--- a/pkg/b.py\n+++ b/pkg/b.py\n@@ -1 +1 @@\n-y = 1\n+y = 2\n"
+        )
+        with self.assertRaises(ValueError) as context:
+            apply_patch_set(patch, self.root)
+        self.assertIn("pkg/b.py", str(context.exception))
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 2\n")
+        self.assertEqual(sorted(os.listdir(self.root)), ["a.py", "pkg"])
+
+    def test_section_without_hunks_rejected(self):
+        """测试有文件头但没有可解析 hunk 的文件导致整个补丁失败"""
+        patch = (
+            "--- a/a.py\n+++ b/a.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n"
+            "--- a/pkg/b.py\n+++ b/pkg/b.py\n@@ -1 +1\n-x = 1\n+x = 2\n"
+        )
+        with self.assertRaises(ValueError) as context:
+            apply_patch_set(patch, self.root)
+        self.assertEqual(str(context.exception), "pkg/b.py: no hunks found")
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 2\n")
+        self.assertEqual(self._read("pkg/b.py"), "x = 1\n")
+
+    def test_commit_failure_rolls_back(self):
+        """测试替换过程中出错时回滚已替换的文件"""
+        patch = (
+            "--- a/a.py\n+++ b/a.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n"
+            "--- a/pkg/b.py\n+++ b/pkg/b.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+        )
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return real_replace(src, dst)
+
+        os.replace = failing_replace
+        try:
+            with self.assertRaises(OSError):
+                apply_patch_set(patch, self.root)
+        finally:
+            os.replace = real_replace
+
+        self.assertEqual(self._read("a.py"), "a = 1\nb = 2\n")
+        self.assertEqual(self._read("pkg/b.py"), "x = 1\n")
+        self.assertEqual(sorted(os.listdir(self.root)), ["a.py", "pkg"])
+        self.assertEqual(os.listdir(os.path.join(self.root, "pkg")), ["b.py"])
+
+    def test_path_outside_root(self):
+        """测试拒绝工作区之外的路径"""
+        patch = "--- a/../x.py\n+++ b/../x.py\n@@ -1 +1 @@\n-x\n+y\n"
+        with self.assertRaises(ValueError):
+            apply_patch_set(patch, self.root)
+
+
+class TestHunkRelocation(unittest.TestCase):
+    """测试行号漂移时的补丁定位与模糊匹配"""
+
+    def setUp(self):
+        """创建临时测试文件"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "a.py")
+        self.lines = [f"line {i}\n" for i in range(1, 101)]
+
+    def tearDown(self):
+        """删除临时目录"""
+        self.temp_dir.cleanup()
+
+    def _patch(self, patch, **kwargs):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(self.lines)
+        report = patch_file(patch, self.path, backup=False, **kwargs)
+        with open(self.path, encoding="utf-8") as f:
+            return report, f.read()
+
+    def test_offset(self):
+        """测试行号偏移后仍能找到上下文，并报告偏移量"""
+        patch = "@@ -40,3 +40,3 @@\n line 50\n-line 51\n+changed\n line 52\n"
+        report, content = self._patch(patch)
+        self.assertTrue(report.applied)
+        self.assertEqual(report.hunks[0].applied_start, 50)
+        self.assertEqual(report.hunks[0].offset, 10)
+        self.assertIn("offset 10 lines", report.render())
+        self.assertIn("line 50\nchanged\nline 52\n", content)
+
+    def test_offset_carried_to_later_hunks(self):
+        """测试后续补丁块沿用前一块的偏移量"""
+        self.lines[60] = self.lines[20]
+        patch = (
+            "@@ -16,1 +16,1 @@\n-line 21\n+first\n"
+            "@@ -56,1 +56,1 @@\n-line 21\n+second\n"
+        )
+        report, content = self._patch(patch)
+        self.assertEqual([h.applied_start for h in report.hunks], [21, 61])
+        self.assertEqual(content.count("first"), 1)
+        self.assertEqual(content.count("second"), 1)
+        self.assertLess(content.index("first"), content.index("second"))
+
+    def test_nearest_match_wins(self):
+        """测试有多处匹配时选择离指定行最近的位置"""
+        self.lines[10] = self.lines[80] = "dup\n"
+        report, content = self._patch("@@ -75 +75 @@\n-dup\n+x\n")
+        self.assertEqual(report.hunks[0].applied_start, 81)
+
+    def test_fuzz(self):
+        """测试首尾上下文不匹配时按 fuzz 忽略"""
+        patch = "@@ -10,3 +10,3 @@\n stale\n-line 11\n+changed\n line 12\n"
+        report, _ = self._patch(patch, fuzz=0)
+        self.assertFalse(report.applied)
+        self.assertIn("does not match line 10", report.hunks[0].error)
+
+        report, content = self._patch(patch, fuzz=1)
+        self.assertTrue(report.applied)
+        self.assertEqual(report.hunks[0].fuzz, 1)
+        self.assertIn("line 10\nchanged\nline 12\n", content)
+
+    def test_max_offset(self):
+        """测试超出 max_offset 时不再搜索"""
+        patch = "@@ -40 +40 @@\n-line 51\n+changed\n"
+        report, content = self._patch(patch, max_offset=5)
+        self.assertFalse(report.applied)
+        self.assertEqual(content, "".join(self.lines))
+
+    def test_streaming_offset(self):
+        """测试流式应用同样支持偏移定位"""
+        patch = "@@ -40,3 +40,3 @@\n line 50\n-line 51\n+changed\n line 52\n"
+        report, content = self._patch(patch, streaming=True)
+        self.assertEqual(report.hunks[0].offset, 10)
+        self.assertIn("line 50\nchanged\nline 52\n", content)
+
+
+class TestDryRun(unittest.TestCase):
+    """测试只校验不写入的补丁检查"""
+
+    def setUp(self):
+        """创建临时测试文件"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "a.py")
+        self.content = "".join(f"line {i}\n" for i in range(1, 41))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        """删除临时目录"""
+        self.temp_dir.cleanup()
+
+    def test_reports_every_hunk(self):
+        """测试逐块报告结果，失败的块不影响其余块的检查"""
+        patch = (
+            "@@ -5 +5 @@\n-line 5\n+five\n"
+            "@@ -10 +10 @@\n-nope\n+ten\n"
+            "@@ -18 +18 @@\n-line 20\n+twenty\n"
+        )
+        for streaming in (False, True):
+            report = patch_file(patch, self.path, dry_run=True, streaming=streaming)
+            self.assertFalse(report.ok)
+            self.assertFalse(report.applied)
+            self.assertEqual([h.number for h in report.hunks], [1, 2, 3])
+            self.assertIsNone(report.hunks[0].error)
+            self.assertIn("expected 'nope'", report.hunks[1].error)
+            self.assertEqual(report.hunks[2].offset, 2)
+            self.assertIn("Hunk #2 FAILED", report.render())
+
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["a.py"])
+
+    def test_clean_patch(self):
+        """测试可以干净应用的补丁"""
+        report = patch_file("@@ -5 +5 @@\n-line 5\n+five\n", self.path, dry_run=True)
+        self.assertTrue(report.ok)
+        self.assertIn("applies cleanly", report.render())
+
+    def test_failed_apply_reports_every_hunk(self):
+        """测试实际应用失败时同样返回每个块的结果"""
+        patch = "@@ -5 +5 @@\n-line 5\n+five\n@@ -10 +10 @@\n-nope\n+ten\n"
+        for streaming in (False, True):
+            report = patch_file(patch, self.path, backup=False, streaming=streaming)
+            self.assertFalse(report.applied)
+            self.assertEqual(len(report.hunks), 2)
+            self.assertIsNone(report.hunks[0].error)
+            self.assertIn("expected 'nope'", report.hunks[1].error)
+            self.assertIn("Hunk #2 FAILED", report.render())
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["a.py"])
+
+
+class TestIterHunks(unittest.TestCase):
+    """测试逐块解析补丁的生成器"""
+
+    def test_file_lines(self):
+        """测试直接解析带换行符的行（如文件对象）"""
+        patch = (
+            "--- a/x.py\n+++ b/y.py\n@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+            "\\ No newline at end of file\n"
+            "--- a/z.py\n+++ b/z.py\n@@ -3 +3,0 @@\n-d\n"
+        )
+        hunks = list(iter_hunks(patch.splitlines(keepends=True)))
+        self.assertEqual(len(hunks), 2)
+        self.assertEqual(
+            hunks[0].changes, [" a", "-b", "+c", "\\ No newline at end of file"]
+        )
+        self.assertEqual((hunks[0].old_path, hunks[0].new_path), ("x.py", "y.py"))
+        self.assertEqual((hunks[1].old_start, hunks[1].new_count), (3, 0))
+        self.assertEqual(hunks[1].file_index, 2)
+        self.assertFalse(hasattr(hunks[0], "__dict__"))
+
+    def test_text_after_hunk(self):
+        """测试行数用完后 diff 之后的说明文字（如 "- " 列表）不属于该块"""
+        patch = "@@ -1,2 +1,2 @@\n a\n-b\n+c\n\n修改说明:\n- 修改了 b 为 c\n+ 保持 a 不变\n"
+        hunks = list(iter_hunks(patch))
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual(hunks[0].changes, [" a", "-b", "+c"])
+        self.assertEqual(_apply_hunks(["a\n", "b\n"], hunks), ["a\n", "c\n"])
+
+    def test_lazy(self):
+        """测试在读完整个补丁之前就能得到前面的块"""
+
+        def lines():
+            yield "@@ -1 +1 @@"
+            yield "-a"
+            yield "+b"
+            yield "@@ -5 +5 @@"
+            raise AssertionError("read past the second hunk header")
+
+        hunk = next(iter_hunks(lines()))
+        self.assertEqual(hunk.changes, ["-a", "+b"])
+
+    def test_parser_feed(self):
+        """测试逐行推入时，下一个块头出现即返回上一个完整的块"""
+        parser = HunkParser()
+        self.assertEqual(parser.feed("@@ -1 +1 @@"), [])
+        self.assertEqual(parser.feed("-a"), [])
+        self.assertEqual(parser.feed("+b"), [])
+        completed = parser.feed("@@ -5 +5 @@")
+        self.assertEqual([hunk.changes for hunk in completed], [["-a", "+b"]])
+        parser.feed("-e")
+        parser.feed("+f")
+        self.assertEqual([hunk.old_start for hunk in parser.close()], [5])
+
+    def test_check_hunk(self):
+        """测试单独校验一个块"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("a\nb\nc\n")
+            good, bad = iter_hunks("@@ -1 +1 @@\n-b\n+x\n@@ -3 +3 @@\n-z\n+y\n")
+            self.assertEqual(check_hunk(path, good).offset, 1)
+            result = check_hunk(path, bad, number=2)
+            self.assertEqual(result.number, 2)
+            self.assertIn("expected 'z'", result.error)
+
+
+class TestMergeRegionPatches(unittest.TestCase):
+    """测试把分段生成的补丁合并为整个文件的补丁"""
+
+    def test_merge(self):
+        """测试分段补丁的行号（相对或绝对）被换算为文件行号"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            lines = [f"l{i}\n" for i in range(1, 31)]
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+
+            patch, errors = merge_region_patches(
+                path,
+                [
+                    (1, 10, "@@ -2 +2 @@\n-l2\n+L2\n"),
+                    (11, 20, "@@ -15 +15 @@\n-l15\n+L15\n"),
+                    (21, 30, "@@ -3 +3 @@\n-l23\n+L23\n"),
+                ],
+            )
+            self.assertEqual(errors, [])
+            self.assertTrue(apply_patch(patch, path, backup=False))
+            expected = list(lines)
+            for i in (1, 14, 22):
+                expected[i] = expected[i].upper()
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.readlines(), expected)
+
+    def test_failed_region_skipped(self):
+        """测试无法应用的段被跳过并给出说明"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "a.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("a\nb\nc\nd\n")
+            patch, errors = merge_region_patches(
+                path,
+                [
+                    (1, 2, "@@ -1 +1 @@\n-a\n+A\n"),
+                    (3, 4, "@@ -1 +1 @@\n-x\n+y\n"),
+                ],
+            )
+            self.assertIn("+A", patch)
+            self.assertEqual(len(errors), 1)
+            self.assertIn("Lines 3-4", errors[0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试 code_search 模块的功能
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools import code_search
+from tools.code_search import TrigramIndex, query_trigrams, search_code
+
+
+class TestCodeSearch(unittest.TestCase):
+    """测试三元组索引与正则搜索"""
+
+    def setUp(self):
+        """创建临时工作区"""
+        self.root = tempfile.mkdtemp()
+        self._write("a.py", "def hello_world():\n    return 'Hello'\n")
+        self._write(
+            "pkg/b.py", "class TestClass:\n    def get_value(self):\n        pass\n"
+        )
+        self._write("pkg/c.txt", "hello again\n")
+        with open(os.path.join(self.root, "data.bin"), "wb") as f:
+            f.write(b"\0hello_world\0")
+
+    def tearDown(self):
+        """删除临时工作区"""
+        shutil.rmtree(self.root)
+
+    def _write(self, rel_path, content):
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_query_trigrams(self):
+        """测试从正则中提取必要三元组"""
+        self.assertEqual(query_trigrams("ab|cd"), [])
+        self.assertEqual(len(query_trigrams("abcd")), 2)
+        self.assertEqual(query_trigrams("ABC"), query_trigrams("abc"))
+        self.assertEqual(len(query_trigrams(r"(foo)+\s*bar?")), 1)
+
+    def test_candidates(self):
+        """测试只有包含全部三元组的文本文件才是候选"""
+        index = TrigramIndex(self.root)
+        self.assertEqual(index.refresh(), 4)
+        self.assertEqual(index.candidates(query_trigrams("hello_world")), ["a.py"])
+        self.assertEqual(
+            index.candidates(query_trigrams("hello"), glob="pkg/*"), ["pkg/c.txt"]
+        )
+
+    def test_incremental_refresh(self):
+        """测试按修改时间增量更新，并从磁盘恢复索引"""
+        index = TrigramIndex(self.root)
+        index.refresh()
+        self.assertEqual(index.refresh(), 0)
+
+        self._write("a.py", "def goodbye():\n    pass\n")
+        os.utime(os.path.join(self.root, "a.py"), ns=(0, 1))
+        os.unlink(os.path.join(self.root, "pkg", "c.txt"))
+        self.assertEqual(index.refresh(), 2)
+
+        reloaded = TrigramIndex(self.root)
+        self.assertEqual(reloaded.refresh(), 0)
+        self.assertEqual(reloaded.candidates(query_trigrams("goodbye")), ["a.py"])
+
+    def test_index_file_cannot_run_code(self):
+        """测试索引文件不使用 pickle，损坏或被替换的索引会重新构建"""
+        index = TrigramIndex(self.root)
+        index.refresh()
+        with open(index.index_path, "rb") as f:
+            self.assertTrue(f.read().startswith(code_search.INDEX_MAGIC))
+
+        # 仓库中附带的 pickle 文件不会被加载
+        marker = os.path.join(self.root, "pwned")
+        payload = b"cos\nsystem\n(S'touch " + marker.encode() + b"'\ntR."
+        legacy_path = os.path.join(os.path.dirname(index.index_path), "trigrams.pickle")
+        for path in (index.index_path, legacy_path):
+            with open(path, "wb") as f:
+                f.write(payload)
+        reloaded = TrigramIndex(self.root)
+        self.assertEqual(reloaded.refresh(), 4)
+        self.assertFalse(os.path.exists(marker))
+        self.assertEqual(reloaded.candidates(query_trigrams("hello_world")), ["a.py"])
+
+    def test_ignore_case_unicode_folding(self):
+        """测试忽略大小写时 s、k、i 可以匹配非 ASCII 字符（如 ſ、K）"""
+        self._write("long_s.txt", "ſtop here\n")
+        self._write("kelvin.txt", "\u212aelvin\n")
+        result = search_code("stop", root=self.root, ignore_case=True)
+        self.assertIn("long_s.txt:1: ſtop here", result)
+        result = search_code("kelvin", root=self.root, ignore_case=True)
+        self.assertIn("kelvin.txt:1:", result)
+
+    def test_parallel_build(self):
+        """测试文件较多时通过进程池构建索引"""
+        for i in range(10):
+            self._write(f"gen/m{i}.py", f"value_{i} = {i}\n")
+        with mock.patch.object(code_search, "PARALLEL_THRESHOLD", 2):
+            index = TrigramIndex(self.root)
+            index.refresh()
+        self.assertEqual(index.candidates(query_trigrams("value_7 ")), ["gen/m7.py"])
+
+    def test_search_code(self):
+        """测试搜索结果的格式与数量上限"""
+        result = search_code(r"def \w+\(", root=self.root)
+        self.assertIn("a.py:1: def hello_world():", result)
+        self.assertIn("pkg/b.py:2:     def get_value(self):", result)
+
+        result = search_code("HELLO", root=self.root, ignore_case=True, max_results=1)
+        self.assertEqual(len(result.splitlines()), 2)
+        self.assertIn("已截断", result)
+
+        with self.assertRaises(ValueError):
+            search_code("(", root=self.root)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+测试 coder 模块的功能
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# 创建模型客户端需要 API key，测试中不会真正发出请求
+os.environ.setdefault("QWEN_API_KEY", "test")
+
+from pydantic_ai.messages import ModelRequest, ModelResponse
+from pydantic_ai.models.function import FunctionModel
+
+from tools import coder
+from tools.coder_cache import CoderCache
+
+CONTENT = "a = 1\nb = 2\nc = 3\n"
+BAD_DIFF = "```diff\n@@ -1,2 +1,2 @@\n a = 1\n-x = 2\n+x = 20\n```\n"
+GOOD_DIFF = "```diff\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 20\n```\n"
+
+
+def _replies(messages):
+    """对话中 coder 的所有回复文本"""
+    return [
+        part.content
+        for message in messages
+        if isinstance(message, ModelResponse)
+        for part in message.parts
+        if part.part_kind == "text"
+    ]
+
+
+def _prompts(messages):
+    """对话中用户发出的所有文本"""
+    return [
+        part.content
+        for message in messages
+        if isinstance(message, ModelRequest)
+        for part in message.parts
+        if part.part_kind == "user-prompt"
+    ]
+
+
+class TestModifyAndApply(unittest.TestCase):
+    """测试 coder 生成的 diff 经校验后应用到文件"""
+
+    def setUp(self):
+        """在临时目录中创建待修改的文件，备份与缓存都写在其中"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        self.path = os.path.join(self.temp_dir.name, "a.py")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(CONTENT)
+        cache = CoderCache(os.path.join(self.temp_dir.name, "coder_cache"))
+        self.cache_patch = mock.patch.object(coder, "coder_cache", cache)
+        self.cache_patch.start()
+        self.calls = []
+
+    def tearDown(self):
+        """恢复工作目录并删除临时文件"""
+        self.cache_patch.stop()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def _run(self, replies, **kwargs):
+        """依次用 replies 中的文本作为 coder 每次的流式回复"""
+
+        async def stream(messages, info):
+            self.calls.append(list(messages))
+            for line in replies[len(self.calls) - 1].splitlines(keepends=True):
+                yield line
+
+        with coder.agent.override(model=FunctionModel(stream_function=stream)):
+            return asyncio.run(
+                coder.modify_and_apply(CONTENT, self.path, use_cache=False, **kwargs)
+            )
+
+    def _read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_retry_after_bad_diff(self):
+        """测试无法应用的 diff 被反馈给 coder 重试，只返回摘要"""
+        result = self._run([BAD_DIFF, GOOD_DIFF])
+
+        self.assertEqual(len(self.calls), 2)
+        feedback = _prompts(self.calls[1])[-1]
+        self.assertIn("无法应用", feedback)
+        self.assertIn("x = 2", feedback)
+
+        self.assertEqual(self._read(), "a = 1\nb = 20\nc = 3\n")
+        self.assertTrue(result.startswith(f"已修改 {self.path}: 1 处修改, +1 -1 行"))
+        self.assertNotIn("@@", result)
+        self.assertNotIn("b = 20", result)
+
+    def test_partial_reply_in_next_attempt(self):
+        """测试提前停止的回复（截至失败的块）出现在下一次尝试的对话中"""
+        bad = BAD_DIFF + "后面的内容不会被读取\n"
+        self._run([bad, GOOD_DIFF])
+        replies = _replies(self.calls[1])
+        self.assertEqual(len(replies), 1)
+        self.assertIn("-x = 2\n+x = 20\n", replies[0])
+        self.assertNotIn("不会被读取", replies[0])
+
+    def test_gives_up_after_max_attempts(self):
+        """测试多次都无法应用时文件保持不变"""
+        result = self._run([BAD_DIFF, BAD_DIFF], max_attempts=2)
+        self.assertEqual(len(self.calls), 2)
+        self.assertIn("尝试 2 次", result)
+        self.assertEqual(self._read(), CONTENT)
+
+
+class TestStream(unittest.TestCase):
+    """测试流式读取 coder 输出时逐块校验"""
+
+    def test_stops_at_first_failing_hunk(self):
+        """测试第一个校验失败的块之后立即停止读取"""
+        lines = [
+            "@@ -1 +1 @@\n",
+            "-a\n",
+            "+A\n",
+            "@@ -5 +5 @@\n",
+            "-e\n",
+            "+E\n",
+            "@@ -9 +9 @@\n",
+            "-i\n",
+            "+I\n",
+            "说明\n",
+        ]
+        sent = []
+        checked = []
+
+        async def stream(messages, info):
+            for line in lines:
+                sent.append(line)
+                yield line
+
+        def run(failing):
+            async def on_hunk(hunk):
+                checked.append(hunk.old_start)
+                return hunk.old_start != failing
+
+            async def main():
+                model = FunctionModel(stream_function=stream)
+                with coder.agent.override(model=model):
+                    return await coder._stream("prompt", on_hunk=on_hunk)
+
+            sent.clear()
+            checked.clear()
+            return asyncio.run(main())
+
+        output, messages, stopped = run(failing=5)
+        self.assertTrue(stopped)
+        self.assertEqual(checked, [1, 5])
+        # 第二个块在下一个块头到达时结束，之后的内容不再读取
+        self.assertEqual(output, "".join(lines[:7]))
+        self.assertEqual(len(sent), 7)
+        self.assertEqual(_replies(messages), [output])
+
+        output, _, stopped = run(failing=None)
+        self.assertFalse(stopped)
+        self.assertEqual(checked, [1, 5, 9])
+        self.assertEqual(output, "".join(lines))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
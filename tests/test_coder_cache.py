@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试 coder_cache 模块的功能
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.coder_cache import CoderCache, make_key
+
+
+class TestMakeKey(unittest.TestCase):
+    """测试缓存键的计算"""
+
+    def test_prompt_whitespace_ignored(self):
+        """提示中的空白差异不影响缓存键"""
+        self.assertEqual(
+            make_key("qwen", "system", "写一个 排序\n函数"),
+            make_key("qwen", "system", "  写一个   排序 函数 "),
+        )
+
+    def test_key_components(self):
+        """模型、系统提示词、代码任一变化都会得到不同的键"""
+        base = make_key("qwen", "system", "检查", "a = 1\n")
+        self.assertNotEqual(base, make_key("other", "system", "检查", "a = 1\n"))
+        self.assertNotEqual(base, make_key("qwen", "system2", "检查", "a = 1\n"))
+        self.assertNotEqual(base, make_key("qwen", "system", "检查", "a  = 1\n"))
+        self.assertEqual(base, make_key("qwen", "system", "检查", "a = 1\r\n"))
+
+
+class TestCoderCache(unittest.TestCase):
+    """测试缓存的读写、过期与淘汰"""
+
+    def setUp(self):
+        """创建临时缓存目录"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.temp_dir.name
+
+    def tearDown(self):
+        """删除临时缓存目录"""
+        self.temp_dir.cleanup()
+
+    def test_put_and_get(self):
+        """写入后命中，未写入的键未命中"""
+        cache = CoderCache(self.directory)
+        self.assertIsNone(cache.get("a" * 64))
+        cache.put("a" * 64, "--- a.py\n+++ a.py\n")
+        self.assertEqual(cache.get("a" * 64), "--- a.py\n+++ a.py\n")
+
+        # 缓存在磁盘上，新的实例同样能命中
+        reopened = CoderCache(self.directory)
+        self.assertEqual(reopened.get("a" * 64), "--- a.py\n+++ a.py\n")
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_expired(self):
+        """超过有效期的条目视为未命中并被删除"""
+        cache = CoderCache(self.directory, ttl=60)
+        cache.put("k", "output")
+        path = os.path.join(self.directory, "k.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time() - 120, "output": "output"}, f)
+
+        self.assertIsNone(cache.get("k"))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_evict_least_recently_used(self):
+        """超出大小上限时淘汰最久未使用的条目"""
+        cache = CoderCache(self.directory, max_bytes=250)
+        now = time.time()
+        for i, key in enumerate(["k1", "k2"]):
+            cache.put(key, "x" * 60)
+            path = os.path.join(self.directory, f"{key}.json")
+            os.utime(path, (now - 100 + i, now - 100 + i))
+        # 访问 k1 后，k2 成为最久未使用的条目
+        cache.get("k1")
+        cache.put("k3", "x" * 60)
+
+        self.assertIsNotNone(cache.get("k1"))
+        self.assertIsNone(cache.get("k2"))
+        self.assertIsNotNone(cache.get("k3"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_clear(self):
+        """clear 删除所有条目"""
+        cache = CoderCache(self.directory)
+        cache.put("k", "output")
+        cache.clear()
+        self.assertIsNone(cache.get("k"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
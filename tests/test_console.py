@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+测试 session.console 模块的功能
+"""
+
+import asyncio
+import io
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session.console import AsyncLineReader, InterruptHandler, Interrupted
+
+
+class TestAsyncLineReader(unittest.TestCase):
+    """测试异步逐行读取"""
+
+    def setUp(self):
+        """创建管道作为输入"""
+        read_fd, self.write_fd = os.pipe()
+        self.stream = os.fdopen(read_fd, encoding="utf-8")
+        self.output = io.StringIO()
+        self.reader = AsyncLineReader(self.stream, self.output)
+
+    def tearDown(self):
+        """关闭管道"""
+        self.stream.close()
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+
+    def _write(self, data: bytes):
+        os.write(self.write_fd, data)
+
+    def _close(self):
+        os.close(self.write_fd)
+        self.write_fd = None
+
+    def test_readline(self):
+        """按行读取，多余的行保留到下次读取，并显示提示符"""
+        self._write("第一行\r\nsecond\nthi".encode("utf-8"))
+
+        async def main():
+            first = await self.reader.readline("> ")
+            second = await self.reader.readline("> ")
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.01, self._write, b"rd\n")
+            third = await self.reader.readline()
+            return first, second, third
+
+        self.assertEqual(asyncio.run(main()), ("第一行", "second", "third"))
+        self.assertEqual(self.output.getvalue(), "> > ")
+
+    def test_loop_runs_while_waiting(self):
+        """等待输入时其他任务照常运行"""
+        ticks = []
+
+        async def ticker():
+            for i in range(3):
+                ticks.append(i)
+                await asyncio.sleep(0.01)
+            self._write(b"done\n")
+
+        async def main():
+            line, _ = await asyncio.gather(self.reader.readline(), ticker())
+            return line
+
+        self.assertEqual(asyncio.run(main()), "done")
+        self.assertEqual(ticks, [0, 1, 2])
+
+    def test_cancel(self):
+        """取消等待不会丢失之后的输入"""
+
+        async def main():
+            task = asyncio.ensure_future(self.reader.readline())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self._write(b"after\n")
+            return await self.reader.readline()
+
+        self.assertEqual(asyncio.run(main()), "after")
+
+    def test_eof(self):
+        """输入结束时返回最后不完整的一行，之后抛出 EOFError"""
+        self._write(b"last")
+        self._close()
+
+        async def main():
+            self.assertEqual(await self.reader.readline(), "last")
+            with self.assertRaises(EOFError):
+                await self.reader.readline()
+
+        asyncio.run(main())
+
+    def test_thread_fallback(self):
+        """没有文件描述符的输入流在线程中读取"""
+        reader = AsyncLineReader(io.StringIO("a\nb\n"), self.output)
+
+        async def main():
+            lines = [await reader.readline(), await reader.readline()]
+            with self.assertRaises(EOFError):
+                await reader.readline()
+            return lines
+
+        self.assertEqual(asyncio.run(main()), ["a", "b"])
+
+
+class TestInterruptHandler(unittest.TestCase):
+    """测试 Ctrl-C 的处理（直接调用信号回调）"""
+
+    def setUp(self):
+        """创建处理器"""
+        self.output = io.StringIO()
+        self.handler = InterruptHandler(self.output)
+
+    def test_first_cancels_task(self):
+        """第一次取消前台任务及其创建的任务，之后仍可继续运行"""
+        spawned = []
+
+        async def turn():
+            spawned.append(asyncio.ensure_future(asyncio.sleep(10)))
+            await asyncio.sleep(10)
+
+        async def main():
+            with self.handler:
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.01, self.handler._on_interrupt)
+                with self.assertRaises(Interrupted):
+                    await self.handler.run(turn(), "已中断")
+                self.assertTrue(spawned[0].cancelled())
+                return await self.handler.run(asyncio.sleep(0, "next"))
+
+        self.assertEqual(asyncio.run(main()), "next")
+        self.assertIn("已中断", self.output.getvalue())
+
+    def test_second_exits(self):
+        """连续两次 Ctrl-C 时退出"""
+
+        async def main():
+            with self.handler:
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.01, self.handler._on_interrupt)
+                with self.assertRaises(Interrupted):
+                    await self.handler.run(asyncio.sleep(10))
+                loop.call_later(0.01, self.handler._on_interrupt)
+                await self.handler.run(asyncio.sleep(10))
+
+        with self.assertRaises(KeyboardInterrupt):
+            asyncio.run(main())
+
+    def test_idle_interrupts(self):
+        """没有前台任务时第一次只提示，第二次退出"""
+
+        async def main():
+            with self.handler:
+                self.handler._on_interrupt()
+                self.assertIn("再按一次", self.output.getvalue())
+                loop = asyncio.get_running_loop()
+                loop.call_soon(self.handler._on_interrupt)
+                await asyncio.sleep(10)
+
+        with self.assertRaises(KeyboardInterrupt):
+            asyncio.run(main())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
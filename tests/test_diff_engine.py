@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+测试 diff_engine 模块的功能
+"""
+
+import os
+import random
+import sys
+import time
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.code_patcher import _apply_hunks, _parse_patch
+from tools.diff_engine import ALGORITHMS, diff_opcodes, unified_diff
+
+
+def _lcs_length(a, b):
+    """动态规划计算最长公共子序列长度"""
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b, 1):
+            current = row[j]
+            row[j] = previous + 1 if x == y else max(row[j], row[j - 1])
+            previous = current
+    return row[-1]
+
+
+def _random_edit(rng, lines):
+    """随机插入、删除若干行"""
+    lines = list(lines)
+    for _ in range(rng.randint(0, 6)):
+        pos = rng.randint(0, len(lines))
+        if lines and rng.random() < 0.5:
+            del lines[min(pos, len(lines) - 1)]
+        else:
+            lines.insert(pos, f"{rng.randint(0, 7)}\n")
+    return lines
+
+
+class TestDiffEngine(unittest.TestCase):
+    """测试各算法的正确性与 unified diff 输出"""
+
+    def test_round_trip(self):
+        """测试所有算法生成的补丁都能还原新内容"""
+        rng = random.Random(5)
+        for _ in range(300):
+            old = [f"{rng.randint(0, 5)}\n" for _ in range(rng.randint(0, 25))]
+            new = _random_edit(rng, old)
+            for algorithm in ALGORITHMS:
+                for context in (0, 3):
+                    patch = unified_diff(old, new, "a", "b", context, algorithm)
+                    self.assertEqual(_apply_hunks(old, _parse_patch(patch)), new)
+
+    def test_myers_is_minimal(self):
+        """测试 Myers 算法得到最短编辑脚本"""
+        rng = random.Random(9)
+        for _ in range(300):
+            old = [rng.randint(0, 4) for _ in range(rng.randint(0, 20))]
+            new = [rng.randint(0, 4) for _ in range(rng.randint(0, 20))]
+            opcodes = diff_opcodes(old, new)
+            equal = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+            self.assertEqual(equal, _lcs_length(old, new))
+
+    def test_myers_minimal_with_one_sided_lines(self):
+        """测试只出现在一侧的行被丢弃后结果仍是最短编辑脚本"""
+        rng = random.Random(13)
+        for _ in range(300):
+            old = [rng.randint(0, 6) for _ in range(rng.randint(0, 20))]
+            new = [rng.randint(3, 9) for _ in range(rng.randint(0, 20))]
+            opcodes = diff_opcodes(old, new)
+            equal = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+            self.assertEqual(equal, _lcs_length(old, new))
+
+    def test_pathological_inputs_are_fast(self):
+        """测试没有公共行和低熵的 5 万行输入都能在一秒内完成"""
+        rng = random.Random(3)
+        cases = [
+            ([f"a{i}\n" for i in range(50000)], [f"b{i}\n" for i in range(50000)]),
+            (
+                [f"{rng.randrange(8)}\n" for _ in range(50000)],
+                [f"{rng.randrange(8)}\n" for _ in range(50000)],
+            ),
+        ]
+        for old, new in cases:
+            for algorithm in ALGORITHMS:
+                start = time.perf_counter()
+                patch = unified_diff(old, new, "a", "b", algorithm=algorithm)
+                self.assertLess(time.perf_counter() - start, 1.0)
+                self.assertEqual(_apply_hunks(old, _parse_patch(patch)), new)
+        self.assertEqual(diff_opcodes(*cases[0]), [("replace", 0, 50000, 0, 50000)])
+
+    def test_insertion_produces_small_hunk(self):
+        """测试在开头插入一行只产生一个小 hunk"""
+        old = [f"line {i}\n" for i in range(50000)]
+        new = old[:3] + ["inserted\n"] + old[3:]
+        for algorithm in ALGORITHMS:
+            patch = unified_diff(old, new, "a", "b", algorithm=algorithm)
+            self.assertEqual(
+                patch.splitlines(),
+                [
+                    "--- a",
+                    "+++ b",
+                    "@@ -1,6 +1,7 @@",
+                    " line 0",
+                    " line 1",
+                    " line 2",
+                    "+inserted",
+                    " line 3",
+                    " line 4",
+                    " line 5",
+                ],
+            )
+
+    def test_no_newline_at_end_of_file(self):
+        """测试文件末尾没有换行符时的输出"""
+        patch = unified_diff(["a\n", "b"], ["a\n", "c"], "a", "b")
+        self.assertEqual(
+            patch.splitlines()[-4:],
+            [
+                "-b",
+                "\\ No newline at end of file",
+                "+c",
+                "\\ No newline at end of file",
+            ],
+        )
+
+    def test_unknown_algorithm(self):
+        """测试未知算法"""
+        with self.assertRaises(ValueError):
+            diff_opcodes([], [], "unknown")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+测试 executor 模块的功能
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.executor import ToolExecutor
+from tools.file_cache import file_cache
+
+
+def _acquire_cache_lock() -> bool:
+    """在子进程中尝试获取文件缓存的锁"""
+    acquired = file_cache._lock.acquire(timeout=2)
+    if acquired:
+        file_cache._lock.release()
+    return acquired
+
+
+class TestToolExecutor(unittest.TestCase):
+    """测试线程池、进程池与按路径加锁"""
+
+    def setUp(self):
+        """创建执行器"""
+        self.executor = ToolExecutor(max_threads=4, max_processes=1)
+
+    def tearDown(self):
+        """关闭执行器"""
+        self.executor.shutdown()
+
+    def test_run_io_off_loop(self):
+        """同步函数在线程池中执行，阻塞时事件循环仍能运行其他任务"""
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            name, _ = await asyncio.gather(
+                self.executor.run_io(
+                    lambda: time.sleep(0.1) or threading.current_thread().name
+                ),
+                ticker(),
+            )
+            return name
+
+        name = asyncio.run(main())
+        self.assertTrue(name.startswith("tool-io"))
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.09)
+
+    def test_run_cpu(self):
+        """计算在子进程中执行"""
+
+        async def main():
+            return await self.executor.run_cpu(os.getpid)
+
+        self.assertNotEqual(asyncio.run(main()), os.getpid())
+
+    def test_run_cpu_ignores_locks_held_by_threads(self):
+        """其他线程持有锁时创建的子进程不会继承这把锁"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with file_cache._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            self.assertTrue(asyncio.run(self.executor.run_cpu(_acquire_cache_lock)))
+        finally:
+            release.set()
+            thread.join()
+
+    def test_lock_same_path_serialized(self):
+        """同一路径上的操作按顺序执行，不同路径可以并行"""
+        events = []
+
+        async def job(name, path):
+            async with self.executor.lock_paths(path):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.02)
+                events.append(f"{name} end")
+
+        async def main():
+            await asyncio.gather(
+                job("a1", "a.py"), job("a2", "./a.py"), job("b", "b.py")
+            )
+
+        asyncio.run(main())
+        self.assertLess(events.index("a1 end"), events.index("a2 start"))
+        self.assertLess(events.index("b start"), events.index("a1 end"))
+
+    def test_lock_multiple_paths(self):
+        """多个路径按固定顺序加锁，交叉顺序的调用不会死锁"""
+
+        async def job(*paths):
+            async with self.executor.lock_paths(*paths):
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.wait_for(
+                asyncio.gather(job("a.py", "b.py"), job("b.py", "a.py")), timeout=2
+            )
+
+        asyncio.run(main())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试 file_cache 模块的功能
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.code_patcher import apply_patch
+from tools.file_cache import FileCache, file_cache
+
+
+class TestFileCache(unittest.TestCase):
+    """测试 FileCache 的命中、失效与淘汰"""
+
+    def setUp(self):
+        """创建临时目录和测试文件"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.temp_dir.name, f"file{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"a = {i}\nb = {i}\n")
+            self.paths.append(path)
+
+    def tearDown(self):
+        """删除临时目录"""
+        self.temp_dir.cleanup()
+
+    def test_hit_and_miss(self):
+        """测试重复读取命中缓存"""
+        cache = FileCache()
+        self.assertEqual(cache.read_lines(self.paths[0]), ["a = 0\n", "b = 0\n"])
+        cache.read_text(self.paths[0])
+        cache.get_line_index(self.paths[0])
+        cache.get_line_index(self.paths[0])
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_stale_entry_invalidated(self):
+        """测试文件修改后缓存自动失效"""
+        cache = FileCache()
+        cache.read_text(self.paths[0])
+
+        with open(self.paths[0], "w", encoding="utf-8") as f:
+            f.write("changed = True\n")
+        os.utime(self.paths[0], ns=(0, 1))
+
+        self.assertEqual(cache.read_text(self.paths[0]), "changed = True\n")
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的文件"""
+        cache = FileCache(max_entries=2)
+        cache.read_text(self.paths[0])
+        cache.read_text(self.paths[1])
+        cache.read_text(self.paths[0])
+        cache.read_text(self.paths[2])
+
+        stats = cache.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["entries"], 2)
+
+        cache.read_text(self.paths[0])
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_apply_patch_invalidates(self):
+        """测试 apply_patch 写入文件后共享缓存不再返回旧内容"""
+        path = self.paths[0]
+        self.assertEqual(file_cache.read_text(path), "a = 0\nb = 0\n")
+
+        patch = "@@ -1,2 +1,2 @@\n a = 0\n-b = 0\n+b = 1\n"
+        self.assertTrue(apply_patch(patch, path, backup=False))
+        self.assertEqual(file_cache.read_text(path), "a = 0\nb = 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
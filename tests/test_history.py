@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+测试 session.history 模块的功能
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ThinkingPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from session.history import (
+    ConversationHistory,
+    HistoryPolicy,
+    estimate_tokens,
+    interrupted_turn,
+    message_tokens,
+    render_transcript,
+)
+from session.log import SessionLog
+
+
+def make_turn(number, tool_output="", system=False):
+    """构造一轮对话：用户提问、调用一次工具、助手回答"""
+    first = [UserPromptPart(content=f"问题 {number}")]
+    if system:
+        first.insert(0, SystemPromptPart(content="系统提示"))
+    return [
+        ModelRequest(parts=first),
+        ModelResponse(
+            parts=[ToolCallPart(tool_name="read_code_file", tool_call_id=f"c{number}")]
+        ),
+        ModelRequest(
+            parts=[
+                ToolReturnPart(
+                    tool_name="read_code_file",
+                    content=tool_output,
+                    tool_call_id=f"c{number}",
+                )
+            ]
+        ),
+        ModelResponse(parts=[TextPart(content=f"回答 {number}")]),
+    ]
+
+
+class TestEstimateTokens(unittest.TestCase):
+    """测试 token 估算"""
+
+    def test_estimate(self):
+        """ASCII 约 4 字符一个 token，中文约一字一个 token"""
+        self.assertEqual(estimate_tokens("a" * 400), 100)
+        self.assertEqual(estimate_tokens("中" * 100), 100)
+        self.assertEqual(estimate_tokens(""), 0)
+
+
+class TestConversationHistory(unittest.TestCase):
+    """测试旧工具返回的替换与较早轮次的总结"""
+
+    def test_stub_old_tool_returns(self):
+        """超出最近 keep_turns 轮的大工具返回被替换，最近的轮次保持不变"""
+        history = ConversationHistory(keep_turns=1, stub_min_tokens=10)
+        history.add_turn(make_turn(1, "x" * 4000, system=True))
+        messages = history.messages
+        self.assertIn("x" * 4000, messages[2].parts[0].content)
+        before = history.tokens
+
+        history.add_turn(make_turn(2, "y" * 4000))
+        self.assertIs(history.messages, messages)
+        self.assertIn("已省略", messages[2].parts[0].content)
+        self.assertEqual(messages[2].parts[0].tool_call_id, "c1")
+        self.assertIn("y" * 4000, messages[6].parts[0].content)
+        self.assertLess(history.tokens, before * 2)
+        self.assertEqual(history.stats()["stubbed"], 1)
+
+    def test_small_tool_returns_kept(self):
+        """小的工具返回不替换"""
+        history = ConversationHistory(keep_turns=1)
+        history.add_turn(make_turn(1, "a = 1"))
+        history.add_turn(make_turn(2, "b = 2"))
+        self.assertEqual(history.messages[2].parts[0].content, "a = 1")
+
+    def test_compact_with_summary(self):
+        """超出预算时较早的轮次被总结，系统提示保留在第一条请求中"""
+        transcripts = []
+
+        async def summarizer(transcript):
+            transcripts.append(transcript)
+            return "用户在检查代码"
+
+        history = ConversationHistory(
+            max_tokens=50, keep_turns=1, summarizer=summarizer
+        )
+        history.add_turn(make_turn(1, "a" * 400, system=True))
+        history.add_turn(make_turn(2, "b" * 400))
+        history.add_turn(make_turn(3, "c" * 4000))
+
+        self.assertTrue(asyncio.run(history.compact()))
+        self.assertIn("问题 1", transcripts[0])
+        self.assertNotIn("系统提示", transcripts[0])
+
+        messages = history.messages
+        self.assertEqual(len(messages), 4)
+        first = messages[0].parts
+        self.assertIsInstance(first[0], SystemPromptPart)
+        self.assertIn("用户在检查代码", first[1].content)
+        self.assertEqual(first[2].content, "问题 3")
+        self.assertEqual(history.stats()["summarized"], 2)
+
+        # 压缩后继续追加，轮次边界仍然正确
+        history.add_turn(make_turn(4, "d" * 4000))
+        self.assertIn("已省略", history.messages[2].parts[0].content)
+        self.assertIn("d" * 4000, history.messages[6].parts[0].content)
+
+    def test_compact_without_summary(self):
+        """没有总结函数或总结失败时直接省略较早的轮次"""
+
+        async def failing(transcript):
+            raise RuntimeError("network error")
+
+        history = ConversationHistory(max_tokens=10, keep_turns=1, summarizer=failing)
+        history.add_turn(make_turn(1, system=True))
+        history.add_turn(make_turn(2))
+        self.assertTrue(asyncio.run(history.compact()))
+        self.assertIn("已省略", history.messages[0].parts[1].content)
+        self.assertEqual(history.tokens, sum(map(message_tokens, history.messages)))
+
+    def test_within_budget(self):
+        """未超出预算时不压缩"""
+        history = ConversationHistory()
+        history.add_turn(make_turn(1))
+        history.add_turn(make_turn(2))
+        history.add_turn(make_turn(3))
+        self.assertFalse(asyncio.run(history.compact()))
+        self.assertEqual(len(history), 12)
+
+    def test_render_transcript(self):
+        """对话记录包含提问、工具调用与回答"""
+        transcript = render_transcript(make_turn(1, "x" * 1000))
+        self.assertIn("用户: 问题 1", transcript)
+        self.assertIn("调用工具 read_code_file", transcript)
+        self.assertIn("省略 500 字符", transcript)
+        self.assertIn("助手: 回答 1", transcript)
+
+
+class TestHistoryPolicy(unittest.TestCase):
+    """测试思考过程与旧工具调用参数的处理"""
+
+    def setUp(self):
+        """创建临时工作区"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """删除临时工作区"""
+        self.temp_dir.cleanup()
+
+    def _turn(self):
+        return [
+            ModelRequest(parts=[UserPromptPart(content="修改代码")]),
+            ModelResponse(
+                parts=[
+                    ThinkingPart(content="想" * 5000),
+                    ToolCallPart(
+                        tool_name="apply_code_patch",
+                        args={"file_path": "a.py", "patch_string": "+x\n" * 1000},
+                        tool_call_id="c1",
+                    ),
+                ]
+            ),
+            ModelRequest(
+                parts=[
+                    ToolReturnPart(
+                        tool_name="apply_code_patch", content="ok", tool_call_id="c1"
+                    )
+                ]
+            ),
+            ModelResponse(
+                parts=[ThinkingPart(content="好"), TextPart(content="已修改")]
+            ),
+        ]
+
+    def test_drop_thinking_and_log_full(self):
+        """思考过程从历史中删除，完整内容保存在会话日志中"""
+        log = SessionLog(self.temp_dir.name, name="session")
+        history = ConversationHistory(log=log)
+        history.add_turn(self._turn())
+
+        parts = [part for message in history.messages for part in message.parts]
+        self.assertFalse(any(isinstance(part, ThinkingPart) for part in parts))
+        self.assertLess(history.tokens, 2000)
+        self.assertEqual(history.stats()["thinking"], 2)
+
+        turns = log.read_turns()
+        self.assertEqual(len(turns), 1)
+        self.assertEqual(turns[0][1].parts[0].content, "想" * 5000)
+
+    def test_truncate_thinking(self):
+        """truncate 模式保留思考过程的开头"""
+        history = ConversationHistory(policy=HistoryPolicy(thinking="truncate"))
+        history.add_turn(self._turn())
+        thinking = history.messages[1].parts[0]
+        self.assertIsInstance(thinking, ThinkingPart)
+        self.assertTrue(thinking.content.startswith("想" * 200))
+        self.assertIn("省略 4800 字符", thinking.content)
+
+        with self.assertRaises(ValueError):
+            HistoryPolicy(thinking="summary")
+
+    def test_clip_old_tool_args(self):
+        """旧轮次中过长的工具调用参数被截断，最近的轮次保持不变"""
+        history = ConversationHistory(
+            keep_turns=1, policy=HistoryPolicy(tool_args_chars=100)
+        )
+        history.add_turn(self._turn())
+        self.assertEqual(len(history.messages[1].parts[0].args["patch_string"]), 3000)
+
+        history.add_turn(self._turn())
+        args = history.messages[1].parts[0].args
+        self.assertEqual(args["file_path"], "a.py")
+        self.assertTrue(args["patch_string"].startswith("+x\n" * 33))
+        self.assertIn("省略 2900 字符", args["patch_string"])
+        self.assertEqual(len(history.messages[5].parts[0].args["patch_string"]), 3000)
+        self.assertEqual(history.stats()["tool_args"], 1)
+
+
+class TestInterruptedTurn(unittest.TestCase):
+    """测试被中断的一轮的整理"""
+
+    def test_drop_dangling_tool_call(self):
+        """去掉没有返回的工具调用，补上已显示的部分回复"""
+        turn = make_turn(1, "x")[:2]
+        messages = interrupted_turn(turn, "正在读取")
+        self.assertEqual(len(messages), 2)
+        self.assertIs(messages[0], turn[0])
+        self.assertIsInstance(messages[1], ModelResponse)
+        content = messages[1].parts[0].content
+        self.assertTrue(content.startswith("正在读取\n"))
+        self.assertIn("Ctrl-C", content)
+
+    def test_keep_completed_steps(self):
+        """已完成的工具调用与返回保留"""
+        turn = make_turn(1, "x")[:3]
+        messages = interrupted_turn(turn)
+        self.assertEqual(messages[:3], turn)
+        self.assertIn("Ctrl-C", messages[3].parts[0].content)
+
+    def test_nothing_sent(self):
+        """这一轮还没有任何请求时为空，传入用户输入时补上这条请求"""
+        self.assertEqual(interrupted_turn([], "abc"), [])
+        request, response = interrupted_turn([], prompt="问题")
+        self.assertEqual(request.parts[0].content, "问题")
+        self.assertIn("Ctrl-C", response.parts[0].content)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
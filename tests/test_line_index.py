@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+测试 code_reader 模块的行偏移索引
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.code_reader import (
+    LineIndex,
+    ReadRange,
+    get_line_index,
+    read_file_lines,
+    read_file_page,
+    read_file_ranges,
+)
+
+
+class TestLineIndex(unittest.TestCase):
+    """测试 LineIndex 及基于索引的区间读取"""
+
+    def setUp(self):
+        """创建临时测试文件"""
+        self.lines = [f"line {i} 中文\n" for i in range(1, 501)]
+        temp_file = tempfile.NamedTemporaryFile(
+            mode="w", delete=False, suffix=".py", encoding="utf-8"
+        )
+        temp_file.writelines(self.lines)
+        temp_file.close()
+        self.temp_file_path = temp_file.name
+
+    def tearDown(self):
+        """删除临时测试文件"""
+        if os.path.exists(self.temp_file_path):
+            os.unlink(self.temp_file_path)
+
+    def test_offsets(self):
+        """测试偏移数组与文件内容一致"""
+        index = LineIndex.build(self.temp_file_path)
+        self.assertEqual(index.line_count, 500)
+        self.assertEqual(index.offsets[0], 0)
+        self.assertEqual(index.offsets[-1], os.path.getsize(self.temp_file_path))
+
+    def test_range_read(self):
+        """测试区间读取"""
+        content = read_file_lines(self.temp_file_path, 100, 102)
+        self.assertEqual(content, "".join(self.lines[99:102]))
+
+        content = read_file_lines(self.temp_file_path, 499)
+        self.assertEqual(content, "".join(self.lines[498:]))
+
+    def test_index_reused_until_file_changes(self):
+        """测试文件未变化时复用索引，变化后重建"""
+        first = get_line_index(self.temp_file_path)
+        self.assertIs(get_line_index(self.temp_file_path), first)
+
+        with open(self.temp_file_path, "a", encoding="utf-8") as f:
+            f.write("appended\n")
+        os.utime(self.temp_file_path, ns=(0, first.signature[0] + 1))
+
+        second = get_line_index(self.temp_file_path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.line_count, 501)
+        self.assertEqual(read_file_lines(self.temp_file_path, 501), "appended\n")
+
+    def test_crlf_translated(self):
+        """测试 CRLF 换行符与文本模式读取结果一致"""
+        with open(self.temp_file_path, "wb") as f:
+            f.write(b"a\r\nb\r\nc")
+        self.assertEqual(read_file_lines(self.temp_file_path, 2, 3), "b\nc")
+
+    def test_empty_file(self):
+        """测试空文件"""
+        with open(self.temp_file_path, "wb"):
+            pass
+        self.assertEqual(read_file_lines(self.temp_file_path, 1, 1), "")
+
+    def test_read_file_ranges(self):
+        """测试批量读取多个区间并保持输入顺序"""
+        result = asyncio.run(
+            read_file_ranges(
+                [
+                    ReadRange(self.temp_file_path, 3, 4),
+                    ReadRange("nonexistent_file.py", 1, 2),
+                    ReadRange(self.temp_file_path, 1, 1),
+                ]
+            )
+        )
+        first = result.index("".join(self.lines[2:4]))
+        error = result.index("nonexistent_file.py")
+        last = result.index(self.lines[0])
+        self.assertLess(first, error)
+        self.assertLess(error, last)
+
+    def test_read_file_ranges_bounded(self):
+        """测试批量读取结果的长度上限"""
+        result = asyncio.run(
+            read_file_ranges(
+                [ReadRange(self.temp_file_path), ReadRange(self.temp_file_path, 2, 2)],
+                max_chars=100,
+            )
+        )
+        self.assertIn("已截断", result)
+        self.assertIn("未返回", result)
+        self.assertLess(len(result), 400)
+
+    def test_read_file_page(self):
+        """测试分页读取可以通过游标完整还原文件"""
+        pages = []
+        cursor = None
+        while True:
+            page = read_file_page(self.temp_file_path, cursor=cursor, max_bytes=1000)
+            pages.append(page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertGreater(len(pages), 1)
+        self.assertEqual("".join(p.content for p in pages), "".join(self.lines))
+        self.assertEqual(pages[0].start_line, 1)
+        self.assertEqual(pages[1].start_line, pages[0].end_line + 1)
+        self.assertEqual(pages[-1].end_line, 500)
+
+    def test_read_file_page_start_line(self):
+        """测试从指定行开始分页，以及超长行按字符边界截断"""
+        page = read_file_page(self.temp_file_path, start_line=498, max_bytes=5)
+        self.assertEqual(page.content, "line ")
+        self.assertIsNotNone(page.next_cursor)
+
+        page = read_file_page(self.temp_file_path, cursor=page.next_cursor)
+        self.assertEqual(page.content, "498 中文\n" + "".join(self.lines[498:]))
+        self.assertIsNone(page.next_cursor)
+
+    def test_read_file_page_long_multibyte_line(self):
+        """测试超过读取片段大小的多字节长行分页后可以完整还原"""
+        with open(self.temp_file_path, "w", encoding="utf-8") as f:
+            f.write("中" * 100000 + "\n")
+
+        pages = []
+        cursor = None
+        while True:
+            page = read_file_page(
+                self.temp_file_path, cursor=cursor, max_bytes=100 * 1024
+            )
+            pages.append(page.content)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertGreater(len(pages), 2)
+        self.assertEqual("".join(pages), "中" * 100000 + "\n")
+
+    def test_read_file_page_invalid_cursor(self):
+        """测试无效游标"""
+        with self.assertRaises(ValueError):
+            read_file_page(self.temp_file_path, cursor="not-a-cursor")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
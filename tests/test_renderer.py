@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试 session.renderer 模块的功能
+"""
+
+import asyncio
+import io
+import os
+import sys
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session.renderer import FrameRenderer, NestedSection
+
+
+class TestNestedSection(unittest.TestCase):
+    """测试子 agent 输出的嵌套显示"""
+
+    def test_indented(self):
+        """测试标题只在有输出时打印，换行后继续缩进"""
+        stream = io.StringIO()
+        with NestedSection("coder", stream) as section:
+            section.write("a\nb")
+            section.write("c")
+        self.assertEqual(stream.getvalue(), "\n┌─ coder\n│ a\n│ bc\n└─\n")
+
+    def test_empty(self):
+        """测试没有输出时不打印任何内容"""
+        stream = io.StringIO()
+        with NestedSection("coder", stream):
+            pass
+        self.assertEqual(stream.getvalue(), "")
+
+    def test_shared_renderer_keeps_order(self):
+        """测试与主输出共用 renderer 时，非终端下嵌套段出现在之前的主输出之后"""
+        stream = io.StringIO()
+        console = FrameRenderer(stream, interactive=False)
+        console.write("🔧 调用tool：generate_code\n")
+        with NestedSection("coder", renderer=console) as section:
+            section.write("x = 1")
+        console.write("📤 tool返回：ok\n")
+        console.flush()
+        self.assertEqual(
+            stream.getvalue(),
+            "🔧 调用tool：generate_code\n"
+            "\n┌─ coder\n│ x = 1\n└─\n"
+            "📤 tool返回：ok\n",
+        )
+
+
+class CountingStream(io.StringIO):
+    """记录 write 和 flush 次数的输出流"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestFrameRenderer(unittest.TestCase):
+    """测试增量文本的合并输出"""
+
+    def setUp(self):
+        """使用可控的时钟"""
+        self.now = 0.0
+        self.stream = CountingStream()
+
+    def _renderer(self, **kwargs):
+        return FrameRenderer(self.stream, clock=lambda: self.now, **kwargs)
+
+    def test_coalesce_within_frame(self):
+        """一帧内的多个增量合并为一次写出"""
+        renderer = self._renderer(interactive=True)
+        renderer.write("a")
+        for delta in "bcdef":
+            self.now += 0.001
+            renderer.write(delta)
+        self.assertEqual(self.stream.getvalue(), "a")
+
+        self.now += 0.05
+        renderer.write("g")
+        self.assertEqual(self.stream.getvalue(), "abcdefg")
+        self.assertEqual(self.stream.writes, 2)
+        self.assertEqual(self.stream.flushes, 2)
+
+    def test_flush_on_newline(self):
+        """遇到换行立即写出"""
+        renderer = self._renderer(interactive=True)
+        renderer.write("a")
+        renderer.write("b")
+        renderer.write("c\n")
+        self.assertEqual(self.stream.getvalue(), "abc\n")
+
+    def test_timer_flush(self):
+        """输出停顿时，缓冲的内容在一帧之后由事件循环写出"""
+
+        async def main():
+            renderer = FrameRenderer(self.stream, interactive=True)
+            renderer.write("a")
+            renderer.write("b")
+            self.assertEqual(self.stream.getvalue(), "a")
+            await asyncio.sleep(0.1)
+            return self.stream.getvalue()
+
+        self.assertEqual(asyncio.run(main()), "ab")
+
+    def test_bulk_when_not_tty(self):
+        """非终端时只在缓冲超过上限或 flush 时写出"""
+        renderer = self._renderer(bulk_chars=10)
+        self.assertFalse(renderer.interactive)
+        for delta in ["abc\n", "def\n"]:
+            renderer.write(delta)
+        self.assertEqual(self.stream.writes, 0)
+        renderer.write("ghi\n")
+        self.assertEqual(self.stream.getvalue(), "abc\ndef\nghi\n")
+        renderer.write("j")
+        renderer.close()
+        self.assertEqual(self.stream.writes, 2)
+        self.assertEqual(self.stream.getvalue(), "abc\ndef\nghi\nj")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试 result_store 模块的功能
+"""
+
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from session.history import estimate_tokens
+from tools.result_store import (
+    DEFAULT_RESULT_TOKENS,
+    READ_CHARS,
+    ResultStore,
+    get_result_store,
+    preview,
+    read_result,
+)
+
+
+def numbered_lines(count):
+    return "".join(f"line {i:05d} " + "x" * 40 + "\n" for i in range(1, count + 1))
+
+
+class TestPreview(unittest.TestCase):
+    """测试终端预览"""
+
+    def test_short_unchanged(self):
+        """短内容原样显示"""
+        self.assertEqual(preview("abc"), "abc")
+
+    def test_head_and_tail(self):
+        """长内容只显示开头和结尾，并标明字节数"""
+        text = numbered_lines(1000)
+        result = preview(text, max_chars=600)
+        self.assertLess(len(result), 700)
+        self.assertTrue(result.startswith("line 00001 "))
+        self.assertTrue(result.endswith("line 01000 " + "x" * 40 + "\n"))
+        self.assertIn(f"共 {len(text)} 字节", result)
+
+
+class TestResultStore(unittest.TestCase):
+    """测试工具返回的截断、落盘与分段读取"""
+
+    def setUp(self):
+        """创建临时工作区"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultStore(self.temp_dir.name)
+
+    def tearDown(self):
+        """删除临时工作区"""
+        self.temp_dir.cleanup()
+
+    def test_within_budget(self):
+        """未超出上限时原样返回，不落盘"""
+        self.assertEqual(self.store.cap("short", max_tokens=100), "short")
+        self.assertFalse(os.path.exists(self.store.directory))
+
+    def test_cap_and_read_back(self):
+        """超出上限时返回首尾部分，其余内容可按编号读回"""
+        text = numbered_lines(5000)
+        capped = self.store.cap(text, max_tokens=1000)
+        self.assertLess(estimate_tokens(capped), 1100)
+        self.assertTrue(capped.startswith("line 00001 "))
+        self.assertTrue(capped.endswith("line 05000 " + "x" * 40 + "\n"))
+
+        match = re.search(r'result_id="([0-9a-f]{16})", offset=(\d+)', capped)
+        result_id, offset = match.group(1), int(match.group(2))
+        self.assertEqual(text[offset - 1], "\n")
+
+        # 从省略处开始分段读回全部剩余内容
+        while True:
+            page = self.store.read(result_id, offset, max_chars=50000)
+            end = min(offset + 50000, len(text))
+            self.assertTrue(page.startswith(text[offset:end]))
+            if end == len(text):
+                self.assertIn("已读完", page)
+                break
+            self.assertIn(f"offset={end}", page)
+            offset = end
+
+    def test_read_within_token_budget(self):
+        """每段不超过 token 上限，并给出下一段的 offset"""
+        text = "汉" * 40000
+        result_id = self.store.save(text)
+        page = self.store.read(result_id, 0, max_chars=40000, max_tokens=1000)
+        content, footer = page.rsplit("\n", 1)
+        self.assertLessEqual(estimate_tokens(content), 1000)
+        self.assertIn(f"offset={len(content)}", footer)
+
+    def test_read_result_clamps_max_chars(self):
+        """模型传入很大的 max_chars 时仍按上限分段返回"""
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            text = numbered_lines(5000)
+            result_id = get_result_store().save(text)
+            page = read_result(result_id, 0, max_chars=len(text))
+        finally:
+            os.chdir(cwd)
+        self.assertLessEqual(len(page), READ_CHARS + 200)
+        self.assertLessEqual(estimate_tokens(page), DEFAULT_RESULT_TOKENS + 100)
+        self.assertIn("继续读取", page)
+
+    def test_content_addressed(self):
+        """相同内容只保存一次"""
+        self.assertEqual(self.store.save("abc"), self.store.save("abc"))
+        self.assertEqual(len(os.listdir(self.store.directory)), 1)
+
+    def test_invalid_read(self):
+        """无效编号、不存在的结果和越界的偏移"""
+        with self.assertRaises(ValueError):
+            self.store.read("../../etc/passwd")
+        with self.assertRaises(ValueError):
+            self.store.read("0" * 16)
+        result_id = self.store.save("abc")
+        with self.assertRaises(ValueError):
+            self.store.read(result_id, offset=10)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
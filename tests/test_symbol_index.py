@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+测试 symbol_index 模块的功能
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tools.symbol_index import SymbolIndex, read_symbol, split_into_chunks
+
+
+class TestSymbolIndex(unittest.TestCase):
+    """测试符号索引与按名称读取"""
+
+    def setUp(self):
+        """创建临时测试文件"""
+        self.test_content = """import functools
+
+VALUE = 42
+
+
+def hello_world():
+    helper = 1
+    return "success"
+
+
+class TestClass:
+    count = 0
+
+    @functools.cache
+    def get_value(self):
+        return self.value
+
+    async def fetch(self):
+        return None
+"""
+        temp_file = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".py")
+        temp_file.write(self.test_content)
+        temp_file.close()
+        self.temp_file_path = temp_file.name
+
+    def tearDown(self):
+        """删除临时测试文件"""
+        if os.path.exists(self.temp_file_path):
+            os.unlink(self.temp_file_path)
+
+    def test_symbols(self):
+        """测试符号及其行号区间"""
+        symbols = SymbolIndex().symbols(self.temp_file_path)
+        self.assertEqual(
+            list(symbols),
+            [
+                "VALUE",
+                "hello_world",
+                "TestClass",
+                "TestClass.count",
+                "TestClass.get_value",
+                "TestClass.fetch",
+            ],
+        )
+        get_value = symbols["TestClass.get_value"]
+        self.assertEqual((get_value.start_line, get_value.end_line), (14, 16))
+        self.assertEqual(symbols["TestClass.fetch"].kind, "async function")
+
+    def test_read_symbol(self):
+        """测试按限定名和唯一后缀读取"""
+        expected = (
+            "    @functools.cache\n"
+            "    def get_value(self):\n"
+            "        return self.value\n"
+        )
+        self.assertTrue(
+            read_symbol(self.temp_file_path, "TestClass.get_value").endswith(expected)
+        )
+        self.assertTrue(
+            read_symbol(self.temp_file_path, "get_value").endswith(expected)
+        )
+
+        with self.assertRaises(ValueError):
+            read_symbol(self.temp_file_path, "missing")
+
+    def test_rebuild_on_change(self):
+        """测试文件变化后重建索引"""
+        index = SymbolIndex()
+        self.assertNotIn("added", index.symbols(self.temp_file_path))
+
+        with open(self.temp_file_path, "a") as f:
+            f.write("\n\ndef added():\n    pass\n")
+        os.utime(self.temp_file_path, ns=(0, 1))
+
+        self.assertIn("added", index.symbols(self.temp_file_path))
+
+    def test_split_into_chunks(self):
+        """测试按顶层定义分段，且各段首尾相接覆盖整个文件"""
+        chunks = split_into_chunks(self.temp_file_path, max_lines=10)
+        self.assertEqual(chunks, [(1, 8), (9, 19)])
+
+        # 超过上限的定义单独成段，不会被拆开
+        chunks = split_into_chunks(self.temp_file_path, max_lines=3)
+        self.assertEqual(chunks, [(1, 3), (4, 8), (9, 19)])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,347 @@
+"""
+内容寻址的备份存储
+
+每次应用补丁前，把文件原内容按 SHA-256 存为 <root>/.agent/objects/ab/cdef... 形式的对象，
+相同内容只保存一次；每次修改作为一个事务追加到 <root>/.agent/journal.jsonl，
+记录每个文件的 (路径, 修改前哈希, 修改后哈希)。根据日志可以撤销 (undo) 和重做 (redo)
+任意一次补丁，多文件补丁作为整体撤销。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from tools.file_cache import file_cache
+
+# 一次修改中的一个文件: (路径, 修改前哈希, 修改后哈希)，文件不存在时哈希为 None
+FileChange = Tuple[str, Optional[str], Optional[str]]
+
+
+def file_digest(file_path: str) -> Optional[str]:
+    """计算文件内容的 SHA-256，文件不存在时返回 None"""
+    try:
+        with open(file_path, "rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class BackupStore:
+    """
+    工作区的备份对象库与修改日志
+
+    Args:
+        root: 工作区根目录，日志中的路径相对于它保存
+    """
+
+    def __init__(self, root: str = "."):
+        self.root = os.path.realpath(root)
+        self.objects_dir = os.path.join(self.root, ".agent", "objects")
+        self.journal_path = os.path.join(self.root, ".agent", "journal.jsonl")
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def has_object(self, digest: str) -> bool:
+        return os.path.exists(self._object_path(digest))
+
+    def store_file(self, file_path: str, link: bool = False) -> Optional[str]:
+        """
+        把文件当前内容存入对象库，内容已存在时不再写入
+
+        Args:
+            file_path: 文件路径
+            link: 调用方保证之后不会再原地修改该文件（例如它已经被替换、只剩这一个名字）时，
+                直接硬链接到对象库，不复制数据；要替换仍在使用的文件时用 replace_file
+
+        Returns:
+            Optional[str]: 内容哈希，文件不存在时返回 None
+        """
+        digest = file_digest(file_path)
+        if digest is None or self.has_object(digest):
+            return digest
+
+        object_path = self._object_path(digest)
+        directory = os.path.dirname(object_path)
+        os.makedirs(directory, exist_ok=True)
+        if link:
+            try:
+                os.link(file_path, object_path)
+                return digest
+            except FileExistsError:
+                return digest
+            except OSError:
+                pass
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(file_path, temp_path)
+            os.replace(temp_path, object_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest
+
+    def _link_object(self, file_path: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        把文件的 inode 硬链接进对象库
+
+        Returns:
+            (内容哈希, 新建的对象路径)：对象已存在或无法硬链接（此时复制一份）时
+            对象路径为 None；文件不存在时两者都为 None
+        """
+        digest = file_digest(file_path)
+        if digest is None or self.has_object(digest):
+            return digest, None
+
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(file_path, object_path)
+            return digest, object_path
+        except FileExistsError:
+            return digest, None
+        except OSError:
+            return self.store_file(file_path), None
+
+    def replace_file(self, temp_path: str, file_path: str) -> Optional[str]:
+        """
+        用已经完整写好的 temp_path 原子地替换 file_path，并把原内容存入对象库
+
+        原文件的 inode 直接硬链接到对象库，不复制数据；替换失败时删除刚建立的链接，
+        避免对象与仍在使用的文件共用 inode，之后原地修改该文件时损坏备份。
+
+        Returns:
+            Optional[str]: 原内容的哈希，文件原本不存在时返回 None
+        """
+        digest, linked = self._link_object(file_path)
+        try:
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if linked is not None:
+                os.unlink(linked)
+            raise
+        return digest
+
+    def restore(self, file_path: str, digest: Optional[str], save: bool = False):
+        """
+        把文件原子地恢复为指定内容，digest 为 None 表示删除文件
+
+        Args:
+            file_path: 文件路径
+            digest: 要恢复的内容哈希
+            save: 同时把被替换的当前内容存入对象库
+
+        Raises:
+            FileNotFoundError: 对象库中没有该内容
+        """
+        if digest is None:
+            if os.path.exists(file_path):
+                linked = self._link_object(file_path)[1] if save else None
+                try:
+                    os.unlink(file_path)
+                except BaseException:
+                    if linked is not None:
+                        os.unlink(linked)
+                    raise
+            file_cache.invalidate(file_path)
+            return
+
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            raise FileNotFoundError(f"备份对象不存在: {digest}")
+
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".restore.tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(object_path, temp_path)
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, temp_path)
+            if save:
+                self.replace_file(temp_path, file_path)
+            else:
+                os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        file_cache.invalidate(file_path)
+
+    def _relative(self, file_path: str) -> str:
+        """工作区内的文件记录相对路径，其他文件记录绝对路径"""
+        full_path = os.path.realpath(file_path)
+        if os.path.commonpath([self.root, full_path]) == self.root:
+            return os.path.relpath(full_path, self.root)
+        return full_path
+
+    def _absolute(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    def _read_journal(self) -> List[dict]:
+        try:
+            with open(self.journal_path, encoding="utf-8") as file:
+                return [json.loads(line) for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _append(self, entry: dict):
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def record(self, changes: List[FileChange], summary: str = "") -> int:
+        """
+        记录一次修改（一个或多个文件）
+
+        Args:
+            changes: (文件路径, 修改前哈希, 修改后哈希) 列表，修改前的内容应已存入对象库
+            summary: 修改说明
+
+        Returns:
+            int: 事务编号
+        """
+        with self._lock:
+            journal = self._read_journal()
+            txn = sum(entry["op"] == "apply" for entry in journal) + 1
+            self._append(
+                {
+                    "txn": txn,
+                    "op": "apply",
+                    "time": time.time(),
+                    "summary": summary,
+                    "files": [
+                        {
+                            "path": self._relative(path),
+                            "before": before,
+                            "after": after,
+                        }
+                        for path, before, after in changes
+                    ],
+                }
+            )
+        return txn
+
+    def _stacks(self, journal: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """回放日志，得到可撤销和可重做的修改栈"""
+        undo_stack: List[dict] = []
+        redo_stack: List[dict] = []
+        for entry in journal:
+            if entry["op"] == "apply":
+                undo_stack.append(entry)
+                redo_stack.clear()
+            elif entry["op"] == "undo":
+                redo_stack.append(undo_stack.pop())
+            elif entry["op"] == "redo":
+                undo_stack.append(redo_stack.pop())
+        return undo_stack, redo_stack
+
+    def _switch(self, entry: dict, forward: bool, op: str) -> str:
+        """把一次修改涉及的文件切换到修改前 (forward=False) 或修改后的内容"""
+        expected_key, target_key = "after", "before"
+        if forward:
+            expected_key, target_key = target_key, expected_key
+        files = [
+            (self._absolute(f["path"]), f[expected_key], f[target_key], f["path"])
+            for f in entry["files"]
+        ]
+
+        # 文件在修改后又被改动过时拒绝操作，避免覆盖这些改动
+        for file_path, expected, _, path in files:
+            if file_digest(file_path) != expected:
+                raise ValueError(
+                    f"{path} 在第 {entry['txn']} 次修改之后已被改动，无法{op}"
+                )
+        for _, _, target, path in files:
+            if target is not None and not self.has_object(target):
+                raise ValueError(f"{path} 的备份对象 {target[:12]} 已丢失，无法{op}")
+
+        for file_path, expected, target, _ in files:
+            # 当前内容即将被替换，保存下来以便再次撤销或重做
+            self.restore(file_path, target, save=expected is not None)
+
+        self._append(
+            {
+                "txn": entry["txn"],
+                "op": "redo" if forward else "undo",
+                "time": time.time(),
+            }
+        )
+        paths = ", ".join(f["path"] for f in entry["files"])
+        return f"已{op}第 {entry['txn']} 次修改: {paths}"
+
+    def undo(self) -> str:
+        """
+        撤销最近一次未撤销的修改
+
+        Returns:
+            str: 操作说明
+
+        Raises:
+            ValueError: 没有可撤销的修改，或文件在修改后又被改动过
+        """
+        with self._lock:
+            undo_stack, _ = self._stacks(self._read_journal())
+            if not undo_stack:
+                raise ValueError("没有可撤销的修改")
+            return self._switch(undo_stack[-1], forward=False, op="撤销")
+
+    def redo(self) -> str:
+        """
+        重做最近一次撤销的修改
+
+        Returns:
+            str: 操作说明
+
+        Raises:
+            ValueError: 没有可重做的修改，或文件在撤销后又被改动过
+        """
+        with self._lock:
+            _, redo_stack = self._stacks(self._read_journal())
+            if not redo_stack:
+                raise ValueError("没有可重做的修改")
+            return self._switch(redo_stack[-1], forward=True, op="重做")
+
+    def history(self, limit: int = 10) -> List[str]:
+        """返回最近的修改记录（新的在前），已撤销的会标注出来"""
+        with self._lock:
+            journal = self._read_journal()
+        undo_stack, _ = self._stacks(journal)
+        active = {entry["txn"] for entry in undo_stack}
+
+        lines = []
+        for entry in reversed(journal):
+            if entry["op"] != "apply":
+                continue
+            if len(lines) >= limit:
+                break
+            stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(entry["time"]))
+            state = "" if entry["txn"] in active else " (已撤销)"
+            paths = ", ".join(f["path"] for f in entry["files"])
+            lines.append(f"#{entry['txn']} {stamp} {paths}{state}")
+        return lines
+
+
+_stores: Dict[str, BackupStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_backup_store(root: str = ".") -> BackupStore:
+    """获取（并缓存）指定工作区根目录的备份存储"""
+    key = os.path.realpath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = BackupStore(key)
+            _stores[key] = store
+    return store
@@ -1,141 +1,1500 @@
+import heapq
+import mmap
 import re
 import os
-from typing import List
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
+from tools.backup_store import BackupStore, file_digest, get_backup_store
+from tools.diff_engine import unified_diff
+from tools.file_cache import file_cache
+from tools.line_index import LineIndex
 
-def apply_patch(patch_string: str, file_path: str, backup: bool = True) -> bool:
+# Files larger than this are patched by streaming instead of being read into memory
+STREAMING_THRESHOLD = 8 * 1024 * 1024
+
+# Chunk size for the read/write fallback when copying unchanged regions
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Path used in file headers for files that are created or deleted
+DEV_NULL = "/dev/null"
+
+# Context lines that may be ignored at each end of a hunk that does not match
+DEFAULT_FUZZ = 2
+
+# Lines hashed at a time when searching for a hunk whose line numbers drifted
+INDEX_BLOCK_LINES = 4096
+
+# Bytes read from the start of a file to detect its line endings
+NEWLINE_SAMPLE_SIZE = 64 * 1024
+
+
+class Hunk:
+    """One hunk of a unified diff, with the file headers it appeared under."""
+
+    __slots__ = (
+        "old_start",
+        "old_count",
+        "new_start",
+        "new_count",
+        "changes",
+        "old_path",
+        "new_path",
+        "file_index",
+    )
+
+    def __init__(
+        self,
+        old_start: int,
+        old_count: int,
+        new_start: int,
+        new_count: int,
+        old_path: Optional[str] = None,
+        new_path: Optional[str] = None,
+        file_index: int = 0,
+    ):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        # Raw change lines including their " ", "+", "-" or "\\" prefix
+        self.changes: List[str] = []
+        # Paths from the preceding ---/+++ headers (None without headers) and
+        # the position of that file section in the patch (0 without headers)
+        self.old_path = old_path
+        self.new_path = new_path
+        self.file_index = file_index
+
+    def __repr__(self) -> str:
+        return (
+            f"Hunk(-{self.old_start},{self.old_count} "
+            f"+{self.new_start},{self.new_count}, {len(self.changes)} lines)"
+        )
+
+
+# Hunk header: @@ -start,count +start,count @@
+_HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Timestamp after the path in a ---/+++ header
+_HEADER_TIMESTAMP = re.compile(r"\s+\d{4}-\d{2}-\d{2}[\d:.+\- ]*$")
+
+
+@dataclass
+class HunkResult:
+    """Where a hunk was applied, or why it could not be applied."""
+
+    number: int
+    old_start: int
+    applied_start: Optional[int] = None
+    fuzz: int = 0
+    error: Optional[str] = None
+
+    @property
+    def offset(self) -> int:
+        if self.applied_start is None:
+            return 0
+        return self.applied_start - self.old_start
+
+    def describe(self) -> str:
+        if self.error is not None:
+            return f"Hunk #{self.number} FAILED at {self.old_start}: {self.error}"
+        message = f"Hunk #{self.number} succeeded at {self.applied_start}"
+        if self.fuzz:
+            message += f" with fuzz {self.fuzz}"
+        if self.offset:
+            plural = "" if abs(self.offset) == 1 else "s"
+            message += f" (offset {self.offset} line{plural})"
+        return message + "."
+
+
+@dataclass
+class PatchReport:
+    """Outcome of patching one file, with the result of every hunk."""
+
+    file_path: str
+    applied: bool = False
+    hunks: List[HunkResult] = field(default_factory=list)
+    error: Optional[str] = None
+    dry_run: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """True if the patch was applied, or for a dry run, would apply."""
+        return self.applied or (self.dry_run and self.error is None)
+
+    def render(self) -> str:
+        if self.dry_run:
+            if self.ok:
+                lines = [f"Patch applies cleanly to {self.file_path} (dry run)"]
+            else:
+                lines = [f"Patch does NOT apply to {self.file_path} (dry run)"]
+        elif self.applied:
+            lines = [f"Patched {self.file_path}"]
+        else:
+            lines = [f"Patch NOT applied to {self.file_path}, file unchanged"]
+        lines.extend(hunk.describe() for hunk in self.hunks)
+        if self.error is not None and not any(h.error for h in self.hunks):
+            lines.append(self.error)
+        return "\n".join(lines)
+
+
+def apply_patch(
+    patch_string: str,
+    file_path: str,
+    backup: bool = True,
+    streaming: Optional[bool] = None,
+    fuzz: int = DEFAULT_FUZZ,
+    store: Optional[BackupStore] = None,
+) -> bool:
     """
     Apply a patch string to a file, similar to the patch command.
 
     Args:
         patch_string: The patch content in unified diff format
         file_path: Path to the target file to patch
-        backup: Whether to create a backup file before applying the patch
+        backup: Whether to record the change in the backup store so that it
+            can be undone
+        streaming: Patch without loading the file into memory; by default
+            this is used for files larger than STREAMING_THRESHOLD
+        fuzz: Context lines that may be ignored at each end of a hunk
+        store: Backup store to record the change in; defaults to the store of
+            the current directory
 
     Returns:
         bool: True if patch was applied successfully, False otherwise
     """
-    # print(f"Applying patch to {file_path}")
-    # print(f"Patch string: {patch_string}")
+    report = patch_file(
+        patch_string, file_path, backup, streaming, fuzz, store=store
+    )
+    if not report.applied:
+        print(f"Error applying patch: {report.error}")
+    return report.applied
+
+
+def patch_file(
+    patch_string: str,
+    file_path: str,
+    backup: bool = True,
+    streaming: Optional[bool] = None,
+    fuzz: int = DEFAULT_FUZZ,
+    max_offset: Optional[int] = None,
+    store: Optional[BackupStore] = None,
+    dry_run: bool = False,
+) -> PatchReport:
+    """
+    Apply a patch string to a file and report where each hunk was applied.
+
+    Like GNU patch, a hunk whose context is not found at the stated line is
+    searched for outward from there, so drifted line numbers still apply;
+    if that fails, up to `fuzz` context lines are ignored at each end.
+
+    Args:
+        patch_string: The patch content in unified diff format
+        file_path: Path to the target file to patch
+        backup: Whether to record the change in the backup store so that it
+            can be undone
+        streaming: Patch without loading the file into memory; by default
+            this is used for files larger than STREAMING_THRESHOLD
+        fuzz: Context lines that may be ignored at each end of a hunk
+        max_offset: Furthest distance (in lines) a hunk may be moved; None
+            searches the whole file
+        store: Backup store to record the change in; defaults to the store of
+            the current directory
+        dry_run: Only check every hunk against the current content and
+            report the results; nothing is written
+
+    Returns:
+        PatchReport: Whether the patch was applied (or, for a dry run,
+            would apply) and the result of every hunk
+    """
+    report = PatchReport(file_path, dry_run=dry_run)
     try:
         # Parse the patch
         hunks = _parse_patch(patch_string)
         if not hunks:
-            return False
+            report.error = "No hunks found in patch"
+            return report
 
         # Read the original file
         if not os.path.exists(file_path):
-            return False
+            report.error = f"File does not exist: {file_path}"
+            return report
+
+        if streaming is None:
+            streaming = os.path.getsize(file_path) > STREAMING_THRESHOLD
+
+        if dry_run:
+            if streaming:
+                with _mapped_lines(file_path) as lines:
+                    _check_hunks(report, lines, hunks, fuzz, max_offset)
+            else:
+                lines = file_cache.read_lines(file_path)
+                _check_hunks(report, lines, hunks, fuzz, max_offset)
+            return report
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            original_lines = f.readlines()
+        store = (store or get_backup_store()) if backup else None
+
+        if streaming:
+            placements, before = _apply_patch_streaming(
+                file_path, hunks, store, fuzz, max_offset, report
+            )
+        else:
+            # Lines keep their own endings, as when copying them by streaming
+            original_lines = _read_raw_lines(file_path)
 
-        # Create backup if requested
-        if backup:
-            backup_path = file_path + ".orig"
-            with open(backup_path, "w", encoding="utf-8") as f:
-                f.writelines(original_lines)
+            # Apply hunks to the file
+            placements = _check_hunks(
+                report, original_lines, hunks, fuzz, max_offset
+            )
+            if report.error is not None:
+                return report
+            patched_lines = _render_placements(
+                original_lines, placements, detect_newline(file_path)
+            )
 
-        # Apply hunks to the file
-        patched_lines = _apply_hunks(original_lines, hunks)
+            # The file is replaced rather than rewritten in place, so the
+            # backup store can keep the original inode instead of a copy
+            before = _write_lines_atomic(file_path, patched_lines, store)
+        file_cache.invalidate(file_path)
 
-        # Write the patched content
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.writelines(patched_lines)
+        if store is not None:
+            store.record(
+                [(file_path, before, file_digest(file_path))],
+                f"patch {file_path}",
+            )
 
-        return True
+        report.hunks = [_hunk_result(placement) for placement in placements]
+        report.applied = True
 
     except Exception as e:
-        print(f"Error applying patch: {e}")
-        return False
+        report.error = str(e)
+
+    return report
+
+
+def _check_hunks(
+    report: PatchReport,
+    lines: Sequence[str],
+    hunks: List[Hunk],
+    fuzz: int,
+    max_offset: Optional[int],
+) -> List[dict]:
+    """
+    Locate every hunk, recording the result of each one in the report.
+
+    Returns:
+        Placements of the hunks that apply; report.error is set if any
+        hunk does not
+    """
+    failures: List[HunkResult] = []
+    placements = _locate_hunks(lines, hunks, fuzz, max_offset, failures)
+    report.hunks = sorted(
+        [_hunk_result(placement) for placement in placements] + failures,
+        key=lambda result: result.number,
+    )
+    if failures:
+        report.error = "\n".join(failure.describe() for failure in failures)
+    return placements
+
+
+def _split_lines(text: str) -> Iterator[str]:
+    """Yield the "\\n"-separated lines of text without copying it as a list."""
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+class HunkParser:
+    """
+    Incremental unified diff parser: feed it lines as they arrive and it
+    returns each hunk once the next header (or close()) shows it is complete.
+
+    The line counts from each hunk header are tracked so that blank context
+    lines whose leading space was stripped (common in model-generated diffs)
+    are still counted as context, and so that a following file header or
+    text after the diff is not mistaken for a removed line.
+    """
+
+    __slots__ = (
+        "old_path",
+        "new_path",
+        "file_index",
+        "file_has_hunks",
+        "current",
+        "old_remaining",
+        "new_remaining",
+    )
+
+    def __init__(self):
+        self.old_path: Optional[str] = None
+        self.new_path: Optional[str] = None
+        self.file_index = 0
+        self.file_has_hunks = False
+        self.current: Optional[Hunk] = None
+        self.old_remaining = self.new_remaining = 0
+
+    def _finish(self) -> List[Hunk]:
+        hunk, self.current = self.current, None
+        return [hunk] if hunk is not None else []
+
+    def feed(self, line: str) -> List[Hunk]:
+        """
+        Parse one line (with or without its trailing newline).
+
+        Returns:
+            The hunk completed by this line, if any
+        """
+        if line.endswith("\n"):
+            line = line[:-1]
+        current = self.current
+        in_body = current is not None and (
+            self.old_remaining > 0 or self.new_remaining > 0
+        )
+
+        if not in_body:
+            if line.startswith("--- "):
+                self.old_path, self.new_path = _header_path(line[4:]), None
+                self.file_index += 1
+                self.file_has_hunks = False
+                return self._finish()
+            if line.startswith("+++ "):
+                if self.file_index and not self.file_has_hunks:
+                    self.new_path = _header_path(line[4:])
+                return []
+
+        hunk_match = _HUNK_HEADER.match(line)
+        if hunk_match:
+            completed = self._finish()
+            old_count, new_count = hunk_match.group(2), hunk_match.group(4)
+            self.current = Hunk(
+                int(hunk_match.group(1)),
+                int(old_count) if old_count else 1,
+                int(hunk_match.group(3)),
+                int(new_count) if new_count else 1,
+                self.old_path,
+                self.new_path,
+                self.file_index,
+            )
+            self.file_has_hunks = True
+            self.old_remaining = self.current.old_count
+            self.new_remaining = self.current.new_count
+            return completed
+
+        if current is None:
+            return []
+
+        if not in_body:
+            # Both line counts are used up: only a "\ No newline" marker can
+            # still belong to the hunk, anything else (e.g. a "- ..." list
+            # item in the text after the diff) ends it
+            if line.startswith("\\"):
+                current.changes.append(line)
+                return []
+            return self._finish()
+
+        if line == "":
+            line = " "
+
+        if line.startswith((" ", "+", "-", "\\")):
+            current.changes.append(line)
+            if line[0] in " -":
+                self.old_remaining -= 1
+            if line[0] in " +":
+                self.new_remaining -= 1
+        return []
+
+    def close(self) -> List[Hunk]:
+        """Signal the end of the patch and return the last hunk, if any."""
+        return self._finish()
+
+
+def iter_hunks(lines: Union[str, Iterable[str]]) -> Iterator[Hunk]:
+    """
+    Parse a (possibly multi-file) unified diff into hunks, lazily.
+
+    Only the hunk being parsed is held in memory, so a large patch can be
+    read straight from a file object. Callers that apply hunks still collect
+    them: hunks are located in file order rather than patch order, and
+    nothing is written until every hunk (of every file) is known to apply.
 
+    Args:
+        lines: The patch content, or an iterable of its lines (with or
+            without trailing newlines)
 
-def _parse_patch(patch_string: str) -> List[dict]:
+    Yields:
+        Hunk objects in patch order
+    """
+    if isinstance(lines, str):
+        lines = _split_lines(lines)
+
+    parser = HunkParser()
+    for line in lines:
+        yield from parser.feed(line)
+    yield from parser.close()
+
+
+def _parse_patch(patch_string: str) -> List[Hunk]:
     """
     Parse a patch string and extract hunks.
 
+    File headers are ignored; the hunks of every file section are returned
+    in order. Use _parse_file_patches to keep them apart.
+
     Args:
         patch_string: The patch content
 
     Returns:
-        List of hunk dictionaries containing line numbers and changes
+        List of hunks containing line numbers and changes
     """
-    lines = patch_string.split("\n")
-    hunks = []
-    current_hunk = None
+    return list(iter_hunks(patch_string))
 
-    for line in lines:
-        # Match hunk header: @@ -start,count +start,count @@
-        hunk_match = re.match(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", line)
-        if hunk_match:
-            if current_hunk:
-                hunks.append(current_hunk)
-
-            old_start = int(hunk_match.group(1))
-            old_count = int(hunk_match.group(2)) if hunk_match.group(2) else 1
-            new_start = int(hunk_match.group(3))
-            new_count = int(hunk_match.group(4)) if hunk_match.group(4) else 1
-
-            current_hunk = {
-                "old_start": old_start,
-                "old_count": old_count,
-                "new_start": new_start,
-                "new_count": new_count,
-                "changes": [],
+
+def _header_path(header: str) -> str:
+    """
+    Extract the file path from a ---/+++ header, dropping the timestamp and
+    the a/ or b/ prefix used by git-style diffs.
+    """
+    path = header.split("\t", 1)[0]
+    path = _HEADER_TIMESTAMP.sub("", path).strip()
+    if path != DEV_NULL and path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+
+def _parse_file_patches(patch_string: str) -> List[dict]:
+    """
+    Parse a (possibly multi-file) patch string into per-file sections.
+
+    Args:
+        patch_string: The patch content
+
+    Returns:
+        List of section dictionaries with "old_path" and "new_path" (None when
+        the patch has no file headers, DEV_NULL for created/deleted files),
+        the section's "hunks" (empty if none parsed), its "file_index" and
+        "rename", which is True when git "rename from"/"rename to" headers
+        precede the section
+    """
+    parser = HunkParser()
+    sections: List[dict] = []
+    rename = False
+
+    def add(hunk: Hunk):
+        # Hunks before the first file header get a section without paths
+        if not sections or sections[-1]["file_index"] != hunk.file_index:
+            sections.append(
+                {
+                    "old_path": hunk.old_path,
+                    "new_path": hunk.new_path,
+                    "hunks": [],
+                    "file_index": hunk.file_index,
+                    "rename": False,
+                }
+            )
+        sections[-1]["hunks"].append(hunk)
+
+    for line in _split_lines(patch_string):
+        # Extended headers of git diffs come before the ---/+++ headers
+        if line.startswith("diff --git "):
+            rename = False
+        elif line.startswith(("rename from ", "rename to ")):
+            rename = True
+        file_index = parser.file_index
+        for hunk in parser.feed(line):
+            add(hunk)
+        # A file header starts a section even if none of its hunks parse, so
+        # that the caller can reject it instead of silently skipping the file
+        if parser.file_index != file_index:
+            sections.append(
+                {
+                    "old_path": parser.old_path,
+                    "new_path": None,
+                    "hunks": [],
+                    "file_index": parser.file_index,
+                    "rename": rename,
+                }
+            )
+            rename = False
+        elif sections and not parser.file_has_hunks:
+            if sections[-1]["file_index"] == parser.file_index:
+                sections[-1]["new_path"] = parser.new_path
+    for hunk in parser.close():
+        add(hunk)
+    return sections
+
+
+def _lines_match(original_line: str, patch_text: str) -> bool:
+    """Compare a file line with a context/removed line, ignoring trailing whitespace."""
+    return original_line.rstrip() == patch_text.rstrip()
+
+
+class _LineHashIndex:
+    """
+    Map from the hash of each line (trailing whitespace ignored) to the
+    indexes where it occurs.
+
+    The index is built lazily in blocks of INDEX_BLOCK_LINES lines, starting
+    from the block a hunk is expected in and growing outward, so a hunk that
+    drifted by a few lines in a huge file only hashes the lines around it.
+    Hash collisions only produce extra candidates; every candidate location
+    is verified line by line before it is used.
+    """
+
+    def __init__(self, lines: Sequence[str]):
+        self._lines = lines
+        self._blocks: Dict[int, Dict[int, List[int]]] = {}
+
+    def _block(self, block: int) -> Dict[int, List[int]]:
+        positions = self._blocks.get(block)
+        if positions is None:
+            positions = {}
+            begin = block * INDEX_BLOCK_LINES
+            end = min(begin + INDEX_BLOCK_LINES, len(self._lines))
+            for i in range(begin, end):
+                key = hash(self._lines[i].rstrip())
+                positions.setdefault(key, []).append(i)
+            self._blocks[block] = positions
+        return positions
+
+    def count_near(self, text: str, target: int) -> int:
+        """Occurrences of text in the block containing target."""
+        if not self._lines:
+            return 0
+        target = min(max(target, 0), len(self._lines) - 1)
+        block = self._block(target // INDEX_BLOCK_LINES)
+        return len(block.get(hash(text.rstrip()), ()))
+
+    def nearest(self, text: str, target: int) -> Iterator[int]:
+        """
+        Yield the indexes of lines whose hash matches text, nearest to
+        target first (ties go to the earlier line).
+        """
+        line_count = len(self._lines)
+        if not line_count:
+            return
+        key = hash(text.rstrip())
+        block_count = (line_count + INDEX_BLOCK_LINES - 1) // INDEX_BLOCK_LINES
+        home = min(max(target, 0), line_count - 1) // INDEX_BLOCK_LINES
+        heap: List[Tuple[int, int]] = []
+
+        def load(block: int):
+            for i in self._block(block).get(key, ()):
+                heapq.heappush(heap, (abs(i - target), i))
+
+        load(home)
+        left, right = home - 1, home + 1
+        while True:
+            # Distance to the nearest line of the closest block not loaded yet
+            left_bound = (
+                target - ((left + 1) * INDEX_BLOCK_LINES - 1)
+                if left >= 0
+                else float("inf")
+            )
+            right_bound = (
+                right * INDEX_BLOCK_LINES - target
+                if right < block_count
+                else float("inf")
+            )
+            if heap and heap[0][0] <= min(left_bound, right_bound):
+                yield heapq.heappop(heap)[1]
+            elif left_bound <= right_bound and left >= 0:
+                load(left)
+                left -= 1
+            elif right < block_count:
+                load(right)
+                right += 1
+            else:
+                return
+
+
+def _trim_context(changes: List[str], fuzz: int) -> Tuple[int, List[str]]:
+    """
+    Drop up to `fuzz` context lines from each end of a hunk.
+
+    Returns:
+        The number of leading lines dropped and the remaining changes
+    """
+    lead = 0
+    while lead < fuzz and lead < len(changes) and changes[lead][:1] == " ":
+        lead += 1
+
+    end = len(changes)
+    for _ in range(fuzz):
+        last = end
+        while last > lead and changes[last - 1][:1] == "\\":
+            last -= 1
+        if last == lead or changes[last - 1][:1] != " ":
+            break
+        end = last - 1
+    return lead, changes[lead:end]
+
+
+def _old_lines(changes: List[str]) -> List[str]:
+    """Lines a hunk expects in the original file (context and removed)."""
+    return [change[1:] for change in changes if change[:1] in " -"]
+
+
+def _first_mismatch(
+    lines: Sequence[str], start: int, changes: List[str]
+) -> Optional[Tuple[int, str, Optional[str]]]:
+    """
+    Compare a hunk with the original lines starting at index start.
+
+    Returns:
+        None if every context and removed line matches, otherwise the index
+        of the first mismatch, the expected text and the line found there
+        (None past the end of the file)
+    """
+    line_count = len(lines)
+    for position, text in enumerate(_old_lines(changes), start):
+        found = lines[position] if position < line_count else None
+        if found is None or not _lines_match(found, text):
+            return position, text, found
+    return None
+
+
+def _locate_hunk(
+    lines: Sequence[str],
+    number: int,
+    hunk: Hunk,
+    expected: int,
+    lower: int,
+    index: _LineHashIndex,
+    fuzz: int,
+    max_offset: Optional[int],
+) -> dict:
+    """
+    Find where a hunk applies, searching outward from the expected index.
+
+    Args:
+        lines: Original file lines
+        number: 1-based hunk number, for messages
+        hunk: Hunk to locate
+        expected: 0-based index where the hunk should start
+        lower: Smallest index the hunk may touch (end of the previous hunk)
+        index: Hash index of the original lines
+        fuzz: Context lines that may be ignored at each end of the hunk
+        max_offset: Furthest distance the hunk may be moved, None for any
+
+    Returns:
+        Placement dictionary with the hunk number, the 0-based start of the
+        untrimmed hunk, the number of leading lines dropped by fuzz, the
+        remaining changes and the fuzz used
+
+    Raises:
+        ValueError: If the hunk does not apply anywhere
+    """
+    line_count = len(lines)
+    changes = hunk.changes
+
+    if not _old_lines(changes):
+        # Nothing to match against, the hunk can only go where it says
+        if lower <= expected <= line_count:
+            return {
+                "number": number,
+                "start": expected,
+                "lead": 0,
+                "changes": changes,
+                "fuzz": 0,
+            }
+        if expected < lower:
+            raise ValueError(f"Hunk #{number} overlaps the previous hunk")
+        raise ValueError(
+            f"Hunk #{number} starts at line {expected + 1}, "
+            f"past the end of the file ({line_count} lines)"
+        )
+
+    tried = set()
+    for level in range(fuzz + 1):
+        lead, trimmed = _trim_context(changes, level)
+        old_lines = _old_lines(trimmed)
+        if not old_lines or (lead, len(trimmed)) in tried:
+            continue
+        tried.add((lead, len(trimmed)))
+
+        if expected + lead >= lower and not _first_mismatch(
+            lines, expected + lead, trimmed
+        ):
+            return {
+                "number": number,
+                "start": expected,
+                "lead": lead,
+                "changes": trimmed,
+                "fuzz": level,
             }
-        elif current_hunk and line.startswith((" ", "+", "-")):
-            current_hunk["changes"].append(line)
 
-    if current_hunk:
-        hunks.append(current_hunk)
+        # Search outward, anchored on the rarest line of the hunk nearby
+        target = expected + lead
+        anchor = min(
+            range(len(old_lines)),
+            key=lambda i: index.count_near(old_lines[i], target + i),
+        )
+        for position in index.nearest(old_lines[anchor], target + anchor):
+            start = position - anchor - lead
+            if max_offset is not None and abs(start - expected) > max_offset:
+                break
+            if start + lead < lower or start + lead + len(old_lines) > line_count:
+                continue
+            if not _first_mismatch(lines, start + lead, trimmed):
+                return {
+                    "number": number,
+                    "start": start,
+                    "lead": lead,
+                    "changes": trimmed,
+                    "fuzz": level,
+                }
 
-    return hunks
+    if expected < lower:
+        raise ValueError(f"Hunk #{number} overlaps the previous hunk")
+    if expected > line_count:
+        raise ValueError(
+            f"Hunk #{number} starts at line {expected + 1}, "
+            f"past the end of the file ({line_count} lines)"
+        )
+    position, text, found = _first_mismatch(lines, expected, changes)
+    found = "<end of file>" if found is None else found.rstrip("\r\n")
+    raise ValueError(
+        f"Hunk #{number} does not match line {position + 1}: "
+        f"expected {text!r}, found {found!r}"
+    )
 
 
-def _apply_hunks(original_lines: List[str], hunks: List[dict]) -> List[str]:
+def _locate_hunks(
+    lines: Sequence[str],
+    hunks: List[Hunk],
+    fuzz: int = 0,
+    max_offset: Optional[int] = None,
+    failures: Optional[List[HunkResult]] = None,
+) -> List[dict]:
+    """
+    Find where every hunk applies, in file order.
+
+    Each hunk is first tried at its stated line shifted by the offset at
+    which the previous hunk applied, as GNU patch does, so a block of lines
+    inserted above several hunks only has to be searched for once.
+
+    Args:
+        lines: Original file lines; only lines near the hunks are read unless
+            a hunk has to be searched for
+        hunks: List of hunks
+        fuzz: Context lines that may be ignored at each end of a hunk
+        max_offset: Furthest distance a hunk may be moved, None for any
+        failures: If given, hunks that do not apply are appended to it as
+            HunkResults and the remaining hunks are still checked
+
+    Returns:
+        Placement dictionaries (see _locate_hunk) sorted by position
+
+    Raises:
+        ValueError: If a hunk does not apply anywhere and failures is None
+    """
+    index = _LineHashIndex(lines)
+    placements = []
+    lower = 0
+    offset = 0
+
+    ordered = sorted(enumerate(hunks, 1), key=lambda item: item[1].old_start)
+    for number, hunk in ordered:
+        # A hunk that removes nothing inserts after old_start, otherwise its
+        # first old line is old_start (both converted to a 0-based index)
+        if hunk.old_count == 0:
+            stated = hunk.old_start
+        else:
+            stated = hunk.old_start - 1
+
+        try:
+            placement = _locate_hunk(
+                lines, number, hunk, stated + offset, lower, index, fuzz, max_offset
+            )
+        except ValueError as e:
+            if failures is None:
+                raise
+            error = str(e).removeprefix(f"Hunk #{number} ")
+            failures.append(HunkResult(number, hunk.old_start, error=error))
+            continue
+        offset = placement["start"] - stated
+        placement["old_start"] = hunk.old_start
+        placement["applied_start"] = hunk.old_start + offset
+        lower = (
+            placement["start"]
+            + placement["lead"]
+            + len(_old_lines(placement["changes"]))
+        )
+        placements.append(placement)
+
+    return placements
+
+
+def check_hunk(
+    file_path: str, hunk: Hunk, number: int = 1, fuzz: int = DEFAULT_FUZZ
+) -> HunkResult:
+    """
+    Check a single hunk against the current (cached) content of a file.
+
+    The hunk is located on its own, so this can run while the rest of the
+    patch is still being produced; a full dry run is still needed to check
+    the hunks against each other.
+
+    Args:
+        file_path: File the hunk is meant for
+        hunk: Hunk to check
+        number: Hunk number to use in the result
+        fuzz: Context lines that may be ignored at each end of the hunk
+
+    Returns:
+        HunkResult: Where the hunk would apply, or why it does not
+    """
+    failures: List[HunkResult] = []
+    placements = _locate_hunks(
+        file_cache.read_lines(file_path), [hunk], fuzz, failures=failures
+    )
+    result = failures[0] if failures else _hunk_result(placements[0])
+    result.number = number
+    return result
+
+
+def _hunk_result(placement: dict) -> HunkResult:
+    """Describe a placement in terms of the hunk's own line numbers."""
+    return HunkResult(
+        number=placement["number"],
+        old_start=placement["old_start"],
+        applied_start=placement["applied_start"],
+        fuzz=placement["fuzz"],
+    )
+
+
+def _plan_hunks(
+    placements: List[dict],
+    line_count: int,
+) -> Iterator[Tuple[str, Union[Tuple[int, int], str]]]:
+    """
+    Describe the patched file as a single forward pass over the original.
+
+    Unchanged regions (including context lines) are emitted as
+    ("copy", (start, end)) ranges of original line indexes, and added lines as
+    ("text", line). Adjacent copy ranges are merged so callers can copy large
+    regions at once.
+
+    Args:
+        placements: Located hunks from _locate_hunks, in file order
+        line_count: Number of lines in the original file
+
+    Yields:
+        ("copy", (start, end)) or ("text", line) operations in file order
+    """
+    copy_start = 0  # Start of the pending copy range ending at position
+
+    for placement in placements:
+        position = placement["start"] + placement["lead"]
+        changes = placement["changes"]
+        for i, change in enumerate(changes):
+            tag, text = change[0], change[1:]
+            if tag == "+":
+                if position > copy_start:
+                    yield "copy", (copy_start, position)
+                # "\ No newline at end of file" after an added line
+                no_newline = i + 1 < len(changes) and changes[i + 1][:1] == "\\"
+                yield "text", text if no_newline else text + "\n"
+                copy_start = position
+            elif tag in " -":
+                if tag == "-":
+                    if position > copy_start:
+                        yield "copy", (copy_start, position)
+                    copy_start = position + 1
+                position += 1
+
+    if line_count > copy_start:
+        yield "copy", (copy_start, line_count)
+
+
+def _render_placements(
+    original_lines: Sequence[str], placements: List[dict], newline: str = "\n"
+) -> List[str]:
+    """
+    Build the patched lines from the original and the located hunks.
+
+    Copied lines are kept as they are; added lines end with newline.
+    """
+    result_lines: List[str] = []
+    for op, value in _plan_hunks(placements, len(original_lines)):
+        if op == "copy":
+            start, end = value
+            result_lines.extend(original_lines[start:end])
+        else:
+            result_lines.append(_with_newline(value, newline))
+    return result_lines
+
+
+def _with_newline(line: str, newline: str) -> str:
+    """Give an added line (ending in "\n", if at all) the file's line ending."""
+    if newline != "\n" and line.endswith("\n"):
+        return line[:-1] + newline
+    return line
+
+
+def _read_raw_lines(file_path: str) -> List[str]:
+    """
+    Read the lines of a file without translating their endings.
+
+    Lines are split at "\n" only, like LineIndex does for the streaming path,
+    so a "\r\n" or a lone "\r" stays part of the line it belongs to.
+    """
+    with open(file_path, "rb") as f:
+        return [line.decode("utf-8") for line in f]
+
+
+def _apply_hunks(
+    original_lines: List[str], hunks: List[Hunk], fuzz: int = 0, newline: str = "\n"
+) -> List[str]:
     """
     Apply hunks to the original file lines.
 
+    The result is built in a single forward pass: unchanged regions are copied
+    as slices of the original and each hunk's lines are spliced in between, so
+    the cost is linear in the size of the file plus the patch. Hunks whose
+    line numbers have drifted are relocated first (see _locate_hunks).
+
     Args:
         original_lines: Original file content as list of lines
-        hunks: List of hunk dictionaries
+        hunks: List of hunks
+        fuzz: Context lines that may be ignored at each end of a hunk
+        newline: Line ending for added lines
 
     Returns:
         Modified file content as list of lines
+
+    Raises:
+        ValueError: If hunks overlap or a hunk does not match anywhere
+    """
+    placements = _locate_hunks(original_lines, hunks, fuzz)
+    return _render_placements(original_lines, placements, newline)
+
+
+class _MappedLines:
+    """Read-only, lazily decoded view of the lines of a memory-mapped file."""
+
+    def __init__(self, data: mmap.mmap, offsets: Sequence[int]):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        begin, end = self._offsets[index], self._offsets[index + 1]
+        return self._data[begin:end].decode("utf-8")
+
+
+@contextmanager
+def _mapped_lines(file_path: str) -> Iterator[Sequence[str]]:
+    """Memory-map a file and expose its lines without reading it whole."""
+    offsets = LineIndex.build(file_path).offsets
+    if offsets[-1] == 0:
+        yield []
+        return
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield _MappedLines(data, offsets)
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int):
+    """
+    Copy count bytes starting at offset in src_fd to the current position of
+    dst_fd, using copy_file_range/sendfile when the platform supports them.
     """
-    result_lines = original_lines.copy()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None)
 
-    # Process hunks in reverse order to maintain line number accuracy
-    for hunk in reversed(hunks):
-        old_start = hunk["old_start"] - 1  # Convert to 0-based index
-        old_count = hunk["old_count"]
-        changes = hunk["changes"]
+    while count > 0:
+        try:
+            if copy_file_range is not None:
+                copied = copy_file_range(src_fd, dst_fd, count, offset)
+            elif sendfile is not None:
+                copied = sendfile(dst_fd, src_fd, offset, count)
+            else:
+                copied = os.write(
+                    dst_fd, os.pread(src_fd, min(count, COPY_CHUNK_SIZE), offset)
+                )
+        except OSError:
+            if copy_file_range is None and sendfile is None:
+                raise
+            # Not supported for this pair of files, fall back to plain copies
+            copy_file_range = sendfile = None
+            continue
 
-        # Remove the old lines
-        del result_lines[old_start : old_start + old_count]
+        if copied == 0:
+            raise ValueError("Unexpected end of file while copying")
+        offset += copied
+        count -= copied
 
-        # Insert new lines
-        new_lines = []
+
+def detect_newline(file_path: str) -> str:
+    """
+    Return the line ending used by a file: "\r\n" if its first line ends
+    with one, otherwise "\n".
+
+    Added lines are written with this ending, so a CRLF file stays CRLF
+    whether it is patched in memory or by streaming.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            sample = f.read(NEWLINE_SAMPLE_SIZE)
+    except OSError:
+        return "\n"
+    end = sample.find(b"\n")
+    return "\r\n" if end > 0 and sample[end - 1 : end] == b"\r" else "\n"
+
+
+def _replace_file(
+    temp_path: str, file_path: str, store: Optional[BackupStore] = None
+) -> Optional[str]:
+    """
+    Rename a fully written temporary file over file_path, keeping the
+    original in the backup store (if any).
+
+    Returns:
+        The hash of the original content in the store (None without a store)
+    """
+    if store is None:
+        os.replace(temp_path, file_path)
+        return None
+    return store.replace_file(temp_path, file_path)
+
+
+def _write_lines_atomic(
+    file_path: str, lines: List[str], store: Optional[BackupStore] = None
+) -> Optional[str]:
+    """
+    Write lines to a temporary file next to file_path and rename it over.
+    Line endings are written as they are.
+
+    Returns:
+        The hash of the original content in the backup store (None without
+        a store)
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".patch.tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.writelines(lines)
+        shutil.copymode(file_path, temp_path)
+        return _replace_file(temp_path, file_path, store)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _apply_patch_streaming(
+    file_path: str,
+    hunks: List[Hunk],
+    store: Optional[BackupStore] = None,
+    fuzz: int = 0,
+    max_offset: Optional[int] = None,
+    report: Optional[PatchReport] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Apply hunks to a file without loading it into memory.
+
+    Unchanged regions are copied between file descriptors in large chunks into
+    a temporary file next to the target, which is then atomically renamed into
+    place. Only the lines touched by hunks are decoded for verification.
+
+    Args:
+        file_path: Path to the target file to patch
+        hunks: List of hunks
+        store: Backup store to keep the original content in, if any
+        fuzz: Context lines that may be ignored at each end of a hunk
+        max_offset: Furthest distance a hunk may be moved, None for any
+        report: If given, every hunk is checked and its result recorded here
+            before anything is written, as for an in-memory patch
+
+    Returns:
+        Where each hunk was applied (see _locate_hunks) and the hash of the
+        original content in the backup store (None without a store)
+
+    Raises:
+        ValueError: If a hunk does not apply
+    """
+    offsets = LineIndex.build(file_path).offsets
+    directory = os.path.dirname(os.path.abspath(file_path))
+    newline = detect_newline(file_path)
+
+    def locate(lines: Sequence[str]) -> List[dict]:
+        if report is None:
+            return _locate_hunks(lines, hunks, fuzz, max_offset)
+        placements = _check_hunks(report, lines, hunks, fuzz, max_offset)
+        if report.error is not None:
+            raise ValueError(report.error)
+        return placements
+
+    def encode(line: str) -> bytes:
+        # Copied regions keep their bytes; added lines use the file's ending
+        return _with_newline(line, newline).encode("utf-8")
+
+    with open(file_path, "rb") as src:
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".patch.tmp")
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                if offsets[-1] > 0:
+                    with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        lines = _MappedLines(data, offsets)
+                        placements = locate(lines)
+                        for op, value in _plan_hunks(placements, len(lines)):
+                            if op == "copy":
+                                start, end = value
+                                dst.flush()
+                                _copy_range(
+                                    src.fileno(),
+                                    dst.fileno(),
+                                    offsets[start],
+                                    offsets[end] - offsets[start],
+                                )
+                            else:
+                                dst.write(encode(value))
+                else:
+                    placements = locate([])
+                    for _, value in _plan_hunks(placements, 0):
+                        dst.write(encode(value))
+            shutil.copymode(file_path, temp_path)
+            # The original inode stays intact after the rename, so the backup
+            # store can keep it without copying any data
+            before = _replace_file(temp_path, file_path, store)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+    return placements, before
+
+
+def _resolve_in_root(root: str, path: str) -> str:
+    """Resolve a patch header path, refusing paths outside of root."""
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        raise ValueError(f"{path}: path is outside of {root}")
+    return full_path
+
+
+def _prepare_file_change(change: dict, fuzz: int):
+    """Validate one file section and compute its new content."""
+    source, target = change["source"], change["target"]
+    name = change["name"]
+    if source is None:
+        if os.path.exists(target):
+            raise ValueError(f"{name}: cannot create, file already exists")
+        original_lines = []
+    else:
+        if not os.path.isfile(source):
+            raise ValueError(f"{name}: file does not exist")
+        if target not in (None, source) and os.path.exists(target):
+            raise ValueError(f"{name}: cannot rename, target already exists")
+        original_lines = _read_raw_lines(source)
+        change["newline"] = detect_newline(source)
+
+    try:
+        patched_lines = _apply_hunks(
+            original_lines, change["hunks"], fuzz, change["newline"]
+        )
+    except ValueError as e:
+        raise ValueError(f"{name}: {e}")
+    if target is None and "".join(patched_lines):
+        raise ValueError(f"{name}: deletion does not remove all lines")
+    change["lines"] = patched_lines
+
+
+def _stage_file_change(change: dict):
+    """Write the new content of one file to a temporary file beside it."""
+    target = change["target"]
+    if target is None:
+        return
+    directory = os.path.dirname(target)
+    missing = directory
+    while not os.path.isdir(missing):
+        change["created_dirs"].append(missing)
+        missing = os.path.dirname(missing)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, staged_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".tmp"
+    )
+    change["staged"] = staged_path
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        f.writelines(change["lines"])
+    if change["source"] is not None:
+        shutil.copymode(change["source"], staged_path)
+
+
+def _set_aside(source: str) -> str:
+    """Keep the original of a file under a temporary name beside it."""
+    fd, aside_path = tempfile.mkstemp(
+        dir=os.path.dirname(source),
+        prefix=f".{os.path.basename(source)}.",
+        suffix=".aside",
+    )
+    os.close(fd)
+    os.unlink(aside_path)
+    try:
+        os.link(source, aside_path)
+    except OSError:
+        shutil.copy2(source, aside_path)
+    return aside_path
+
+
+def _rollback_file_changes(changes: List[dict]):
+    """Undo committed file changes in reverse order and remove staged files."""
+    for change in reversed(changes):
+        try:
+            if change["placed"] and change["target"] != change["source"]:
+                os.unlink(change["target"])
+            aside, source = change["aside"], change["source"]
+            if aside is not None:
+                # The aside copy may still be a hard link to the untouched source
+                if os.path.exists(source) and os.path.samefile(aside, source):
+                    os.unlink(aside)
+                else:
+                    os.replace(aside, source)
+            if change["staged"] is not None and os.path.exists(change["staged"]):
+                os.unlink(change["staged"])
+            for directory in change["created_dirs"]:
+                os.rmdir(directory)
+        except OSError as e:
+            print(f"Error rolling back {change['name']}: {e}")
+
+
+def apply_patch_set(
+    patch_string: str,
+    root: str = ".",
+    backup: bool = True,
+    fuzz: int = DEFAULT_FUZZ,
+) -> List[str]:
+    """
+    Apply a multi-file patch as a single transaction.
+
+    Every file section is validated against the current content first (the
+    files are processed concurrently), the patched content is staged in
+    temporary files next to the targets, and only then are the targets
+    swapped into place. If anything fails, files that were already replaced
+    are restored, so either all files change or none do.
+
+    Files are created when the old path is /dev/null and deleted when the
+    new path is /dev/null. A file is only renamed when git "rename from" /
+    "rename to" headers say so; otherwise, as in GNU patch, differing old and
+    new paths (e.g. from "diff -u f f.new") patch the existing one in place,
+    preferring the old path.
+
+    Args:
+        patch_string: Unified diff with ---/+++ headers for every file
+        root: Directory the paths in the headers are relative to
+        backup: Whether to record the change in the backup store of root so
+            that it can be undone as a whole
+        fuzz: Context lines that may be ignored at each end of a hunk
+
+    Returns:
+        List[str]: One summary line per file, e.g. "modified tools/coder.py"
+
+    Raises:
+        ValueError: If the patch is malformed or any hunk does not apply
+        OSError: If writing fails; the files are left unchanged
+    """
+    root = os.path.realpath(root)
+    sections = _parse_file_patches(patch_string)
+    if not sections:
+        raise ValueError("Patch contains no file sections")
+
+    changes = []
+    claimed = set()
+    for section in sections:
+        old_path, new_path = section["old_path"], section["new_path"]
+        if old_path is None or new_path is None:
+            raise ValueError("Every file in the patch needs --- and +++ headers")
+        if old_path == DEV_NULL and new_path == DEV_NULL:
+            raise ValueError("A file section cannot have /dev/null on both sides")
+        if not section["hunks"]:
+            raise ValueError(f"{new_path}: no hunks found")
+
+        source = None if old_path == DEV_NULL else _resolve_in_root(root, old_path)
+        target = None if new_path == DEV_NULL else _resolve_in_root(root, new_path)
+        if None not in (source, target) and not section["rename"]:
+            if os.path.exists(source) or not os.path.exists(target):
+                target, new_path = source, old_path
+            else:
+                source, old_path = target, new_path
+        paths = {source, target} - {None}
+        if paths & claimed:
+            raise ValueError(f"{new_path}: file appears more than once in the patch")
+        claimed |= paths
+
+        if source is None:
+            action, name = "created", new_path
+        elif target is None:
+            action, name = "deleted", old_path
+        elif source != target:
+            action, name = "renamed", f"{old_path} -> {new_path}"
+        else:
+            action, name = "modified", new_path
+        changes.append(
+            {
+                "name": name,
+                "action": action,
+                "source": source,
+                "target": target,
+                "hunks": section["hunks"],
+                "lines": None,
+                "newline": "\n",
+                "staged": None,
+                "aside": None,
+                "placed": False,
+                "created_dirs": [],
+            }
+        )
+
+    # Validate every file before touching any of them
+    with ThreadPoolExecutor(max_workers=min(8, len(changes))) as executor:
+        futures = [executor.submit(_prepare_file_change, c, fuzz) for c in changes]
+    errors = [str(f.exception()) for f in futures if f.exception() is not None]
+    if errors:
+        raise ValueError("\n".join(errors))
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(8, len(changes))) as executor:
+            for future in [executor.submit(_stage_file_change, c) for c in changes]:
+                future.result()
+
+        for change in changes:
+            if change["source"] is not None:
+                change["aside"] = _set_aside(change["source"])
+            if change["target"] is not None:
+                os.replace(change["staged"], change["target"])
+                change["placed"] = True
+            if change["source"] not in (None, change["target"]):
+                os.unlink(change["source"])
+    except BaseException:
+        _rollback_file_changes(changes)
+        raise
+    finally:
         for change in changes:
-            if change.startswith("+"):
-                new_lines.append(change[1:] + "\n")
-            elif change.startswith(" "):
-                new_lines.append(change[1:] + "\n")
+            for path in (change["source"], change["target"]):
+                if path is not None:
+                    file_cache.invalidate(path)
 
-        # Insert the new lines
-        for i, new_line in enumerate(new_lines):
-            result_lines.insert(old_start + i, new_line)
+    store = get_backup_store(root) if backup else None
+    recorded = []
+    for change in changes:
+        source, target = change["source"], change["target"]
+        before = None
+        if change["aside"] is not None:
+            # The aside copy is the original inode, nothing else refers to it
+            if store is not None:
+                before = store.store_file(change["aside"], link=True)
+            os.unlink(change["aside"])
+        after = file_digest(target) if target is not None else None
+        if source is None or source == target:
+            recorded.append((target or source, before, after))
+        else:
+            recorded.append((source, before, None))
+            if target is not None:
+                recorded.append((target, None, after))
+    if store is not None:
+        store.record(recorded, "patch " + ", ".join(c["name"] for c in changes))
 
-    return result_lines
+    summary = []
+    for change in changes:
+        hunk_count = len(change["hunks"])
+        summary.append(
+            f"{change['action']} {change['name']} "
+            f"({hunk_count} hunk{'s' if hunk_count != 1 else ''})"
+        )
+    return summary
 
 
-def create_patch(old_file: str, new_file: str) -> str:
+def merge_region_patches(
+    file_path: str,
+    regions: Sequence[Tuple[int, int, str]],
+    fuzz: int = DEFAULT_FUZZ,
+    context: int = 3,
+) -> Tuple[str, List[str]]:
+    """
+    Combine patches made separately for regions of a file into one patch.
+
+    Each region's patch is applied to that region's lines only, so it may
+    number its lines relative to the region or to the whole file, and drifted
+    line numbers are relocated as usual. The merged patch is then generated
+    from the whole original and patched file, so its line numbers and
+    offsets are correct for the file.
+
+    Args:
+        file_path: File the regions belong to
+        regions: (start_line, end_line, patch_string) per region, with
+            1-based inclusive line numbers; regions must not overlap
+        fuzz: Context lines that may be ignored at each end of a hunk
+        context: Number of context lines in the merged patch
+
+    Returns:
+        The merged unified diff (empty if nothing changes) and one message
+        per region whose patch did not apply; those regions are left as is
+    """
+    original_lines = file_cache.read_lines(file_path)
+    patched_lines: List[str] = []
+    errors = []
+    position = 0
+
+    for start_line, end_line, patch_string in sorted(regions):
+        if start_line - 1 < position:
+            raise ValueError(f"Region {start_line}-{end_line} overlaps another")
+        patched_lines.extend(original_lines[position : start_line - 1])
+        region_lines = original_lines[start_line - 1 : end_line]
+        position = end_line
+
+        hunks = list(iter_hunks(patch_string))
+        if hunks and start_line > 1 and min(h.old_start for h in hunks) >= start_line:
+            # Numbered relative to the file, make them relative to the region
+            for hunk in hunks:
+                hunk.old_start -= start_line - 1
+                hunk.new_start -= start_line - 1
+        try:
+            patched_lines.extend(_apply_hunks(region_lines, hunks, fuzz))
+        except ValueError as e:
+            errors.append(f"Lines {start_line}-{end_line}: {e}")
+            patched_lines.extend(region_lines)
+
+    patched_lines.extend(original_lines[position:])
+    patch = _generate_unified_diff(
+        original_lines, patched_lines, file_path, file_path, context
+    )
+    return patch, errors
+
+
+def create_patch(
+    old_file: str, new_file: str, context: int = 3, algorithm: str = "myers"
+) -> str:
     """
     Create a patch string from two file contents.
 
     Args:
         old_file: Path to the original file
         new_file: Path to the modified file
+        context: Number of context lines around each change
+        algorithm: Diff algorithm, one of "myers", "patience" or "histogram"
 
     Returns:
         Patch string in unified diff format
@@ -146,14 +1505,21 @@ def create_patch(old_file: str, new_file: str) -> str:
         with open(new_file, "r", encoding="utf-8") as f:
             new_lines = f.readlines()
 
-        return _generate_unified_diff(old_lines, new_lines, old_file, new_file)
+        return _generate_unified_diff(
+            old_lines, new_lines, old_file, new_file, context, algorithm
+        )
     except Exception as e:
         print(f"Error creating patch: {e}")
         return ""
 
 
 def _generate_unified_diff(
-    old_lines: List[str], new_lines: List[str], old_file: str, new_file: str
+    old_lines: List[str],
+    new_lines: List[str],
+    old_file: str,
+    new_file: str,
+    context: int = 3,
+    algorithm: str = "myers",
 ) -> str:
     """
     Generate a unified diff between two file contents.
@@ -163,38 +1529,13 @@ def _generate_unified_diff(
         new_lines: Modified file lines
         old_file: Original file path
         new_file: Modified file path
+        context: Number of context lines around each change
+        algorithm: Diff algorithm, one of "myers", "patience" or "histogram"
 
     Returns:
         Unified diff string
     """
-    # Simple diff implementation - in practice, you might want to use difflib
-    diff_lines = []
-    diff_lines.append(f"--- {old_file}")
-    diff_lines.append(f"+++ {new_file}")
-
-    # Find differences (simplified implementation)
-    old_len = len(old_lines)
-    new_len = len(new_lines)
-    max_len = max(old_len, new_len)
-
-    changes = []
-    for i in range(max_len):
-        old_line = old_lines[i] if i < old_len else ""
-        new_line = new_lines[i] if i < new_len else ""
-
-        if old_line != new_line:
-            if old_line:
-                changes.append(f"-{old_line.rstrip()}")
-            if new_line:
-                changes.append(f"+{new_line.rstrip()}")
-        else:
-            changes.append(f" {old_line.rstrip()}")
-
-    if changes:
-        diff_lines.append(f"@@ -1,{old_len} +1,{new_len} @@")
-        diff_lines.extend(changes)
-
-    return "\n".join(diff_lines)
+    return unified_diff(old_lines, new_lines, old_file, new_file, context, algorithm)
 
 
 # Example usage and test function
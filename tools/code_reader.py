@@ -1,11 +1,42 @@
+import asyncio
+import base64
+import json
+import os
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from tools.file_cache import file_cache
+from tools.line_index import LineIndex
+
+# 分页读取时每页的字节数上限：中文约 3 字节一个 token，一页也在单个工具返回的
+# token 上限之内
+MAX_PAGE_BYTES = 16 * 1024
+
+
+def get_line_index(file_path: str) -> LineIndex:
+    """
+    获取文件的行偏移索引，文件未变化时复用进程级缓存中的索引
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        LineIndex: 与文件当前版本一致的行索引
+    """
+    return file_cache.get_line_index(file_path)
+
+
 def read_file_lines(file_path: str, start_line: int, end_line: int = None) -> str:
     """
     读取指定文件的指定行数代码
 
+    通过行偏移索引定位字节区间并用 mmap 读取，
+    读取代价与所读区间大小成正比，而不是与文件大小成正比。
+
     Args:
         file_path (str): 文件路径
         start_line (int): 起始行号（从1开始）
-        end_line (int, optional): 结束行号（从1开始），如果为None则只返回start_line行
+        end_line (int, optional): 结束行号（从1开始），如果为None则读取到文件末尾
 
     Returns:
         str: 指定行数的代码内容
@@ -17,8 +48,6 @@ def read_file_lines(file_path: str, start_line: int, end_line: int = None) -> st
     """
     try:
         # 验证文件是否存在
-        import os
-
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
@@ -29,25 +58,19 @@ def read_file_lines(file_path: str, start_line: int, end_line: int = None) -> st
         if end_line is not None and end_line < start_line:
             raise ValueError("结束行号不能小于起始行号")
 
-        # 读取文件
-        with open(file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
+        # 获取行索引
+        index = get_line_index(file_path)
 
         # 验证行号是否超出文件范围
-        total_lines = len(lines)
+        total_lines = index.line_count
         if start_line > total_lines:
             start_line = total_lines - 1
 
         if end_line is not None and end_line > total_lines:
             end_line = total_lines
 
-        # 提取指定行数（转换为0基索引）
-        start_idx = start_line - 1
-        end_idx = end_line if end_line is None else end_line
-
-        # 返回指定行数的代码
-        selected_lines = lines[start_idx:end_idx]
-        return "".join(selected_lines)
+        # 读取指定行数（转换为0基索引）
+        return index.read(start_line - 1, end_line)
 
     except (FileNotFoundError, ValueError):
         # 重新抛出已知的异常类型
@@ -70,16 +93,257 @@ def read_file_line(file_path: str, line_number: int) -> str:
     return read_file_lines(file_path, line_number, line_number)
 
 
+@dataclass
+class ReadRange:
+    """批量读取中的一个区间"""
+
+    file_path: str
+    start_line: int = 1
+    end_line: Optional[int] = None
+
+
+def _read_range(read_range: ReadRange) -> Tuple[str, str]:
+    """读取单个区间，返回 (标题, 内容)，错误信息作为内容返回而不抛出"""
+    end_line = read_range.end_line
+    if end_line is None:
+        title = f"{read_range.file_path} (第 {read_range.start_line} 行到最后一行)"
+    else:
+        title = f"{read_range.file_path} (第 {read_range.start_line}-{end_line} 行)"
+
+    try:
+        content = read_file_lines(read_range.file_path, read_range.start_line, end_line)
+    except (FileNotFoundError, ValueError, IOError) as e:
+        content = f"❌ 错误: {e}\n"
+    return title, content
+
+
+async def read_file_ranges(ranges: List[ReadRange], max_chars: int = 20000) -> str:
+    """
+    并发读取多个文件的多个区间，合并为一个有长度上限的结果
+
+    每个区间在线程池中读取，阻塞的文件 I/O 不会占用事件循环。
+
+    Args:
+        ranges (List[ReadRange]): 要读取的区间列表
+        max_chars (int): 返回内容的总字符数上限，超出部分会被截断
+
+    Returns:
+        str: 按输入顺序拼接的各区间内容
+    """
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_read_range, read_range) for read_range in ranges)
+    )
+
+    sections = []
+    remaining = max_chars
+    for i, (title, content) in enumerate(results):
+        if remaining <= 0:
+            omitted = ", ".join(title for title, _ in results[i:])
+            sections.append(f"[已达到长度上限，未返回: {omitted}]")
+            break
+
+        if len(content) > remaining:
+            content = content[:remaining] + f"\n[已截断，共 {len(content)} 个字符]\n"
+        remaining -= len(content)
+        sections.append(f"==> {title} <==\n{content}")
+
+    return "\n".join(sections)
+
+
+def iter_line_chunks(
+    file_path: str, byte_offset: int = 0, chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """
+    从指定字节偏移开始逐行读取文件
+
+    超长的行会被切成不超过 chunk_size 的片段，因此无论文件或单行多大，内存占用都是固定的。
+
+    Args:
+        file_path (str): 文件路径
+        byte_offset (int): 起始字节偏移
+        chunk_size (int): 单个片段的最大字节数
+
+    Yields:
+        bytes: 原始字节片段，完整的行以 b"\n" 结尾
+    """
+    with open(file_path, "rb") as file:
+        file.seek(byte_offset)
+        while True:
+            chunk = file.readline(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """返回 data 中以完整 UTF-8 字符结尾的最长前缀长度"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 != 0x80:
+            # 找到字符的首字节，判断该字符是否完整
+            if byte >= 0xF0:
+                width = 4
+            elif byte >= 0xE0:
+                width = 3
+            elif byte >= 0xC0:
+                width = 2
+            else:
+                width = 1
+            return len(data) if back >= width else len(data) - back
+    return len(data)
+
+
+def _encode_cursor(file_path: str, byte_offset: int, line: int) -> str:
+    """生成不透明的续读游标"""
+    st = os.stat(file_path)
+    payload = {
+        "p": os.path.realpath(file_path),
+        "o": byte_offset,
+        "l": line,
+        "i": st.st_ino,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(file_path: str, cursor: str) -> Tuple[int, int]:
+    """解析续读游标，返回 (字节偏移, 行号)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        byte_offset, line, inode = payload["o"], payload["l"], payload["i"]
+        cursor_path = payload["p"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("无效的续读游标")
+
+    if cursor_path != os.path.realpath(file_path):
+        raise ValueError("续读游标不属于该文件")
+
+    st = os.stat(file_path)
+    if st.st_ino != inode or st.st_size < byte_offset:
+        raise ValueError("文件已被替换或截断，请重新从指定行开始读取")
+    return byte_offset, line
+
+
+@dataclass
+class FilePage:
+    """分页读取的一页内容"""
+
+    file_path: str
+    content: str
+    start_line: int
+    end_line: int
+    next_cursor: Optional[str]
+
+    def render(self) -> str:
+        """渲染为返回给模型的文本"""
+        if self.next_cursor is None:
+            footer = f"[第 {self.start_line}-{self.end_line} 行，已到文件末尾]"
+        else:
+            footer = (
+                f"[第 {self.start_line}-{self.end_line} 行，未读完；"
+                f'继续读取请传入 cursor="{self.next_cursor}"]'
+            )
+        content = self.content
+        if content and not content.endswith("\n"):
+            content += "\n"
+        return content + footer
+
+
+def read_file_page(
+    file_path: str,
+    start_line: int = 1,
+    cursor: Optional[str] = None,
+    max_bytes: int = MAX_PAGE_BYTES,
+) -> FilePage:
+    """
+    分页读取大文件，每页不超过 max_bytes 字节（约 max_bytes / 4 个 token）
+
+    Args:
+        file_path (str): 文件路径
+        start_line (int): 起始行号（从1开始），传入 cursor 时忽略
+        cursor (str, optional): 上一页返回的续读游标
+        max_bytes (int): 每页的字节预算
+
+    Returns:
+        FilePage: 本页内容及下一页的游标（已读完时为 None）
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 参数或游标无效
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    if max_bytes < 4:
+        raise ValueError("每页字节数不能小于4")
+
+    if cursor is not None:
+        byte_offset, line = _decode_cursor(file_path, cursor)
+    else:
+        if start_line < 1:
+            raise ValueError("起始行号必须大于等于1")
+        # 跳过起始行之前的内容，只统计偏移，不保留数据
+        byte_offset, line = 0, 1
+        for chunk in iter_line_chunks(file_path):
+            if line >= start_line:
+                break
+            byte_offset += len(chunk)
+            if chunk.endswith(b"\n"):
+                line += 1
+
+    first_line = line
+    parts: List[bytes] = []
+    used = 0
+    exhausted = True
+    for chunk in iter_line_chunks(file_path, byte_offset):
+        if used + len(chunk) > max_bytes:
+            exhausted = False
+            if parts:
+                break
+            # 单行超过预算时只取预算内的部分，并截在完整字符处
+            chunk = chunk[: _utf8_boundary(chunk[:max_bytes])]
+        parts.append(chunk)
+        used += len(chunk)
+        byte_offset += len(chunk)
+        if chunk.endswith(b"\n"):
+            line += 1
+        if not exhausted:
+            break
+
+    data = b"".join(parts)
+    # 超长行被切成片段时，片段末尾可能落在多字节字符中间，截在完整字符处，剩余部分留给下一页
+    end = _utf8_boundary(data)
+    if end < len(data):
+        byte_offset -= len(data) - end
+        data = data[:end]
+        exhausted = False
+    content = data.decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+
+    last_line = line - 1 if content.endswith("\n") else line
+    next_cursor = None
+    if not exhausted or byte_offset < os.path.getsize(file_path):
+        next_cursor = _encode_cursor(file_path, byte_offset, line)
+
+    return FilePage(
+        file_path=file_path,
+        content=content,
+        start_line=first_line,
+        end_line=max(first_line, last_line),
+        next_cursor=next_cursor,
+    )
+
+
 if __name__ == "__main__":
     """
     命令行接口
     使用方法:
-    python code_reader.py <文件路径> <起始行号> [结束行号]
+    python -m tools.code_reader <文件路径> <起始行号> [结束行号]
 
     示例:
-    python code_reader.py main.py 1 10    # 读取第1-10行
-    python code_reader.py main.py 5       # 读取第5行
-    python code_reader.py main.py 1 -1    # 读取第1行到最后一行
+    python -m tools.code_reader main.py 1 10    # 读取第1-10行
+    python -m tools.code_reader main.py 5       # 读取第5行
+    python -m tools.code_reader main.py 1 -1    # 读取第1行到最后一行
     """
     import sys
     import argparse
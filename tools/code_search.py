@@ -0,0 +1,402 @@
+"""
+基于三元组（trigram）索引的代码搜索
+
+为工作区中的每个文本文件记录其包含的字节三元组（已按 ASCII 转为小写），
+持久化到 .agent/search/ 下（JSON 元数据加原始数组字节，加载时不会执行任何代码），
+并按 (st_mtime_ns, st_size) 增量更新。
+正则查询先从表达式中提取必须出现的字面量，只在包含全部对应三元组的候选文件中执行匹配。
+"""
+
+import fnmatch
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Executor, ProcessPoolExecutor
+from re import _constants as sre_constants
+from re import _parser as sre_parser
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tools.executor import process_context
+
+INDEX_VERSION = 2
+
+# 索引文件开头的标记
+INDEX_MAGIC = b"TRGM"
+
+# 不参与索引的目录
+SKIP_DIRS = {
+    ".git",
+    ".agent",
+    ".venv",
+    "venv",
+    "node_modules",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+    ".nox",
+}
+
+# 超过该大小的文件不建立索引，也不参与搜索
+MAX_FILE_SIZE = 2 * 1024 * 1024
+
+# 需要重新索引的文件数超过该值时才启用进程池
+PARALLEL_THRESHOLD = 64
+
+_REPEAT_OPS = (
+    sre_constants.MAX_REPEAT,
+    sre_constants.MIN_REPEAT,
+    sre_constants.POSSESSIVE_REPEAT,
+)
+
+# 文件条目: (st_mtime_ns, st_size, 排好序的三元组数组；二进制或超大文件为 None)
+_Entry = Tuple[int, int, Optional[array]]
+
+
+def _trigram_key(data: bytes, i: int) -> int:
+    return (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+
+
+def file_trigrams(file_path: str) -> Optional[array]:
+    """
+    计算文件包含的全部三元组
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        Optional[array]: 排好序的三元组编码；二进制、超大或无法读取的文件返回 None
+    """
+    try:
+        if os.path.getsize(file_path) > MAX_FILE_SIZE:
+            return None
+        with open(file_path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    if b"\0" in data[:8192]:
+        return None
+
+    data = data.lower()
+    keys = {_trigram_key(data, i) for i in range(len(data) - 2)}
+    return array("I", sorted(keys))
+
+
+def _literal_runs(parsed) -> List[str]:
+    """从解析后的正则中提取匹配时必然出现的字面量片段"""
+    runs: List[str] = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(av))
+            continue
+        if op is sre_constants.AT:
+            # 零宽断言不消耗字符，前后的字面量在文本中仍然相邻
+            continue
+
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            runs.extend(_literal_runs(av[3]))
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            runs.extend(_literal_runs(av[2]))
+        # 其他结构（分支、字符集、任意字符等）无法确定必然出现的字面量
+
+    flush()
+    return runs
+
+
+def query_trigrams(pattern: str, ignore_case: bool = False) -> List[int]:
+    """
+    计算正则表达式的必要三元组
+
+    Args:
+        pattern: 正则表达式
+        ignore_case: 是否忽略大小写
+
+    Returns:
+        List[int]: 候选文件必须包含的三元组编码；为空表示无法过滤
+    """
+    parsed = sre_parser.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        ignore_case = True
+
+    keys = set()
+    for run in _literal_runs(parsed):
+        # 索引只对 ASCII 做了小写转换，忽略大小写时非 ASCII 字符无法可靠过滤；
+        # i、k、s 在 Unicode 大小写折叠下还能匹配非 ASCII 字符（如 ſ、K），同样跳过
+        pieces = re.split(r"[^\x00-\x7f]+|[iksIKS]", run) if ignore_case else [run]
+        for piece in pieces:
+            data = piece.encode("utf-8").lower()
+            keys.update(_trigram_key(data, i) for i in range(len(data) - 2))
+    return sorted(keys)
+
+
+def _contains_all(trigrams: array, keys: List[int]) -> bool:
+    """判断排好序的三元组数组是否包含全部 keys"""
+    size = len(trigrams)
+    for key in keys:
+        pos = bisect_left(trigrams, key)
+        if pos == size or trigrams[pos] != key:
+            return False
+    return True
+
+
+class TrigramIndex:
+    """
+    工作区的三元组索引
+
+    Args:
+        root: 工作区根目录
+        index_path: 索引文件路径，默认在 <root>/.agent/search/ 下
+    """
+
+    def __init__(self, root: str, index_path: Optional[str] = None):
+        self.root = os.path.realpath(root)
+        self.index_path = index_path or os.path.join(
+            self.root, ".agent", "search", "trigrams.bin"
+        )
+        self._files: Dict[str, _Entry] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _header() -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "itemsize": array("I").itemsize,
+            "byteorder": sys.byteorder,
+        }
+
+    def _load(self):
+        """
+        从磁盘加载索引，格式不兼容或损坏时从头构建
+
+        文件格式：标记、JSON 元数据的长度与内容（版本、每个文件的路径、mtime、大小和
+        三元组个数），之后依次是各文件三元组数组的原始字节。
+        """
+        self._loaded = True
+        files: Dict[str, _Entry] = {}
+        try:
+            with open(self.index_path, "rb") as file:
+                if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return
+                (length,) = struct.unpack("<Q", file.read(8))
+                meta = json.loads(file.read(length))
+                if {key: meta.get(key) for key in self._header()} != self._header():
+                    return
+                for rel_path, mtime_ns, size, count in meta["files"]:
+                    trigrams = None
+                    if count >= 0:
+                        trigrams = array("I")
+                        trigrams.fromfile(file, count)
+                    files[str(rel_path)] = (int(mtime_ns), int(size), trigrams)
+        except (OSError, EOFError, ValueError, KeyError, TypeError, struct.error):
+            return
+        self._files = files
+
+    def _save(self):
+        """原子地写入索引文件"""
+        directory = os.path.dirname(self.index_path)
+        os.makedirs(directory, exist_ok=True)
+        meta = self._header()
+        meta["files"] = [
+            [rel_path, mtime_ns, size, -1 if trigrams is None else len(trigrams)]
+            for rel_path, (mtime_ns, size, trigrams) in self._files.items()
+        ]
+        data = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(INDEX_MAGIC + struct.pack("<Q", len(data)) + data)
+                for _, _, trigrams in self._files.values():
+                    if trigrams is not None:
+                        trigrams.tofile(file)
+            os.replace(temp_path, self.index_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """遍历工作区中的文件，返回 (相对路径, stat)"""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        rel_path = os.path.relpath(entry.path, self.root)
+                        yield rel_path, entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+    def refresh(self, executor: Optional[Executor] = None) -> int:
+        """
+        按修改时间增量更新索引
+
+        Args:
+            executor: 需要重新索引的文件较多时使用的进程池，默认临时创建一个
+
+        Returns:
+            int: 重新索引或删除的文件数
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            seen = set()
+            stale: List[Tuple[str, int, int]] = []
+            for rel_path, st in self._walk():
+                seen.add(rel_path)
+                entry = self._files.get(rel_path)
+                if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+                    stale.append((rel_path, st.st_mtime_ns, st.st_size))
+
+            removed = [rel_path for rel_path in self._files if rel_path not in seen]
+            for rel_path in removed:
+                del self._files[rel_path]
+
+            paths = [os.path.join(self.root, rel_path) for rel_path, _, _ in stale]
+            if len(paths) > PARALLEL_THRESHOLD and executor is not None:
+                results = list(executor.map(file_trigrams, paths, chunksize=32))
+            elif len(paths) > PARALLEL_THRESHOLD:
+                with ProcessPoolExecutor(mp_context=process_context()) as pool:
+                    results = list(pool.map(file_trigrams, paths, chunksize=32))
+            else:
+                results = [file_trigrams(path) for path in paths]
+
+            for (rel_path, mtime_ns, size), trigrams in zip(stale, results):
+                self._files[rel_path] = (mtime_ns, size, trigrams)
+
+            changed = len(stale) + len(removed)
+            if changed:
+                self._save()
+            return changed
+
+    def candidates(self, keys: List[int], glob: Optional[str] = None) -> List[str]:
+        """
+        返回包含全部三元组的候选文件（相对路径，已排序）
+
+        Args:
+            keys: 必要三元组
+            glob: 可选的文件路径通配符，如 "tools/*.py"
+        """
+        with self._lock:
+            items = list(self._files.items())
+
+        result = []
+        for rel_path, (_, _, trigrams) in items:
+            if trigrams is None:
+                continue
+            if glob is not None and not fnmatch.fnmatch(rel_path, glob):
+                continue
+            if _contains_all(trigrams, keys):
+                result.append(rel_path)
+        result.sort()
+        return result
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+_indexes: Dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str = ".") -> TrigramIndex:
+    """获取（并缓存）指定根目录的索引实例"""
+    key = os.path.realpath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = TrigramIndex(key)
+            _indexes[key] = index
+    return index
+
+
+def search_code(
+    pattern: str,
+    root: str = ".",
+    glob: Optional[str] = None,
+    ignore_case: bool = False,
+    max_results: int = 50,
+    max_line_chars: int = 200,
+    executor: Optional[Executor] = None,
+) -> str:
+    """
+    在工作区中按正则搜索代码
+
+    Args:
+        pattern: 正则表达式
+        root: 工作区根目录
+        glob: 可选的文件路径通配符，如 "tools/*.py"
+        ignore_case: 是否忽略大小写
+        max_results: 最多返回的匹配行数
+        max_line_chars: 每行最多返回的字符数
+        executor: 更新索引时使用的进程池，默认临时创建一个
+
+    Returns:
+        str: "路径:行号: 内容" 形式的匹配列表
+
+    Raises:
+        ValueError: 正则表达式无效
+    """
+    try:
+        regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式: {e}")
+
+    index = get_index(root)
+    index.refresh(executor)
+    candidates = index.candidates(query_trigrams(pattern, ignore_case), glob)
+
+    matches = []
+    truncated = False
+    for rel_path in candidates:
+        file_path = os.path.join(index.root, rel_path)
+        try:
+            with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+                for line_number, line in enumerate(file, 1):
+                    if not regex.search(line):
+                        continue
+                    if len(matches) >= max_results:
+                        truncated = True
+                        break
+                    line = line.rstrip("\r\n")
+                    if len(line) > max_line_chars:
+                        line = line[:max_line_chars] + "…"
+                    matches.append(f"{rel_path}:{line_number}: {line}")
+        except OSError:
+            continue
+        if truncated:
+            break
+
+    if not matches:
+        return f"未找到匹配（候选文件 {len(candidates)} / 共 {len(index)} 个文件）"
+
+    summary = (
+        f"[{len(matches)} 处匹配，候选文件 {len(candidates)} / 共 {len(index)} 个文件"
+    )
+    if truncated:
+        summary += f"，结果已截断为前 {max_results} 处"
+    return "\n".join(matches) + "\n" + summary + "]"
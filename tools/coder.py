@@ -1,6 +1,25 @@
+import asyncio
+from contextlib import aclosing
+from typing import Awaitable, Callable, List, Optional, Tuple
+
 from pydantic_ai import Agent
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart
 from models.qwen import model_qwen
 from prompts.prompt import get_coder_prompt
+from tools.code_patcher import (
+    Hunk,
+    HunkParser,
+    HunkResult,
+    PatchReport,
+    check_hunk,
+    iter_hunks,
+    merge_region_patches,
+    patch_file,
+)
+from tools.code_reader import read_file_lines
+from tools.coder_cache import coder_cache, make_key
+from tools.executor import tool_executor
+from tools.symbol_index import split_into_chunks
 
 
 agent = Agent(
@@ -9,12 +28,295 @@ agent = Agent(
 )
 
 
-async def modify(prompt: str, file_path: str, begin_line: int = 1) -> str:
-    prompt = f"这段代码是从文件{file_path}中低{begin_line}行开始读取的, 请帮我查看一下这段代买是否有错误, 如果有请修改, 并给出修改后的代码: {prompt}"
-    result = await agent.run(prompt)
-    return result.output
+class _StopStream(Exception):
+    """on_hunk 校验失败时抛出，用于中断 coder 的流式回复"""
+
+
+async def _stream(
+    prompt: str,
+    message_history: Optional[List[ModelMessage]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+    on_hunk: Optional[Callable[[Hunk], Awaitable[bool]]] = None,
+) -> Tuple[str, List[ModelMessage], bool]:
+    """
+    以流式方式运行 coder，边生成边解析 diff
+
+    Args:
+        prompt: 发给 coder 的内容
+        message_history: 之前的对话
+        on_delta: 收到每段增量文本时调用，用于实时显示
+        on_hunk: 每解析出一个完整的补丁块时等待的协程，返回 False 时立即停止生成
+
+    Returns:
+        Tuple[str, List[ModelMessage], bool]: 输出文本、包含本次回复的完整对话，
+            以及是否被 on_hunk 提前停止
+    """
+    parser = HunkParser()
+    chunks: List[str] = []
+    pending = ""
+    stopped = False
+
+    try:
+        async with agent.run_stream(prompt, message_history=message_history) as result:
+            # 增量不做合并，逐块校验可以尽早拿到每一行；提前停止时立即关闭增量流，
+            # 不留给事件循环结束时的清理（那时 pydantic-ai 内部的生成器会报错）
+            deltas = result.stream_text(delta=True, debounce_by=None)
+            async with aclosing(deltas):
+                async for delta in deltas:
+                    chunks.append(delta)
+                    if on_delta is not None:
+                        on_delta(delta)
+                    if on_hunk is None:
+                        continue
+                    # 只把完整的行交给解析器
+                    *lines, pending = (pending + delta).split("\n")
+                    hunks = [hunk for line in lines for hunk in parser.feed(line)]
+                    if not await _check_all(on_hunk, hunks):
+                        stopped = True
+                        messages = result.all_messages()
+                        # 正常退出时 pydantic-ai 会读完剩余的回复，以异常退出才会
+                        # 真正中断生成
+                        raise _StopStream
+            messages = result.all_messages()
+    except _StopStream:
+        pass
+
+    if on_hunk is not None and not stopped:
+        hunks = parser.feed(pending) + parser.close()
+        stopped = not await _check_all(on_hunk, hunks)
+
+    output = "".join(chunks)
+    # 增量读取文本时，对话中不一定包含本次回复，补上以便继续对话
+    if not messages or not isinstance(messages[-1], ModelResponse):
+        messages = messages + [ModelResponse(parts=[TextPart(content=output)])]
+    return output, messages, stopped
+
+
+async def _check_all(
+    on_hunk: Callable[[Hunk], Awaitable[bool]], hunks: List[Hunk]
+) -> bool:
+    """依次校验补丁块，遇到第一个失败的块即停止"""
+    for hunk in hunks:
+        if not await on_hunk(hunk):
+            return False
+    return True
+
+
+def _modify_prompt(prompt: str, file_path: str, begin_line: int) -> str:
+    return f"这段代码是从文件{file_path}中低{begin_line}行开始读取的, 请帮我查看一下这段代买是否有错误, 如果有请修改, 并给出修改后的代码: {prompt}"
+
+
+def _cache_key(prompt: str, code: str = "") -> str:
+    """coder 结果的缓存键，模型或系统提示词变化后旧结果自动失效"""
+    model_name = getattr(agent.model, "model_name", str(agent.model))
+    return make_key(model_name, get_coder_prompt(), prompt, code)
+
+
+def _modify_cache_key(
+    operation: str, prompt: str, file_path: str, begin_line: int
+) -> str:
+    """
+    modify 与 modify_and_apply 的缓存键
+
+    两者的请求相同，但缓存的内容不同（前者是检查结果，后者是成功应用过的 diff），
+    按操作区分，避免检查结果被当作 diff 写入文件。
+    """
+    return _cache_key(f"{operation} {file_path}:{begin_line}", prompt)
+
+
+async def modify(
+    prompt: str,
+    file_path: str,
+    begin_line: int = 1,
+    on_delta: Optional[Callable[[str], None]] = None,
+    use_cache: bool = True,
+) -> str:
+    key = _modify_cache_key("modify", prompt, file_path, begin_line)
+    if use_cache:
+        cached = await tool_executor.run_io(coder_cache.get, key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+    output, _, _ = await _stream(
+        _modify_prompt(prompt, file_path, begin_line), on_delta=on_delta
+    )
+    await tool_executor.run_io(coder_cache.put, key, output)
+    return output
+
+
+async def modify_file(
+    file_path: str,
+    max_chunk_lines: int = 300,
+    concurrency: int = 4,
+    use_cache: bool = True,
+) -> str:
+    """
+    分段并行检查整个文件，并把各段的修改合并为一个 diff
+
+    文件按顶层定义切分为不超过 max_chunk_lines 行的段，各段同时交给 coder 检查
+    （最多 concurrency 个请求并发），耗时取决于最慢的一段而不是所有段之和。
+    各段 diff 的行号会被换算为整个文件的行号。
+
+    Args:
+        file_path: 需要检查的文件
+        max_chunk_lines: 每段的最大行数
+        concurrency: 同时进行的 coder 请求数
+        use_cache: 是否使用各段上次的检查结果
+
+    Returns:
+        str: 整个文件的 diff -u 格式修改；无需修改时返回说明
+    """
+    chunks = await tool_executor.run_io(split_into_chunks, file_path, max_chunk_lines)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def review(start_line: int, end_line: int) -> str:
+        code = await tool_executor.run_io(
+            read_file_lines, file_path, start_line, end_line
+        )
+        async with semaphore:
+            return await modify(code, file_path, start_line, use_cache=use_cache)
+
+    outputs = await asyncio.gather(*(review(start, end) for start, end in chunks))
+    regions = [(start, end, output) for (start, end), output in zip(chunks, outputs)]
+    patch, errors = await tool_executor.run_io(
+        merge_region_patches, file_path, regions
+    )
+
+    notes = [f"{error}（该段的修改无法应用，已跳过）" for error in errors]
+    if not patch:
+        return "\n".join(notes + [f"{file_path} 共 {len(chunks)} 段，均无需修改"])
+    return "\n".join([patch] + notes)
+
+
+def _summarize(report: PatchReport, diff: str) -> str:
+    """生成返回给主 agent 的简短修改摘要"""
+    added = removed = 0
+    for hunk in iter_hunks(diff):
+        added += sum(change[:1] == "+" for change in hunk.changes)
+        removed += sum(change[:1] == "-" for change in hunk.changes)
+    lines = [
+        f"已修改 {report.file_path}: {len(report.hunks)} 处修改, "
+        f"+{added} -{removed} 行（可用 undo_code_patch 撤销）"
+    ]
+    # 只列出位置有偏移或使用了模糊匹配的块，正常的块不再逐一说明
+    lines.extend(
+        hunk.describe() for hunk in report.hunks if hunk.offset or hunk.fuzz
+    )
+    return "\n".join(lines)
+
+
+async def _try_apply(diff: str, file_path: str) -> Tuple[Optional[str], str]:
+    """
+    dry run 校验通过后应用 diff
+
+    Returns:
+        Tuple[Optional[str], str]: 成功时为 (修改摘要, "")，否则为 (None, 失败原因)
+    """
+    report = await tool_executor.run_io(patch_file, diff, file_path, dry_run=True)
+    if report.ok:
+        report = await tool_executor.run_io(patch_file, diff, file_path)
+        if report.applied:
+            return _summarize(report, diff), ""
+    return None, report.render()
+
+
+async def modify_and_apply(
+    prompt: str,
+    file_path: str,
+    begin_line: int = 1,
+    max_attempts: int = 3,
+    on_delta: Optional[Callable[[str], None]] = None,
+    use_cache: bool = True,
+) -> str:
+    """
+    让 coder 修改代码，校验其给出的 diff 后直接应用到文件
+
+    coder 的输出以流式读取，每个补丁块一生成完就对照文件校验，发现无法应用的块时
+    立即停止生成，把失败原因反馈给 coder 重新生成；完整的 diff 再整体 dry run 校验后
+    应用，最多尝试 max_attempts 次。diff 本身不会返回给调用方，只返回简短的摘要。
+
+    Args:
+        prompt: 需要检查的代码
+        file_path: 代码所在文件
+        begin_line: 代码在文件中的起始行号
+        max_attempts: coder 最多生成 diff 的次数
+        on_delta: 收到 coder 的每段增量输出时调用，用于实时显示
+        use_cache: 是否先尝试同一段代码上次成功应用的结果
+
+    Returns:
+        str: 修改摘要，或无需修改/修改失败的说明
+    """
+    key = _modify_cache_key("apply", prompt, file_path, begin_line)
+    cached = await tool_executor.run_io(coder_cache.get, key) if use_cache else None
+    if cached is not None:
+        if next(iter_hunks(cached), None) is None:
+            return f"coder 认为无需修改 {file_path}:\n{cached[:500]}"
+        summary, _ = await _try_apply(cached, file_path)
+        if summary is not None:
+            return summary
+
+    checked: List[HunkResult] = []
+
+    async def validate(hunk: Hunk) -> bool:
+        # 校验要读文件并在整个文件中定位，放到线程池中，不阻塞正在进行的流式读取
+        number = len(checked) + 1
+        try:
+            result = await tool_executor.run_io(
+                check_hunk, file_path, hunk, number=number
+            )
+        except (OSError, UnicodeDecodeError) as e:
+            result = HunkResult(number, hunk.old_start, error=f"无法读取文件: {e}")
+        checked.append(result)
+        return result.error is None
+
+    request = _modify_prompt(prompt, file_path, begin_line)
+    messages: Optional[List[ModelMessage]] = None
+    feedback = ""
+    for attempt in range(1, max_attempts + 1):
+        checked.clear()
+        diff, messages, stopped = await _stream(
+            request, messages, on_delta=on_delta, on_hunk=validate
+        )
+
+        if stopped:
+            feedback = checked[-1].describe()
+        else:
+            if next(iter_hunks(diff), None) is None:
+                await tool_executor.run_io(coder_cache.put, key, diff)
+                return f"coder 认为无需修改 {file_path}:\n{diff[:500]}"
+            summary, feedback = await _try_apply(diff, file_path)
+            if summary is not None:
+                await tool_executor.run_io(coder_cache.put, key, diff)
+                return summary
+
+        if attempt < max_attempts:
+            request = (
+                "上面的 diff 无法应用到当前文件:\n"
+                f"{feedback}\n"
+                "请对照文件的实际内容修正上下文行和行号，重新给出完整的 diff -u 格式修改"
+            )
+
+    return (
+        f"coder 尝试 {max_attempts} 次后仍未给出可应用的修改，{file_path} 保持不变:\n"
+        f"{feedback}"
+    )
+
 
+async def generate(
+    prompt: str,
+    on_delta: Optional[Callable[[str], None]] = None,
+    use_cache: bool = True,
+) -> str:
+    key = _cache_key(prompt)
+    if use_cache:
+        cached = await tool_executor.run_io(coder_cache.get, key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
 
-async def generate(prompt: str) -> str:
-    result = await agent.run(prompt)
-    return result.output
+    output, _, _ = await _stream(prompt, on_delta=on_delta)
+    await tool_executor.run_io(coder_cache.put, key, output)
+    return output
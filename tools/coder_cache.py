@@ -0,0 +1,182 @@
+"""
+coder 结果的磁盘缓存
+
+同一段未修改的代码重复检查、或者同一个生成需求重复提问时，直接返回上次的结果，
+不再调用模型。缓存键由 (模型名, 系统提示词哈希, 规范化后的提示, 代码哈希) 组成，
+条目保存在 <root>/.agent/coder_cache/ 下，超过有效期的条目视为未命中，
+总大小超出上限时淘汰最久未使用的条目。
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+# 缓存条目的默认有效期（秒）
+DEFAULT_TTL = 7 * 24 * 3600
+
+# 缓存目录的默认大小上限
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示：去掉首尾空白并把连续空白合并为一个空格"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def make_key(model_name: str, system_prompt: str, prompt: str, code: str = "") -> str:
+    """
+    计算缓存键
+
+    Args:
+        model_name: 模型名
+        system_prompt: coder 的系统提示词
+        prompt: 提示（会先规范化）
+        code: 提示中附带的代码，按原样（仅统一换行符）计算哈希
+
+    Returns:
+        str: 十六进制的缓存键
+    """
+    code = code.replace("\r\n", "\n")
+    parts = [
+        model_name,
+        _sha256(system_prompt),
+        normalize_prompt(prompt),
+        _sha256(code),
+    ]
+    return _sha256(json.dumps(parts, ensure_ascii=False))
+
+
+class CoderCache:
+    """
+    coder 结果的磁盘缓存
+
+    Args:
+        directory: 缓存目录，默认 <当前目录>/.agent/coder_cache
+        ttl: 条目有效期（秒）
+        max_bytes: 缓存目录的大小上限
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.directory = directory or os.path.join(
+            os.path.realpath("."), ".agent", "coder_cache"
+        )
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的结果
+
+        Returns:
+            Optional[str]: 缓存的输出，未命中或已过期时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if time.time() - entry["created"] > self.ttl:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+                self.expired += 1
+            return None
+
+        # 更新访问时间，淘汰时按最近使用排序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["output"]
+
+    def put(self, key: str, output: str):
+        """写入结果，必要时淘汰最久未使用的条目"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"created": time.time(), "output": output}, file)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def clear(self):
+        """删除所有缓存条目"""
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.unlink(entry.path)
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中、未命中、过期与淘汰次数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+# coder 共享的结果缓存
+coder_cache = CoderCache()
@@ -0,0 +1,484 @@
+"""
+Line diff engine used to build unified diffs.
+
+Three algorithms are available:
+
+- "myers": minimal edit script using the linear-space Myers algorithm
+  (middle-snake divide and conquer). Lines that occur on only one side are
+  discarded first, and the total work is capped so pathological inputs
+  degrade gracefully instead of going quadratic.
+- "patience": anchors on lines that are unique in both sides and in the same
+  order, then diffs the gaps; tends to produce more readable hunks for code.
+- "histogram": like patience, but anchors on the lowest-occurrence common
+  lines, so it still finds good anchors when no line is unique.
+
+Lines are interned to integers first and the common prefix/suffix are
+trimmed before any algorithm runs.
+"""
+
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+ALGORITHMS = ("myers", "patience", "histogram")
+
+# Edit cost after which Myers gives up on minimality for a region
+MYERS_MIN_COST = 256
+
+# Total Myers work (diagonals visited plus snake steps) allowed per diff;
+# regions left once it is spent are reported as replaced
+MYERS_MAX_WORK = 500_000
+
+# Lines occurring more often than this are never used as histogram anchors
+HISTOGRAM_MAX_CHAIN = 64
+
+# (tag, i1, i2, j1, j2) with the same meaning as difflib opcodes
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _intern(old_lines: Sequence[str], new_lines: Sequence[str]):
+    """Map every distinct line to a small integer so comparisons are cheap."""
+    ids: Dict[str, int] = {}
+    a = [ids.setdefault(line, len(ids)) for line in old_lines]
+    b = [ids.setdefault(line, len(ids)) for line in new_lines]
+    return a, b
+
+
+def _trim(a, b, alo, ahi, blo, bhi, matches):
+    """Record the common prefix and suffix of a region and return what is left."""
+    start = alo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start:
+        matches.append((start, blo - (alo - start), alo - start))
+
+    end = ahi
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if ahi < end:
+        matches.append((ahi, bhi, end - ahi))
+
+    return alo, ahi, blo, bhi
+
+
+class _WorkBudget:
+    """Work left for the Myers engine, shared by every region of one diff."""
+
+    __slots__ = ("remaining",)
+
+    def __init__(self, work: int = MYERS_MAX_WORK):
+        self.remaining = work
+
+
+def _middle_snake(a, b, alo, ahi, blo, bhi, max_cost, budget):
+    """
+    Find the middle snake of the optimal path through a[alo:ahi] / b[blo:bhi].
+
+    Returns (x, y, u, v): the snake runs diagonally from (x, y) to (u, v) in
+    absolute indexes. If the edit distance exceeds max_cost or the budget
+    runs out, the furthest reaching forward point found so far is returned
+    as an empty snake.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta & 1
+    limit = (n + m + 1) // 2
+    offset = limit + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range(limit + 1):
+        work = 2 * (d + 1)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (
+                k != d and forward[offset + k - 1] < forward[offset + k + 1]
+            ):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            work += x - x0
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1:
+                if x + backward[offset + delta - k] >= n:
+                    return alo + x0, blo + y0, alo + x, blo + y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (
+                k != d and backward[offset + k - 1] < backward[offset + k + 1]
+            ):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            work += x - x0
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d:
+                if x + forward[offset + delta - k] >= n:
+                    return ahi - x, bhi - y, ahi - x0, bhi - y0
+
+        budget.remaining -= work
+        if d >= max_cost or budget.remaining <= 0:
+            # Too expensive: split at the furthest reaching forward point
+            best_k = max(
+                range(-d, d + 1, 2),
+                key=lambda k: (2 * min(forward[offset + k], n) - k, -abs(k)),
+            )
+            x = min(forward[offset + best_k], n)
+            y = min(max(x - best_k, 0), m)
+            return alo + x, blo + y, alo + x, blo + y
+
+    raise AssertionError("middle snake not found")
+
+
+def _myers(a, b, alo, ahi, blo, bhi, matches, budget):
+    """
+    Append the matching runs of a linear-space Myers diff to matches.
+
+    Lines that do not occur on the other side can never match, so they are
+    discarded before the search (this does not change the result) and the
+    matches found are mapped back to the original indexes. A region with no
+    line in common is left as a single replacement.
+    """
+    in_b = set(b[blo:bhi])
+    kept_a = [i for i in range(alo, ahi) if a[i] in in_b]
+    if not kept_a:
+        return
+    in_a = set(a[alo:ahi])
+    kept_b = [j for j in range(blo, bhi) if b[j] in in_a]
+    if len(kept_a) == ahi - alo and len(kept_b) == bhi - blo:
+        _myers_region(a, b, alo, ahi, blo, bhi, matches, budget)
+        return
+
+    reduced: List[Tuple[int, int, int]] = []
+    _myers_region(
+        [a[i] for i in kept_a],
+        [b[j] for j in kept_b],
+        0,
+        len(kept_a),
+        0,
+        len(kept_b),
+        reduced,
+        budget,
+    )
+    for x, y, length in reduced:
+        # A run in the reduced sequences is split wherever a discarded line
+        # sits between two of its lines
+        start = 0
+        for t in range(1, length + 1):
+            if t == length or (
+                kept_a[x + t] != kept_a[x + t - 1] + 1
+                or kept_b[y + t] != kept_b[y + t - 1] + 1
+            ):
+                matches.append((kept_a[x + start], kept_b[y + start], t - start))
+                start = t
+
+
+def _myers_region(a, b, alo, ahi, blo, bhi, matches, budget):
+    """Myers divide and conquer over a region, within the work budget."""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, alo, ahi, blo, bhi, matches)
+        if alo == ahi or blo == bhi or budget.remaining <= 0:
+            continue
+
+        size = (ahi - alo) + (bhi - blo)
+        max_cost = max(MYERS_MIN_COST, int(size**0.5))
+        x, y, u, v = _middle_snake(a, b, alo, ahi, blo, bhi, max_cost, budget)
+        if u > x:
+            matches.append((x, y, u - x))
+
+        # Both halves are strictly smaller than the region, so this terminates
+        if 0 < (x - alo) + (y - blo) < size:
+            stack.append((alo, x, blo, y))
+        if 0 < (ahi - u) + (bhi - v) < size:
+            stack.append((u, ahi, v, bhi))
+
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest chain of pairs increasing in the second element (patience sort)."""
+    tails: List[int] = []  # Index into pairs of the smallest tail per length
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pairs[tails[mid]][1] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            previous[index] = tails[lo - 1]
+        if lo == len(tails):
+            tails.append(index)
+        else:
+            tails[lo] = index
+
+    chain = []
+    index = tails[-1] if tails else -1
+    while index != -1:
+        chain.append(pairs[index])
+        index = previous[index]
+    chain.reverse()
+    return chain
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi) -> List[Tuple[int, int]]:
+    """
+    Pairs (i, j) of lines that occur exactly once in both a[alo:ahi] and
+    b[blo:bhi], reduced to the longest chain that is in order on both sides.
+    """
+    in_a: Dict[int, int] = {}
+    for i in range(alo, ahi):
+        in_a[a[i]] = -1 if a[i] in in_a else i
+    in_b: Dict[int, int] = {}
+    for j in range(blo, bhi):
+        if in_a.get(b[j], -1) >= 0:
+            in_b[b[j]] = -1 if b[j] in in_b else j
+    pairs = sorted((in_a[line], j) for line, j in in_b.items() if j >= 0)
+    return _longest_increasing(pairs)
+
+
+def _split_on_anchors(anchors, alo, ahi, blo, bhi, stack, matches):
+    """Record anchor matches and queue the gaps between them."""
+    prev_a, prev_b = alo, blo
+    for i, j in anchors:
+        stack.append((prev_a, i, prev_b, j))
+        matches.append((i, j, 1))
+        prev_a, prev_b = i + 1, j + 1
+    stack.append((prev_a, ahi, prev_b, bhi))
+
+
+def _patience(a, b, alo, ahi, blo, bhi, matches, budget):
+    """Append the matching runs of a patience diff to matches."""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, alo, ahi, blo, bhi, matches)
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            _split_on_anchors(anchors, alo, ahi, blo, bhi, stack, matches)
+        else:
+            _myers(a, b, alo, ahi, blo, bhi, matches, budget)
+
+
+def _histogram(a, b, alo, ahi, blo, bhi, matches, budget):
+    """
+    Append the matching runs of a histogram diff to matches.
+
+    Lines occurring once on both sides are the rarest possible anchors, so a
+    region that has them is split on all of them at once, as patience does.
+    Otherwise the common run with the lowest occurrence count (longest on
+    ties) becomes the anchor.
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, alo, ahi, blo, bhi, matches)
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            _split_on_anchors(anchors, alo, ahi, blo, bhi, stack, matches)
+            continue
+
+        occurrences: Dict[int, List[int]] = {}
+        for i in range(alo, ahi):
+            occurrences.setdefault(a[i], []).append(i)
+
+        # (lowest occurrence count in the run, -run length, a start, b start)
+        best = None
+        j = blo
+        while j < bhi:
+            positions = occurrences.get(b[j])
+            if not positions or len(positions) > HISTOGRAM_MAX_CHAIN:
+                j += 1
+                continue
+
+            next_j = j + 1
+            for i in positions:
+                start_a, start_b = i, j
+                rarity = len(positions)
+                while (
+                    start_a > alo
+                    and start_b > blo
+                    and a[start_a - 1] == b[start_b - 1]
+                ):
+                    start_a -= 1
+                    start_b -= 1
+                    rarity = min(rarity, len(occurrences[a[start_a]]))
+                end_a, end_b = i + 1, j + 1
+                while end_a < ahi and end_b < bhi and a[end_a] == b[end_b]:
+                    rarity = min(rarity, len(occurrences[a[end_a]]))
+                    end_a += 1
+                    end_b += 1
+
+                candidate = (rarity, start_a - end_a, start_a, start_b)
+                if best is None or candidate < best:
+                    best = candidate
+                next_j = max(next_j, end_b)
+            j = next_j
+
+        if best is None:
+            _myers(a, b, alo, ahi, blo, bhi, matches, budget)
+            continue
+
+        _, negative_length, start_a, start_b = best
+        length = -negative_length
+        matches.append((start_a, start_b, length))
+        stack.append((alo, start_a, blo, start_b))
+        stack.append((start_a + length, ahi, start_b + length, bhi))
+
+
+def diff_opcodes(
+    old_lines: Sequence[str], new_lines: Sequence[str], algorithm: str = "myers"
+) -> List[Opcode]:
+    """
+    Compute the edit script between two line sequences.
+
+    Args:
+        old_lines: Original lines
+        new_lines: Modified lines
+        algorithm: One of "myers", "patience" or "histogram"
+
+    Returns:
+        List of (tag, i1, i2, j1, j2) opcodes covering both sequences, with
+        tags "equal", "replace", "delete" and "insert" as in difflib
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown diff algorithm: {algorithm}")
+
+    a, b = _intern(old_lines, new_lines)
+    matches: List[Tuple[int, int, int]] = []
+    alo, ahi, blo, bhi = _trim(a, b, 0, len(a), 0, len(b), matches)
+    if alo < ahi and blo < bhi:
+        engine = {"myers": _myers, "patience": _patience, "histogram": _histogram}
+        engine[algorithm](a, b, alo, ahi, blo, bhi, matches, _WorkBudget())
+
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for match_a, match_b, length in sorted(matches):
+        if length == 0:
+            continue
+        if i < match_a and j < match_b:
+            opcodes.append(("replace", i, match_a, j, match_b))
+        elif i < match_a:
+            opcodes.append(("delete", i, match_a, j, j))
+        elif j < match_b:
+            opcodes.append(("insert", i, i, j, match_b))
+        end_a, end_b = match_a + length, match_b + length
+        if opcodes and opcodes[-1][0] == "equal":
+            _, match_a, _, match_b, _ = opcodes.pop()
+        opcodes.append(("equal", match_a, end_a, match_b, end_b))
+        i, j = end_a, end_b
+
+    if i < len(a) and j < len(b):
+        opcodes.append(("replace", i, len(a), j, len(b)))
+    elif i < len(a):
+        opcodes.append(("delete", i, len(a), j, j))
+    elif j < len(b):
+        opcodes.append(("insert", i, i, j, len(b)))
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], context: int = 3) -> Iterator[List[Opcode]]:
+    """
+    Split opcodes into hunks with at most `context` lines of context around
+    each change (the same grouping difflib uses for unified diffs).
+    """
+    codes = list(opcodes)
+    if not codes:
+        return
+    if codes[0][0] == "equal":
+        _, i1, i2, j1, j2 = codes[0]
+        codes[0] = ("equal", max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        _, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = ("equal", i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        # A long run of equal lines ends one hunk and starts the next
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    """Format a hunk range the way unified diff expects it."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(
+    old_lines: Sequence[str],
+    new_lines: Sequence[str],
+    old_file: str,
+    new_file: str,
+    context: int = 3,
+    algorithm: str = "myers",
+) -> str:
+    """
+    Generate a unified diff with minimal hunks.
+
+    Args:
+        old_lines: Original file lines (with line endings)
+        new_lines: Modified file lines (with line endings)
+        old_file: Original file path for the --- header
+        new_file: Modified file path for the +++ header
+        context: Number of context lines around each change
+        algorithm: One of "myers", "patience" or "histogram"
+
+    Returns:
+        Unified diff string
+    """
+    diff_lines = [f"--- {old_file}", f"+++ {new_file}"]
+
+    def emit(prefix: str, line: str):
+        diff_lines.append(prefix + line.rstrip("\r\n"))
+        if not line.endswith("\n"):
+            diff_lines.append("\\ No newline at end of file")
+
+    opcodes = diff_opcodes(old_lines, new_lines, algorithm)
+    for group in group_opcodes(opcodes, context):
+        first, last = group[0], group[-1]
+        old_range = _format_range(first[1], last[2])
+        new_range = _format_range(first[3], last[4])
+        diff_lines.append(f"@@ -{old_range} +{new_range} @@")
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in old_lines[i1:i2]:
+                    emit(" ", line)
+                continue
+            for line in old_lines[i1:i2]:
+                emit("-", line)
+            for line in new_lines[j1:j2]:
+                emit("+", line)
+
+    return "\n".join(diff_lines)
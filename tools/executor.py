@@ -0,0 +1,124 @@
+"""
+工具执行层
+
+agent 会把同一次回复中的多个工具调用作为并发任务执行，但工具中同步的文件 I/O 和计算
+会阻塞事件循环，使流式输出和其他工具调用都停下来。这里提供：
+- 有上限的线程池，执行同步的 I/O 操作；
+- 按需创建的进程池，执行无副作用的 CPU 密集型计算（子进程由 forkserver 启动，
+  不继承本进程中其他线程持有的锁）；
+- 按文件路径加锁，同一文件上的修改按调用顺序依次执行，不同文件互不影响。
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# I/O 线程池的默认大小
+DEFAULT_MAX_THREADS = 8
+
+
+def process_context():
+    """
+    创建计算进程使用的 multiprocessing 上下文
+
+    本进程中有 I/O 线程池和日志等后台线程，直接 fork 时子进程会继承某个线程当时持有的锁
+    （如文件缓存的锁）并永远等待下去，所以改用 forkserver（不支持时用 spawn）。
+    """
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class ToolExecutor:
+    """
+    工具的执行器
+
+    Args:
+        max_threads: I/O 线程池的最大线程数
+        max_processes: 计算进程池的最大进程数，默认为 CPU 核数
+    """
+
+    def __init__(
+        self,
+        max_threads: int = DEFAULT_MAX_THREADS,
+        max_processes: Optional[int] = None,
+    ):
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._path_locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.max_threads, thread_name_prefix="tool-io"
+            )
+        return self._threads
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        """计算进程池，第一次使用时创建，之后复用"""
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.max_processes, mp_context=process_context()
+            )
+        return self._processes
+
+    async def run_io(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """在 I/O 线程池中执行同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.thread_pool, partial(func, *args, **kwargs)
+        )
+
+    async def run_cpu(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        在进程池中执行 CPU 密集型函数
+
+        函数及其参数、返回值都需要能被 pickle，并且不能依赖或修改本进程中的状态
+        （如文件缓存），否则应使用 run_io。
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.process_pool, partial(func, *args, **kwargs)
+        )
+
+    @asynccontextmanager
+    async def lock_paths(self, *paths: str) -> AsyncIterator[None]:
+        """
+        锁定若干文件路径，期间其他对这些路径的加锁调用会等待
+
+        多个路径按固定顺序加锁，避免两个调用交叉持有对方需要的锁。
+        """
+        keys = sorted({os.path.realpath(path) for path in paths})
+        locks = [self._path_locks.setdefault(key, asyncio.Lock()) for key in keys]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def shutdown(self):
+        """关闭线程池和进程池"""
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+
+# server 中所有工具共享的执行器
+tool_executor = ToolExecutor()
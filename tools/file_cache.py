@@ -0,0 +1,207 @@
+"""
+进程级文件缓存
+
+代码工具（read_code_file / apply_code_patch 等）在一次会话中会反复读取同一批文件。
+这里用一个按容量淘汰的 LRU 缓存保存文件内容与行偏移索引，
+并以 (st_mtime_ns, st_size, st_ino) 校验缓存是否仍与磁盘上的文件一致。
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from tools.line_index import LineIndex, file_signature
+
+
+class _CacheEntry:
+    """单个文件的缓存条目"""
+
+    __slots__ = ("signature", "text", "index")
+
+    def __init__(self, signature: Tuple[int, int, int]):
+        self.signature = signature
+        self.text: Optional[str] = None
+        self.index: Optional[LineIndex] = None
+
+    @property
+    def nbytes(self) -> int:
+        """条目占用的近似字节数"""
+        size = 0
+        if self.text is not None:
+            size += self.signature[1]
+        if self.index is not None:
+            size += self.index.nbytes
+        return size
+
+
+class FileCache:
+    """
+    线程安全的文件内容 / 行索引 LRU 缓存
+
+    Args:
+        max_bytes: 缓存内容的总容量上限（字节）
+        max_entries: 缓存文件数上限
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 512):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.realpath(file_path)
+
+    def _lookup(self, key: str) -> Optional[_CacheEntry]:
+        """查找并校验缓存条目，文件已变化时丢弃旧条目（需持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        try:
+            signature = file_signature(os.stat(key))
+        except OSError:
+            signature = None
+
+        if entry.signature != signature:
+            self._discard(key)
+            self.invalidations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: _CacheEntry):
+        """写入条目并按 LRU 顺序淘汰超出容量的条目（需持有锁）"""
+        self._discard(key)
+        self._entries[key] = entry
+        self._total_bytes += entry.nbytes
+
+        while len(self._entries) > 1 and (
+            self._total_bytes > self.max_bytes
+            or len(self._entries) > self.max_entries
+        ):
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _update(
+        self,
+        key: str,
+        signature: Tuple[int, int, int],
+        text: Optional[str] = None,
+        index: Optional[LineIndex] = None,
+    ):
+        """合并新读取的内容与同一版本的已有条目（需持有锁）"""
+        old = self._lookup(key)
+        entry = _CacheEntry(signature)
+        if old is not None and old.signature == signature:
+            entry.text = old.text
+            entry.index = old.index
+        if text is not None:
+            entry.text = text
+        if index is not None:
+            entry.index = index
+        self._store(key, entry)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+    def get_line_index(self, file_path: str) -> LineIndex:
+        """
+        获取文件的行偏移索引
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            LineIndex: 与文件当前版本一致的行索引
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry.index is not None:
+                self.hits += 1
+                return entry.index
+            self.misses += 1
+
+        index = LineIndex.build(key)
+
+        with self._lock:
+            self._update(key, index.signature, index=index)
+        return index
+
+    def read_text(self, file_path: str) -> str:
+        """
+        获取文件的全部文本内容（UTF-8，文本模式换行符）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            str: 文件内容
+        """
+        key = self._key(file_path)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry.text is not None:
+                self.hits += 1
+                return entry.text
+            self.misses += 1
+
+        with open(key, "r", encoding="utf-8") as file:
+            signature = file_signature(os.fstat(file.fileno()))
+            text = file.read()
+
+        with self._lock:
+            self._update(key, signature, text=text)
+        return text
+
+    def read_lines(self, file_path: str) -> List[str]:
+        """
+        获取文件的行列表，结果与 file.readlines() 一致
+
+        返回的是新列表，调用方可以自由修改。
+        """
+        return io.StringIO(self.read_text(file_path)).readlines()
+
+    def invalidate(self, file_path: str):
+        """文件被写入后主动使缓存失效"""
+        key = self._key(file_path)
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中 / 未命中 / 淘汰等计数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+# 所有代码工具共享的缓存实例
+file_cache = FileCache()
@@ -0,0 +1,82 @@
+import mmap
+import os
+from array import array
+from itertools import accumulate
+from typing import Optional, Tuple
+
+
+def file_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    """用 (修改时间, 大小, inode) 标识文件的一个版本"""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class LineIndex:
+    """
+    文件的行偏移索引
+
+    offsets[i] 是第 i 行（从0开始）在文件中的起始字节偏移，
+    最后一个元素等于文件大小，因此总行数为 len(offsets) - 1。
+    索引只构建一次，之后的区间读取通过 mmap 只解码所需的字节。
+    """
+
+    __slots__ = ("file_path", "signature", "offsets")
+
+    def __init__(
+        self, file_path: str, signature: Tuple[int, int, int], offsets: array
+    ):
+        self.file_path = file_path
+        self.signature = signature
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, file_path: str) -> "LineIndex":
+        """以二进制方式流式扫描文件，构建行偏移索引"""
+        with open(file_path, "rb") as file:
+            signature = file_signature(os.fstat(file.fileno()))
+            offsets = array("Q", accumulate(map(len, file), initial=0))
+        return cls(file_path, signature, offsets)
+
+    @property
+    def line_count(self) -> int:
+        """文件总行数"""
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """索引本身占用的字节数"""
+        return self.offsets.itemsize * len(self.offsets)
+
+    def byte_range(self, start_idx: int, end_idx: Optional[int]) -> Tuple[int, int]:
+        """
+        将行区间（0基索引，语义同列表切片）转换为字节区间
+
+        Returns:
+            Tuple[int, int]: [起始字节, 结束字节)
+        """
+        lines = range(self.line_count)[start_idx:end_idx]
+        if lines.stop <= lines.start:
+            return 0, 0
+        return self.offsets[lines.start], self.offsets[lines.stop]
+
+    def read(self, start_idx: int, end_idx: Optional[int] = None) -> str:
+        """
+        读取指定行区间的内容，只解码该区间对应的字节
+
+        Args:
+            start_idx (int): 起始行索引（从0开始）
+            end_idx (int, optional): 结束行索引（不包含），None表示到文件末尾
+
+        Returns:
+            str: 区间内的文本（换行符统一为 \n，与文本模式读取一致）
+        """
+        begin, end = self.byte_range(start_idx, end_idx)
+        if end <= begin:
+            return ""
+
+        with open(self.file_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                text = mapped[begin:end].decode("utf-8")
+
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
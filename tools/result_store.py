@@ -0,0 +1,206 @@
+"""
+大工具返回的截断与落盘
+
+工具返回（如读取整个大文件）超过 token 预算时，只把开头和结尾交给模型，
+完整内容按 SHA-256 保存到 <root>/.agent/results/ 下，模型可以按编号分段读取其余部分；
+终端中也只显示开头和结尾的预览。
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from session.history import estimate_tokens
+
+# 交给模型的单个工具返回的默认 token 上限
+DEFAULT_RESULT_TOKENS = 8000
+
+# 终端预览的默认字符数上限
+PREVIEW_CHARS = 2000
+
+# 分段读取时每次返回的默认字符数
+READ_CHARS = 16000
+
+# 结果编号：内容 SHA-256 的前 16 位
+_RESULT_ID = re.compile(r"[0-9a-f]{16}")
+
+
+def _split_head_tail(text: str, head_chars: int, tail_chars: int) -> Tuple[str, str]:
+    """取开头和结尾，尽量在换行处截断"""
+    head = text[:head_chars]
+    newline = head.rfind("\n")
+    if newline > head_chars // 2:
+        head = head[: newline + 1]
+
+    tail = text[len(text) - tail_chars :] if tail_chars else ""
+    newline = tail.find("\n")
+    if 0 <= newline < tail_chars // 2:
+        tail = tail[newline + 1 :]
+    return head, tail
+
+
+def preview(text: str, max_chars: int = PREVIEW_CHARS) -> str:
+    """
+    终端中显示的预览：超过 max_chars 时只保留开头和结尾
+
+    Args:
+        text: 完整内容
+        max_chars: 预览的字符数上限
+
+    Returns:
+        str: 预览文本，省略处标明省略的字节数和总字节数
+    """
+    if len(text) <= max_chars:
+        return text
+    head, tail = _split_head_tail(text, max_chars * 2 // 3, max_chars // 3)
+    total = len(text.encode("utf-8"))
+    omitted = total - len(head.encode("utf-8")) - len(tail.encode("utf-8"))
+    return f"{head}\n... [省略 {omitted} 字节，共 {total} 字节] ...\n{tail}"
+
+
+class ResultStore:
+    """
+    按内容寻址保存的工具返回
+
+    Args:
+        root: 工作区根目录
+    """
+
+    def __init__(self, root: str = "."):
+        self.directory = os.path.join(os.path.realpath(root), ".agent", "results")
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.txt")
+
+    def save(self, text: str) -> str:
+        """
+        保存内容，相同内容只保存一次
+
+        Returns:
+            str: 结果编号
+        """
+        result_id = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        path = self._path(result_id)
+        if os.path.exists(path):
+            return result_id
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as file:
+                file.write(text)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return result_id
+
+    def read(
+        self,
+        result_id: str,
+        offset: int = 0,
+        max_chars: int = READ_CHARS,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        分段读取保存的内容
+
+        Args:
+            result_id: 结果编号
+            offset: 起始字符偏移
+            max_chars: 最多返回的字符数
+            max_tokens: 每段的 token 上限，None 表示只按字符数限制
+
+        Returns:
+            str: 该段内容，末尾说明位置以及下一段的 offset
+
+        Raises:
+            ValueError: 编号或偏移无效
+        """
+        if not _RESULT_ID.fullmatch(result_id):
+            raise ValueError(f"无效的结果编号: {result_id}")
+        try:
+            with open(self._path(result_id), encoding="utf-8", newline="") as file:
+                text = file.read()
+        except FileNotFoundError:
+            raise ValueError(f"结果不存在: {result_id}")
+        if offset < 0 or offset > len(text):
+            raise ValueError(f"offset 超出范围: {offset}（共 {len(text)} 字符）")
+
+        end = min(offset + max(max_chars, 1), len(text))
+        content = text[offset:end]
+        if max_tokens is not None:
+            # 按 token 比例缩短，直到这一段不超过上限（至少返回一个字符）
+            tokens = estimate_tokens(content)
+            while tokens > max_tokens and end - offset > 1:
+                end = offset + max(1, int((end - offset) * max_tokens / tokens))
+                content = text[offset:end]
+                tokens = estimate_tokens(content)
+        if end < len(text):
+            footer = f"[第 {offset}-{end} 字符，共 {len(text)} 字符；继续读取请传入 offset={end}]"
+        else:
+            footer = f"[第 {offset}-{end} 字符，共 {len(text)} 字符，已读完]"
+        if content and not content.endswith("\n"):
+            content += "\n"
+        return content + footer
+
+    def cap(self, text: str, max_tokens: int = DEFAULT_RESULT_TOKENS) -> str:
+        """
+        把交给模型的内容限制在 max_tokens 以内
+
+        超出时保存完整内容，只返回开头和结尾，并说明如何读取其余部分。
+        """
+        tokens = estimate_tokens(text)
+        if tokens <= max_tokens:
+            return text
+
+        result_id = self.save(text)
+        # 按 token 比例换算字符数，开头占大部分，留出说明的空间
+        chars = int(len(text) * max_tokens / tokens)
+        head, tail = _split_head_tail(text, chars * 3 // 4, chars // 5)
+        omitted_start = len(head)
+        note = (
+            f"\n... [内容过长（约 {tokens} token，{len(text)} 字符），"
+            f"已省略第 {omitted_start}-{len(text) - len(tail)} 字符；"
+            f'完整内容可用 read_tool_result(result_id="{result_id}", '
+            f"offset={omitted_start}) 分段读取] ...\n"
+        )
+        return head + note + tail
+
+
+_stores: Dict[str, ResultStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_result_store(root: str = ".") -> ResultStore:
+    """获取（并缓存）指定工作区根目录的结果存储"""
+    key = os.path.realpath(root)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ResultStore(key)
+            _stores[key] = store
+    return store
+
+
+def cap_result(text: str, max_tokens: Optional[int] = None) -> str:
+    """用当前工作区的结果存储限制交给模型的内容"""
+    return get_result_store().cap(text, max_tokens or DEFAULT_RESULT_TOKENS)
+
+
+def read_result(result_id: str, offset: int = 0, max_chars: int = READ_CHARS) -> str:
+    """
+    分段读取当前工作区保存的结果
+
+    max_chars 由模型传入，限制在 READ_CHARS 以内，每段同样不超过交给模型的 token 上限，
+    不能一次取回全部内容而绕过截断。
+    """
+    return get_result_store().read(
+        result_id,
+        offset,
+        min(max_chars, READ_CHARS),
+        max_tokens=DEFAULT_RESULT_TOKENS,
+    )
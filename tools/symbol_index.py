@@ -0,0 +1,206 @@
+"""
+Python 符号索引
+
+基于 AST 将文件中的类、函数和模块级变量映射到行号区间，
+让 agent 可以按名称（如 TestClass.get_value）直接读取代码，而不必先猜行号。
+"""
+
+import ast
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from tools.code_reader import read_file_lines
+from tools.file_cache import file_cache
+from tools.line_index import file_signature
+
+
+@dataclass(frozen=True)
+class Symbol:
+    """一个符号及其所在的行号区间（从1开始，包含装饰器）"""
+
+    name: str
+    kind: str
+    start_line: int
+    end_line: int
+
+
+def _collect_symbols(
+    body: List[ast.stmt],
+    prefix: str,
+    symbols: Dict[str, Symbol],
+    in_function: bool = False,
+) -> None:
+    """递归收集语句列表中的符号，函数体内只收集嵌套的函数和类"""
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            name = f"{prefix}{node.name}"
+            if isinstance(node, ast.ClassDef):
+                kind = "class"
+            elif isinstance(node, ast.AsyncFunctionDef):
+                kind = "async function"
+            else:
+                kind = "function"
+
+            start_line = min(
+                [node.lineno] + [decorator.lineno for decorator in node.decorator_list]
+            )
+            symbols[name] = Symbol(name, kind, start_line, node.end_lineno)
+            _collect_symbols(
+                node.body,
+                f"{name}.",
+                symbols,
+                in_function or not isinstance(node, ast.ClassDef),
+            )
+
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and not in_function:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    name = f"{prefix}{target.id}"
+                    symbols[name] = Symbol(
+                        name, "variable", node.lineno, node.end_lineno
+                    )
+
+
+class SymbolIndex:
+    """按文件缓存的符号索引，文件变化时只重建该文件"""
+
+    def __init__(self):
+        self._files: Dict[str, Tuple[Tuple[int, int, int], Dict[str, Symbol]]] = {}
+        self._lock = threading.Lock()
+
+    def symbols(self, file_path: str) -> Dict[str, Symbol]:
+        """
+        获取文件中的全部符号
+
+        Args:
+            file_path: Python 文件路径
+
+        Returns:
+            Dict[str, Symbol]: 限定名 -> 符号
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            ValueError: 文件无法解析
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        key = os.path.realpath(file_path)
+        signature = file_signature(os.stat(key))
+        with self._lock:
+            cached = self._files.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            tree = ast.parse(file_cache.read_text(key), filename=file_path)
+        except SyntaxError as e:
+            raise ValueError(f"无法解析文件 {file_path}: {e}")
+
+        symbols: Dict[str, Symbol] = {}
+        _collect_symbols(tree.body, "", symbols)
+        with self._lock:
+            self._files[key] = (signature, symbols)
+        return symbols
+
+    def find(self, file_path: str, name: str) -> Symbol:
+        """
+        按名称查找符号，支持完整限定名或唯一的名称后缀
+
+        Args:
+            file_path: Python 文件路径
+            name: 符号名，如 "TestClass.get_value" 或 "get_value"
+
+        Returns:
+            Symbol: 找到的符号
+
+        Raises:
+            ValueError: 符号不存在或名称有歧义
+        """
+        symbols = self.symbols(file_path)
+        if name in symbols:
+            return symbols[name]
+
+        matches = [
+            symbol
+            for qualname, symbol in symbols.items()
+            if qualname.endswith(f".{name}")
+        ]
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            candidates = ", ".join(symbol.name for symbol in matches)
+            raise ValueError(f"符号名 {name} 有歧义，可选: {candidates}")
+
+        available = ", ".join(symbols) or "无"
+        raise ValueError(f"文件 {file_path} 中不存在符号 {name}，可用符号: {available}")
+
+
+# 所有代码工具共享的符号索引
+symbol_index = SymbolIndex()
+
+
+def split_into_chunks(file_path: str, max_lines: int = 300) -> List[Tuple[int, int]]:
+    """
+    按顶层定义把文件切分为若干段，用于分段并行处理大文件
+
+    每段由相邻的顶层语句（函数、类、变量等，含装饰器）组成，不会把一个定义拆开；
+    段与段之间的空行和注释归入下一段。单个定义超过 max_lines 时单独成段。
+    无法解析的文件按 max_lines 行等分。
+
+    Args:
+        file_path: 文件路径
+        max_lines: 每段的最大行数
+
+    Returns:
+        List[Tuple[int, int]]: 每段的 (起始行, 结束行)，从1开始且包含结束行，覆盖整个文件
+    """
+    text = file_cache.read_text(file_path)
+    line_count = len(file_cache.read_lines(file_path))
+    if line_count == 0:
+        return []
+
+    try:
+        body = ast.parse(text, filename=file_path).body
+    except SyntaxError:
+        body = []
+    if not body:
+        return [
+            (start, min(start + max_lines - 1, line_count))
+            for start in range(1, line_count + 1, max_lines)
+        ]
+
+    # 每个顶层语句的结束行，段只能在这些位置结束
+    boundaries = [node.end_lineno for node in body]
+    boundaries[-1] = line_count
+
+    chunks = []
+    start = 1
+    for i, end in enumerate(boundaries):
+        next_end = boundaries[i + 1] if i + 1 < len(boundaries) else None
+        if next_end is None or next_end - start + 1 > max_lines:
+            chunks.append((start, end))
+            start = end + 1
+    return chunks
+
+
+def read_symbol(file_path: str, name: str) -> str:
+    """
+    按符号名读取代码
+
+    Args:
+        file_path: Python 文件路径
+        name: 符号名，如 "TestClass.get_value"
+
+    Returns:
+        str: 带行号范围说明的符号源码
+    """
+    symbol = symbol_index.find(file_path, name)
+    content = read_file_lines(file_path, symbol.start_line, symbol.end_line)
+    return (
+        f"# {symbol.kind} {symbol.name} "
+        f"({file_path} 第 {symbol.start_line}-{symbol.end_line} 行)\n{content}"
+    )